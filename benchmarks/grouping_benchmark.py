@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark for data_collection.group_vehicles_by_dealer.
+
+Times grouping synthetic vehicle info lists of increasing size
+against a fixed ratio of vehicles to dealers, up to 100k vehicles
+and 10k dealers. Roughly linear growth in the time column shows
+grouping cost is O(vehicles).
+
+Run from the repository root after installing the package as
+cox_auto_app (see Dockerfile):
+
+    python3 benchmarks/grouping_benchmark.py
+"""
+import argparse
+import random
+import time
+from cox_auto_app.data_collection import (group_vehicles_by_dealer)
+
+
+def make_vehicle_info_list(vehicle_count, dealer_count, seed=0):
+    """
+    Returns a list of vehicle info dicts shaped like the ones
+    returned by get_vehicle_data, spread randomly across
+    dealer_count dealers.
+    """
+    rand = random.Random(seed)
+    return [{'vehicleId': vehicle_id,
+             'year': 2000 + vehicle_id % 20,
+             'make': 'make',
+             'model': 'model',
+             'dealerId': rand.randrange(dealer_count)}
+            for vehicle_id in range(vehicle_count)]
+
+
+def time_grouping(vehicle_info_list, repeat):
+    """
+    Returns the best wall clock time in seconds of repeat calls
+    to group_vehicles_by_dealer.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        group_vehicles_by_dealer(vehicle_info_list=vehicle_info_list)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    sizes = [(1000, 100),
+             (10000, 1000),
+             (100000, 10000)]
+    print('{:>10} {:>10} {:>12} {:>14}'
+          .format('vehicles', 'dealers', 'seconds', 'us/vehicle'))
+    for vehicle_count, dealer_count in sizes:
+        vehicle_info_list = make_vehicle_info_list(
+            vehicle_count=vehicle_count,
+            dealer_count=dealer_count)
+        seconds = time_grouping(vehicle_info_list=vehicle_info_list,
+                                repeat=args.repeat)
+        print('{:>10} {:>10} {:>12.4f} {:>14.3f}'
+              .format(vehicle_count, dealer_count, seconds,
+                      seconds / vehicle_count * 1e6))
+
+
+if __name__ == '__main__':
+    main()
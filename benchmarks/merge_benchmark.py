@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Load-test benchmark for data_operations.merge.
+
+Starts the FakeApiServer from tests/fake_api.py in a separate process
+with the requested dataset size, latency and error rate and runs
+merge against it several times. Reports
+wall time, request throughput, p50/p99 client-side request latency
+and peak traced python memory for each run.
+
+Run from the repository root after installing the package as
+cox_auto_app (see Dockerfile):
+
+    python3 benchmarks/merge_benchmark.py --vehicles 5000 --dealers 500 \
+        --latency 0.01 --error-rate 0.01
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from requests.adapters import (HTTPAdapter)
+from cox_auto_app.data_collection import (BatchFetchStrategy)
+from cox_auto_app.data_operations import (merge)
+from cox_auto_app.endpoints import (ApiEndpoints)
+from cox_auto_app.request_tools import (ensure_pool_size,
+                                        get_session,
+                                        DEFAULT_POOL_MAXSIZE)
+# The fake API lives with the tests, outside the package.
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests'))
+from fake_api import (FakeApiServer)  # noqa: E402
+
+
+class TimingAdapter(HTTPAdapter):
+    """
+    Transport adapter that records the latency in seconds of every
+    request it sends in latencies, to measure client side request
+    latency.
+    """
+    def __init__(self, **kwargs):
+        super(TimingAdapter, self).__init__(**kwargs)
+        self.latencies = []
+
+    def send(self, request, **kwargs):
+        start = time.monotonic()
+        try:
+            return super(TimingAdapter, self).send(request, **kwargs)
+        finally:
+            self.latencies.append(time.monotonic() - start)
+
+
+def time_session(session, url, **kwargs):
+    """
+    Mounts a TimingAdapter on session for urls starting with url.
+    kwargs are passed to the adapter.
+
+    Returns the adapter.
+    """
+    adapter = TimingAdapter(**kwargs)
+    session.mount(url, adapter)
+    return adapter
+
+
+def serve(address_queue, kwargs):
+    """
+    Runs a FakeApiServer until the process is terminated, putting
+    its base url on address_queue once it is listening.
+    """
+    server = FakeApiServer(**kwargs)
+    address_queue.put(server.base_url)
+    server.serve_forever()
+
+
+def start_server(**kwargs):
+    """
+    Starts a FakeApiServer in a child process.
+
+    Returns the process and the server base url.
+    """
+    address_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve,
+                                      args=(address_queue, kwargs),
+                                      daemon=True)
+    process.start()
+    return process, address_queue.get(timeout=60)
+
+
+def percentile(values, fraction):
+    """
+    Returns the value at fraction (0 to 1) of the sorted values
+    using the nearest rank.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * len(ordered))) - 1)
+    return ordered[max(0, index)]
+
+
+def run_once(adapter, trace_memory, merge_kwargs):
+    """
+    Runs merge once.
+
+    Returns a dict of the measurements for the run.
+    """
+    del adapter.latencies[:]
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = merge(**merge_kwargs)
+    seconds = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    latencies = list(adapter.latencies)
+    return {'seconds': seconds,
+            'requests': len(latencies),
+            'requests_per_second': len(latencies) / seconds,
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'peak_mb': None if peak is None else peak / 2 ** 20,
+            'success': result.get('success')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--vehicles', type=int, default=1000)
+    parser.add_argument('--dealers', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds added to every response.')
+    parser.add_argument('--latency-jitter', type=float, default=0.0,
+                        help='Up to this many random extra seconds per '
+                             'response.')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of detail requests answered with '
+                             '503.')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--max-workers', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='Fetch ids in batches of this size from the '
+                             'bulk endpoints.')
+    parser.add_argument('--no-stream-dealers', action='store_true',
+                        help='Fetch dealers after all vehicles.')
+    parser.add_argument('--no-trace-memory', action='store_true',
+                        help='Skip tracemalloc, which slows runs down.')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    process, base_url = start_server(vehicle_count=args.vehicles,
+                                     dealer_count=args.dealers,
+                                     latency=args.latency,
+                                     latency_jitter=args.latency_jitter,
+                                     error_rate=args.error_rate)
+    try:
+        # Sized up front so merges keep the session the timing
+        # adapter is mounted on.
+        if args.max_workers:
+            ensure_pool_size(args.max_workers)
+        adapter = time_session(
+            session=get_session(),
+            url=base_url,
+            pool_maxsize=max(DEFAULT_POOL_MAXSIZE, args.max_workers or 0),
+            pool_block=True)
+        merge_kwargs = {'max_workers': args.max_workers,
+                        'stream_dealers': not args.no_stream_dealers,
+                        'endpoints': ApiEndpoints(base_url=base_url)}
+        if args.batch_size:
+            merge_kwargs['fetch_strategy'] = BatchFetchStrategy(
+                batch_size=args.batch_size)
+        print('{:>4} {:>9} {:>9} {:>10} {:>9} {:>9} {:>9} {:>8}'
+              .format('run', 'seconds', 'requests', 'req/s',
+                      'p50 ms', 'p99 ms', 'peak MB', 'success'))
+        for run in range(1, args.runs + 1):
+            stats = run_once(adapter=adapter,
+                             trace_memory=not args.no_trace_memory,
+                             merge_kwargs=merge_kwargs)
+            peak = ('-' if stats['peak_mb'] is None
+                    else '{:.1f}'.format(stats['peak_mb']))
+            print('{:>4} {:>9.3f} {:>9} {:>10.1f} {:>9.2f} {:>9.2f} '
+                  '{:>9} {:>8}'
+                  .format(run, stats['seconds'], stats['requests'],
+                          stats['requests_per_second'], stats['p50_ms'],
+                          stats['p99_ms'], peak, str(stats['success'])))
+        print('max rss MB: {:.1f}'.format(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+    finally:
+        process.terminate()
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,37 @@
 from . import (app,
                request_tools,
                data_operations,
-               data_collection)
+               data_collection,
+               async_data_collection,
+               sharded_data_collection,
+               response_cache,
+               memo,
+               checkpoint,
+               endpoints,
+               records,
+               validation,
+               json_stream,
+               json_codec,
+               metrics,
+               profiling,
+               daemon)
 
 
 __version__ = '0.0.1'
 __all__ = ['app',
            'request_tools',
            'data_operations',
-           'data_collection']
+           'data_collection',
+           'async_data_collection',
+           'sharded_data_collection',
+           'response_cache',
+           'memo',
+           'checkpoint',
+           'endpoints',
+           'records',
+           'validation',
+           'json_stream',
+           'json_codec',
+           'metrics',
+           'profiling',
+           'daemon']
@@ -1,22 +1,283 @@
+import argparse
 import logging
-from .data_operations import merge
+from .data_collection import (BatchFetchStrategy,
+                              DEFAULT_MAX_WORKERS)
+from .daemon import (DEFAULT_HOST,
+                     DEFAULT_MAX_JOBS,
+                     DEFAULT_PORT,
+                     MergeService,
+                     create_server,
+                     serve)
+from .data_operations import (merge,
+                              merge_many)
+from .endpoints import (ApiEndpoints,
+                        BASE_URL_ENV_VAR,
+                        set_endpoints)
+from .json_codec import (CODECS,
+                         create_codec,
+                         set_codec)
+from .metrics import (get_metrics)
+from .profiling import (profile_scope)
+from .request_tools import (RetryPolicy,
+                            TokenBucket,
+                            AdaptiveConcurrencyLimiter,
+                            set_retry_policy,
+                            set_rate_limiter,
+                            set_concurrency_limiter,
+                            set_timeout,
+                            DEFAULT_TIMEOUT)
+from .response_cache import (ResponseCache,
+                             DEFAULT_TTL,
+                             DEFAULT_MAX_ENTRIES)
 
 
-def main():
+def parse_args(argv=None):
+    """
+    Parses the service command line arguments from argv, or from
+    sys.argv if argv is None.
+    """
+    parser = argparse.ArgumentParser(
+        description='Merge vehicle and dealer information for a dataset '
+                    'and submit the answer.')
+    parser.add_argument('--api-base-url', default=None,
+                        help='Root url of the challenge API, such as a '
+                             'caching proxy or mirror. Defaults to the {} '
+                             'environment variable, then the public API.'
+                             .format(BASE_URL_ENV_VAR))
+    parser.add_argument('--max-workers', type=int, default=None,
+                        help='Maximum number of concurrent vehicle and '
+                             'dealer requests.')
+    parser.add_argument('--data-set-id', default=None,
+                        help='Merge this existing datasetId instead of '
+                             'requesting a new one, such as to resume a '
+                             'merge with --checkpoint-dir.')
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help='Directory of append-only logs of the '
+                             'vehicles and dealers fetched per datasetId. '
+                             'A rerun for the same datasetId only fetches '
+                             'the ids missing from its log.')
+    parser.add_argument('--snapshot', default=None,
+                        help='Checkpoint log of an earlier version of the '
+                             'dataset. Only vehicles and dealers missing '
+                             'from it are fetched.')
+    parser.add_argument('--datasets', type=int, default=1,
+                        help='Number of datasets to merge in this run. '
+                             'All share the connection pool and the '
+                             '--max-workers request budget.')
+    parser.add_argument('--max-concurrent-datasets', type=int,
+                        default=None,
+                        help='Maximum number of datasets merged at once '
+                             'with --datasets. All at once if not given.')
+    parser.add_argument('--shards', type=int, default=None,
+                        help='Fetch and group vehicle details in this many '
+                             'processes, sharing the --max-workers '
+                             'request budget, for datasets large enough '
+                             'that one process is cpu bound.')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Run as a resident service accepting merge '
+                             'jobs over http, keeping connections, '
+                             'workers and caches warm between jobs.')
+    parser.add_argument('--daemon-host', default=DEFAULT_HOST,
+                        help='Host the --daemon service listens on.')
+    parser.add_argument('--daemon-port', type=int, default=DEFAULT_PORT,
+                        help='Port the --daemon service listens on.')
+    parser.add_argument('--daemon-socket', default=None,
+                        help='Unix socket path the --daemon service '
+                             'listens on instead of a port.')
+    parser.add_argument('--daemon-max-jobs', type=int,
+                        default=DEFAULT_MAX_JOBS,
+                        help='Maximum number of merge jobs the --daemon '
+                             'service runs at once.')
+    parser.add_argument('--drain-timeout', type=float, default=None,
+                        help='Seconds the --daemon service waits for '
+                             'running jobs on shutdown. Waits for all '
+                             'jobs if not given.')
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='Fetch vehicles and dealers this many ids per '
+                             'request from the bulk vehicles?ids= and '
+                             'dealers?ids= endpoints of a bulk capable '
+                             'backend or proxy. One request per id if not '
+                             'given.')
+    parser.add_argument('--stream-vehicle-ids', action='store_true',
+                        help='Parse the vehicle id list as it downloads '
+                             'and start vehicle requests on the first '
+                             'ids.')
+    parser.add_argument('--stream-answer', action='store_true',
+                        help='Encode the answer one dealer at a time as '
+                             'it is posted with chunked transfer '
+                             'encoding.')
+    parser.add_argument('--gzip-answer', action='store_true',
+                        help='Stream the answer gzip compressed.')
+    parser.add_argument('--json-codec', choices=sorted(CODECS),
+                        default=None,
+                        help='Json library used to encode and decode '
+                             'request bodies. Defaults to the fastest '
+                             'installed of orjson, ujson and json.')
+    parser.add_argument('--metrics-path', default=None,
+                        help='File the request and phase metrics are '
+                             'written to in the Prometheus text format '
+                             'when the service exits.')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the merge with cProfile and trace '
+                             'its allocations with tracemalloc, writing '
+                             'reports to --profile-dir.')
+    parser.add_argument('--profile-dir', default='profiles',
+                        help='Directory the --profile reports are written '
+                             'to.')
+    parser.add_argument('--cache-path', default=None,
+                        help='SQLite file used to cache vehicle and '
+                             'dealer responses between runs. Caching is '
+                             'disabled if not given.')
+    parser.add_argument('--cache-ttl', type=float, default=DEFAULT_TTL,
+                        help='Seconds a cached response stays valid.')
+    parser.add_argument('--cache-max-entries', type=int,
+                        default=DEFAULT_MAX_ENTRIES,
+                        help='Maximum number of cached responses.')
+    parser.add_argument('--retry-attempts', type=int, default=3,
+                        help='Maximum attempts for a request that fails '
+                             'with a transient error.')
+    parser.add_argument('--retry-backoff', type=float, default=0.2,
+                        help='Base seconds of exponential backoff '
+                             'between attempts.')
+    parser.add_argument('--retry-deadline', type=float, default=None,
+                        help='Seconds after the first attempt past which '
+                             'a request is not retried.')
+    parser.add_argument('--connect-timeout', type=float,
+                        default=DEFAULT_TIMEOUT[0],
+                        help='Seconds to wait for a connection.')
+    parser.add_argument('--read-timeout', type=float,
+                        default=DEFAULT_TIMEOUT[1],
+                        help='Seconds to wait for each read of a '
+                             'response.')
+    parser.add_argument('--deadline', type=float, default=None,
+                        help='Seconds the merge may spend collecting '
+                             'data before submitting partial results.')
+    parser.add_argument('--rate-limit', type=float, default=None,
+                        help='Maximum sustained requests per second. '
+                             'Unlimited if not given.')
+    parser.add_argument('--rate-burst', type=float, default=None,
+                        help='Requests allowed in a burst above the rate '
+                             'limit. Defaults to one second of requests.')
+    parser.add_argument('--adaptive-concurrency', action='store_true',
+                        help='Adjust the number of requests in flight '
+                             'from observed latency and errors, up to '
+                             '--max-workers.')
+    parser.add_argument('--latency-target', type=float, default=1.0,
+                        help='Seconds per request above which adaptive '
+                             'concurrency backs off.')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     logging.basicConfig(level=logging.INFO,
                         format='%(asctime)s - '
                                '%(name)s - '
                                '%(levelname)s - '
                                '%(message)s')
+    args = parse_args(argv)
+    cache = None
+    fetch_strategy = None
     try:
+        if args.api_base_url:
+            set_endpoints(ApiEndpoints(base_url=args.api_base_url))
+        set_codec(create_codec(args.json_codec))
+        set_retry_policy(RetryPolicy(attempts=args.retry_attempts,
+                                     backoff=args.retry_backoff,
+                                     deadline=args.retry_deadline))
+        set_timeout((args.connect_timeout, args.read_timeout))
+        if args.rate_limit:
+            set_rate_limiter(TokenBucket(rate=args.rate_limit,
+                                         capacity=args.rate_burst))
+        if args.adaptive_concurrency:
+            max_limit = args.max_workers or DEFAULT_MAX_WORKERS
+            set_concurrency_limiter(AdaptiveConcurrencyLimiter(
+                initial_limit=min(8, max_limit),
+                max_limit=max_limit,
+                latency_target=args.latency_target))
+        if args.batch_size:
+            fetch_strategy = BatchFetchStrategy(batch_size=args.batch_size)
+        if args.cache_path:
+            cache = ResponseCache(path=args.cache_path,
+                                  ttl=args.cache_ttl,
+                                  max_entries=args.cache_max_entries)
         logging.info('Merging vehicle and dealer information for '
                      'datasets.')
-        merge_results = merge()
+        merge_kwargs = dict(max_workers=args.max_workers,
+                            cache=cache,
+                            deadline=args.deadline,
+                            fetch_strategy=fetch_strategy,
+                            stream_ids=args.stream_vehicle_ids,
+                            stream_answer=args.stream_answer,
+                            compress_answer=args.gzip_answer,
+                            shards=args.shards,
+                            checkpoint_dir=args.checkpoint_dir,
+                            snapshot_path=args.snapshot)
+        run = run_daemon if args.daemon else run_merges
+        if args.profile:
+            with profile_scope(report_dir=args.profile_dir):
+                run(args=args, merge_kwargs=merge_kwargs)
+        else:
+            run(args=args, merge_kwargs=merge_kwargs)
+    except Exception:
+        logging.error('Exception', exc_info=True)
+    finally:
+        if cache is not None:
+            cache.close()
+        write_metrics(path=args.metrics_path)
+
+
+def run_merges(args, merge_kwargs):
+    """
+    Runs merge with merge_kwargs, or merge_many when more than one
+    dataset is requested, and logs the results.
+    """
+    if args.datasets == 1:
+        merge_results = merge(data_set_id=args.data_set_id, **merge_kwargs)
         logging.info('Merge completed with status of {} in {} '
                      'milliseconds.'
                      .format(merge_results['success'],
                              merge_results['totalMilliseconds']))
         logging.info('Merge status message: {}'
                      .format(merge_results['message']))
-    except Exception:
-        logging.error('Exception', exc_info=True)
+        return
+    summaries = merge_many(count=args.datasets,
+                           max_datasets=args.max_concurrent_datasets,
+                           **merge_kwargs)
+    for summary in summaries:
+        logging.info('Merge of data set id {} completed with status of {} '
+                     'in {} milliseconds ({:.3f} seconds client side): {}'
+                     .format(summary['dataSetId'], summary['success'],
+                             summary.get('totalMilliseconds'),
+                             summary['seconds'], summary['message']))
+    logging.info('{} of {} merges succeeded.'
+                 .format(sum(1 for summary in summaries
+                             if summary['success']), len(summaries)))
+
+
+def run_daemon(args, merge_kwargs):
+    """
+    Serves merge jobs run with merge_kwargs until the service is
+    stopped with SIGTERM or SIGINT.
+    """
+    service = MergeService(max_jobs=args.daemon_max_jobs, **merge_kwargs)
+    server = create_server(service=service,
+                           host=args.daemon_host,
+                           port=args.daemon_port,
+                           socket_path=args.daemon_socket)
+    serve(server=server, drain_timeout=args.drain_timeout)
+
+
+def write_metrics(path=None):
+    """
+    Logs the shared metrics as structured json lines and, if path is
+    given, writes them to path in the Prometheus text format.
+    """
+    metrics = get_metrics()
+    metrics.log_summary()
+    if path:
+        try:
+            with open(path, 'w') as metrics_file:
+                metrics_file.write(metrics.to_prometheus())
+        except OSError:
+            logging.error('Could not write metrics to {}'.format(path),
+                          exc_info=True)
@@ -0,0 +1,129 @@
+import asyncio
+from .data_collection import (check_dataset_id,
+                              check_vehicle_ids,
+                              check_vehicle_info,
+                              check_dealer_info,
+                              group_vehicles_by_dealer,
+                              add_dealer_names)
+from .endpoints import (get_endpoints)
+from .request_tools import (async_get_json_request)
+
+
+# Upper bound on the number of vehicle or dealer requests in flight
+# at once on the event loop when no semaphore is provided.
+DEFAULT_MAX_CONCURRENCY = 256
+
+
+async def async_get_dataset_id(session=None, endpoints=None):
+    """
+    Coroutine version of data_collection.get_dataset_id.
+
+    Does not catch exceptions.
+    """
+    if endpoints is None:
+        endpoints = get_endpoints()
+    url = endpoints.dataset_id()
+    data_set_dict = await async_get_json_request(url=url, session=session)
+    return check_dataset_id(url=url, data_set_dict=data_set_dict)
+
+
+async def async_get_vehicle_ids(data_set_id, session=None,
+                                endpoints=None):
+    """
+    Coroutine version of data_collection.get_vehicle_ids.
+
+    Does not catch exceptions.
+    """
+    if endpoints is None:
+        endpoints = get_endpoints()
+    url = endpoints.vehicles(data_set_id)
+    vehicle_id_dict = await async_get_json_request(url=url, session=session)
+    return check_vehicle_ids(url=url, vehicle_id_dict=vehicle_id_dict)
+
+
+async def async_get_data_for_vehicles(data_set_id, vehicle_ids,
+                                      session=None, semaphore=None,
+                                      endpoints=None):
+    """
+    Coroutine version of data_collection.get_data_for_vehicles.
+
+    All vehicle requests are scheduled on the running event loop.
+    The provided semaphore, or a new one allowing
+    DEFAULT_MAX_CONCURRENCY, limits how many are in flight at once.
+
+    Returns a list of dealers and an error list as described in
+    data_collection.get_data_for_vehicles.
+    """
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(DEFAULT_MAX_CONCURRENCY)
+    if endpoints is None:
+        endpoints = get_endpoints()
+    vehicle_info_list = await asyncio.gather(
+        *[async_get_vehicle_data(
+            url=endpoints.vehicle(data_set_id, vehicle_id),
+            vehicle_id=vehicle_id,
+            session=session,
+            semaphore=semaphore)
+          for vehicle_id in vehicle_ids])
+    return group_vehicles_by_dealer(vehicle_info_list=vehicle_info_list)
+
+
+async def async_get_vehicle_data(url, vehicle_id, session, semaphore):
+    """
+    Coroutine version of data_collection.get_vehicle_data.
+
+    Catches exceptions and adds them to error_message field.
+    """
+    try:
+        async with semaphore:
+            vehicle_info_dict = await async_get_json_request(
+                url=url, session=session)
+        return check_vehicle_info(url=url,
+                                  vehicle_info_dict=vehicle_info_dict)
+    except Exception as e:
+        return {'vehicleId': vehicle_id,
+                'error_message': str(e)}
+
+
+async def async_get_dealer_names(data_set_id, dealer_list,
+                                 session=None, semaphore=None,
+                                 endpoints=None):
+    """
+    Coroutine version of data_collection.get_dealer_names.
+
+    Dealer requests are limited by semaphore in the same way as
+    async_get_data_for_vehicles.
+
+    Returns an updated dealer list and an error list as described
+    in data_collection.get_dealer_names.
+    """
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(DEFAULT_MAX_CONCURRENCY)
+    if endpoints is None:
+        endpoints = get_endpoints()
+    dealer_info_list = await asyncio.gather(
+        *[async_get_dealer_info(
+            url=endpoints.dealer(data_set_id, dealer.dealer_id),
+            dealer_id=dealer.dealer_id,
+            session=session,
+            semaphore=semaphore)
+          for dealer in dealer_list])
+    return add_dealer_names(dealer_list=dealer_list,
+                            dealer_info_list=dealer_info_list)
+
+
+async def async_get_dealer_info(url, dealer_id, session, semaphore):
+    """
+    Coroutine version of data_collection.get_dealer_info.
+
+    Catches exceptions and adds them to error_message field.
+    """
+    try:
+        async with semaphore:
+            dealer_info_dict = await async_get_json_request(
+                url=url, session=session)
+        return check_dealer_info(url=url,
+                                 dealer_info_dict=dealer_info_dict)
+    except Exception as e:
+        return {'dealerId': dealer_id,
+                'error_message': str(e)}
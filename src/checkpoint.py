@@ -0,0 +1,253 @@
+import logging
+import os
+import re
+from threading import (Lock)
+from .data_collection import (PerIdFetchStrategy,
+                              check_dealer_info,
+                              check_vehicle_info)
+from .json_codec import (get_codec)
+from .metrics import (get_metrics)
+
+
+# Characters allowed in a datasetId used to name a checkpoint file.
+_DATA_SET_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class Snapshot(object):
+    """
+    Read-only view of the vehicle and dealer info recorded for a
+    dataset in a CheckpointLog file at path, such as that of an
+    earlier version of a dataset, loaded into vehicles and dealers,
+    dicts keyed by vehicleId and dealerId.
+
+    Each line of the file is a json object with a vehicle or dealer
+    key holding one checked info dict. A last line cut short by a
+    crash, or a record that fails validation, is skipped with a
+    warning.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.vehicles = {}
+        self.dealers = {}
+        self.load()
+
+    def load(self):
+        """
+        Reads the records already in the file, if it exists.
+
+        Returns True if the file does not end with a newline.
+        """
+        if not os.path.exists(self.path):
+            return False
+        loads = get_codec().loads
+        line = b'\n'
+        with open(self.path, 'rb') as log_file:
+            for line_number, line in enumerate(log_file, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = loads(line)
+                    if 'vehicle' in record:
+                        info = check_vehicle_info(self.path,
+                                                  record['vehicle'])
+                        self.vehicles[info['vehicleId']] = info
+                    else:
+                        info = check_dealer_info(self.path,
+                                                 record['dealer'])
+                        self.dealers[info['dealerId']] = info
+                except Exception as e:
+                    logging.warning('Skipping line {} of checkpoint {}: {}'
+                                    .format(line_number, self.path, e))
+        return not line.endswith(b'\n')
+
+
+class CheckpointLog(Snapshot):
+    """
+    Append-only local log of the vehicle and dealer info fetched for
+    a dataset, so a merge that dies part way can be rerun without
+    fetching the same records again.
+
+    Records already in the file at path are loaded as in Snapshot
+    and new ones are appended. Safe to share between threads.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.vehicles = {}
+        self.dealers = {}
+        self._lock = Lock()
+        cut_short = self.load()
+        self._file = open(path, 'ab')
+        if cut_short:
+            # Starts a fresh line after a last line cut short.
+            self._file.write(b'\n')
+            self._file.flush()
+
+    def add_vehicle(self, vehicle_info):
+        """
+        Appends a checked vehicle info dict.
+        """
+        self.append('vehicle', vehicle_info, self.vehicles,
+                    vehicle_info['vehicleId'])
+
+    def add_dealer(self, dealer_info):
+        """
+        Appends a checked dealer info dict.
+        """
+        self.append('dealer', dealer_info, self.dealers,
+                    dealer_info['dealerId'])
+
+    def append(self, kind, info, records, item_id):
+        line = get_codec().dumps({kind: info}) + b'\n'
+        with self._lock:
+            records[item_id] = info
+            if self._file.closed:
+                # A request left running past a merge deadline.
+                return
+            self._file.write(line)
+            # Flushed per record so a crash loses at most the record
+            # being written.
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def open_checkpoint(directory, data_set_id):
+    """
+    Returns the CheckpointLog of data_set_id in directory, creating
+    the directory if needed.
+
+    Raises ValueError if data_set_id cannot be used as a file name.
+    """
+    if not _DATA_SET_ID.match(data_set_id):
+        raise ValueError('data_set_id {} cannot name a checkpoint file.'
+                         .format(data_set_id))
+    os.makedirs(directory, exist_ok=True)
+    return CheckpointLog(os.path.join(directory,
+                                      '{}.jsonl'.format(data_set_id)))
+
+
+def load_snapshot(path):
+    """
+    Returns the Snapshot of the CheckpointLog file at path.
+
+    Raises ValueError if there is no file at path.
+    """
+    if not os.path.isfile(path):
+        raise ValueError('Snapshot {} does not exist.'.format(path))
+    return Snapshot(path)
+
+
+class SnapshotFetchStrategy(object):
+    """
+    Fetch strategy serving ids already in snapshot, a Snapshot,
+    without requests and fetching the rest through fetch_strategy,
+    a PerIdFetchStrategy by default.
+
+    The number of ids served from snapshot and fetched are counted
+    in the snapshot_ids_total metric of metrics.get_metrics(),
+    labelled with the kind of record and the source.
+    """
+    def __init__(self, snapshot, fetch_strategy=None):
+        if fetch_strategy is None:
+            fetch_strategy = PerIdFetchStrategy()
+        self.snapshot = snapshot
+        self.fetch_strategy = fetch_strategy
+        self.batch_size = fetch_strategy.batch_size
+
+    def fetch_vehicles(self, data_set_id, vehicle_ids, endpoints,
+                       cache=None, deadline=None):
+        results, missing_ids = split_known(ids=vehicle_ids,
+                                           known=self.snapshot.vehicles)
+        self.count_ids('vehicle', len(results), len(missing_ids))
+        if missing_ids:
+            fetched = self.fetch_strategy.fetch_vehicles(
+                data_set_id=data_set_id,
+                vehicle_ids=missing_ids,
+                endpoints=endpoints,
+                cache=cache,
+                deadline=deadline)
+            for info in fetched.values():
+                if 'error_message' not in info:
+                    self.add_vehicle(info)
+            results.update(fetched)
+        return results
+
+    def fetch_dealers(self, data_set_id, dealer_ids, endpoints,
+                      cache=None, memo=None, deadline=None):
+        results, missing_ids = split_known(ids=dealer_ids,
+                                           known=self.snapshot.dealers)
+        self.count_ids('dealer', len(results), len(missing_ids))
+        if missing_ids:
+            fetched = self.fetch_strategy.fetch_dealers(
+                data_set_id=data_set_id,
+                dealer_ids=missing_ids,
+                endpoints=endpoints,
+                cache=cache,
+                memo=memo,
+                deadline=deadline)
+            for info in fetched.values():
+                if 'error_message' not in info:
+                    self.add_dealer(info)
+            results.update(fetched)
+        return results
+
+    def add_vehicle(self, vehicle_info):
+        """
+        Called with each vehicle fetched without error. Does nothing
+        as snapshot is read-only.
+        """
+
+    def add_dealer(self, dealer_info):
+        """
+        Called with each dealer fetched without error. Does nothing
+        as snapshot is read-only.
+        """
+
+    def count_ids(self, kind, known_count, missing_count):
+        metrics = get_metrics()
+        if known_count:
+            metrics.inc('snapshot_ids_total', known_count, kind=kind,
+                        source='snapshot')
+        if missing_count:
+            metrics.inc('snapshot_ids_total', missing_count, kind=kind,
+                        source='fetched')
+
+
+class CheckpointFetchStrategy(SnapshotFetchStrategy):
+    """
+    SnapshotFetchStrategy serving ids already in checkpoint, a
+    CheckpointLog, and appending every record fetched without error
+    to it.
+    """
+    def __init__(self, checkpoint, fetch_strategy=None):
+        SnapshotFetchStrategy.__init__(self, snapshot=checkpoint,
+                                       fetch_strategy=fetch_strategy)
+        self.checkpoint = checkpoint
+
+    def add_vehicle(self, vehicle_info):
+        self.checkpoint.add_vehicle(vehicle_info)
+
+    def add_dealer(self, dealer_info):
+        self.checkpoint.add_dealer(dealer_info)
+
+    def count_ids(self, kind, known_count, missing_count):
+        # Only ids reused from an earlier dataset are counted.
+        pass
+
+
+def split_known(ids, known):
+    """
+    Returns a dict of the info in known, a dict keyed by id, for
+    each of ids found in it, and a list of the ids that are not.
+    """
+    results = {}
+    missing_ids = []
+    for item_id in ids:
+        info = known.get(item_id)
+        if info is None:
+            missing_ids.append(item_id)
+        else:
+            results[item_id] = info
+    return results, missing_ids
@@ -0,0 +1,370 @@
+"""
+Resident merge service.
+
+Runs merge jobs requested over a local HTTP API, on a TCP port or a
+Unix socket, keeping the pooled session, the worker pool, the dealer
+memo and any response cache warm between jobs. The API is:
+
+    POST /merge    Runs a merge and returns its summary, as described
+                   in data_operations.merge_many. The optional json
+                   body may give a dataSetId to merge instead of a new
+                   one and a deadline in seconds.
+    GET /health    Returns the service status and job counts.
+    GET /metrics   Returns metrics.get_metrics() in the Prometheus
+                   text format.
+
+On SIGTERM or SIGINT the service stops accepting jobs, answering
+new ones with HTTP 503, and exits once running jobs finish and their
+responses are written.
+"""
+import json
+import logging
+import os
+import signal
+import time
+from http.server import (BaseHTTPRequestHandler,
+                         HTTPServer)
+from socketserver import (ThreadingMixIn,
+                          UnixStreamServer)
+from threading import (BoundedSemaphore,
+                       Condition,
+                       Lock,
+                       Thread)
+from .data_collection import (create_executor)
+from .data_operations import (merge_summary)
+from .endpoints import (get_endpoints)
+from .memo import (LRUMemo)
+from .metrics import (get_metrics)
+
+
+# Address the service listens on when no Unix socket is given.
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+# Number of merge jobs run at once. Later jobs wait for a free slot.
+DEFAULT_MAX_JOBS = 1
+# Seconds an idle keep-alive connection is held open, so handler
+# threads of idle clients end once the service drains.
+DEFAULT_IDLE_TIMEOUT = 5
+
+
+class ServiceDraining(RuntimeError):
+    """
+    Raised by MergeService.run_job once the service is draining.
+    """
+
+
+class MergeService(object):
+    """
+    Runs merge jobs with state shared between them.
+
+    Every job runs on one worker pool of max_workers threads and
+    shares dealer_memo, an LRUMemo created if not given, so dealers
+    seen in earlier jobs are not requested again. At most max_jobs
+    jobs run at once. merge_kwargs are passed to every merge, except
+    that a job may give its own deadline.
+    """
+    def __init__(self, max_workers=None, max_jobs=DEFAULT_MAX_JOBS,
+                 dealer_memo=None, **merge_kwargs):
+        if type(max_jobs) is not int or max_jobs < 1:
+            raise ValueError('max_jobs {} is not a positive int.'
+                             .format(max_jobs))
+        if dealer_memo is None:
+            dealer_memo = LRUMemo()
+        if merge_kwargs.get('endpoints') is None:
+            merge_kwargs['endpoints'] = get_endpoints()
+        self.max_workers = max_workers
+        self.dealer_memo = dealer_memo
+        self.merge_kwargs = merge_kwargs
+        self.executor = create_executor(max_workers=max_workers)
+        self.active_jobs = 0
+        self.completed_jobs = 0
+        self.draining = False
+        self._slots = BoundedSemaphore(max_jobs)
+        self._condition = Condition()
+
+    def run_job(self, data_set_id=None, deadline=None):
+        """
+        Runs merge for data_set_id, or a new dataset if None, with
+        an optional deadline in seconds.
+
+        Raises ServiceDraining if the service is draining.
+
+        Returns the summary dict described in
+        data_operations.merge_many.
+        """
+        with self._condition:
+            if self.draining:
+                raise ServiceDraining('Service is draining.')
+            self.active_jobs += 1
+        try:
+            with self._slots:
+                merge_kwargs = dict(self.merge_kwargs)
+                if deadline is not None:
+                    merge_kwargs['deadline'] = deadline
+                return merge_summary(data_set_id=data_set_id,
+                                     max_workers=self.max_workers,
+                                     dealer_memo=self.dealer_memo,
+                                     executor=self.executor,
+                                     **merge_kwargs)
+        finally:
+            with self._condition:
+                self.active_jobs -= 1
+                self.completed_jobs += 1
+                self._condition.notify_all()
+
+    def status(self):
+        """
+        Returns a dict of the service status and job counts.
+        """
+        with self._condition:
+            return {'status': 'draining' if self.draining else 'ok',
+                    'activeJobs': self.active_jobs,
+                    'completedJobs': self.completed_jobs}
+
+    def start_drain(self):
+        """
+        Stops new jobs from starting.
+        """
+        with self._condition:
+            self.draining = True
+
+    def drain(self, timeout=None):
+        """
+        Stops new jobs from starting, waits up to timeout seconds,
+        or forever if None, for running jobs and shuts the worker
+        pool down.
+
+        Returns True if every job finished.
+        """
+        self.start_drain()
+        finished = self.wait_for_jobs(timeout=timeout)
+        self.executor.shutdown(wait=finished)
+        return finished
+
+    def wait_for_jobs(self, timeout=None):
+        """
+        Waits up to timeout seconds, or forever if None, for no job
+        to be running.
+
+        Returns True if no job is running.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self.active_jobs == 0, timeout=timeout)
+
+
+class MergeRequestHandler(BaseHTTPRequestHandler):
+    """
+    Request handler for the merge service servers.
+    """
+    protocol_version = 'HTTP/1.1'
+    timeout = DEFAULT_IDLE_TIMEOUT
+
+    def log_message(self, format, *args):
+        logging.debug(format, *args)
+
+    def address_string(self):
+        # Unix socket clients have no address.
+        return str(self.client_address or 'unix')
+
+    def send_body(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if self.server.service.draining:
+            # Lets the handler thread end instead of waiting for a
+            # next request that will be refused.
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, data):
+        self.send_body(status, json.dumps(data).encode('utf-8'),
+                       'application/json; charset=utf-8')
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.send_json(200, self.server.service.status())
+        elif self.path == '/metrics':
+            self.send_body(200,
+                           get_metrics().to_prometheus().encode('utf-8'),
+                           'text/plain; version=0.0.4; charset=utf-8')
+        else:
+            self.send_json(404, {'message': 'Not found: {}'
+                                 .format(self.path)})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        if self.path != '/merge':
+            self.send_json(404, {'message': 'Not found: {}'
+                                 .format(self.path)})
+            return
+        try:
+            options = parse_job(body)
+        except ValueError as e:
+            self.send_json(400, {'message': str(e)})
+            return
+        try:
+            summary = self.server.service.run_job(**options)
+        except ServiceDraining as e:
+            self.send_json(503, {'message': str(e)})
+            return
+        self.send_json(200, summary)
+
+
+def parse_job(body):
+    """
+    Parses the json body of a merge request.
+
+    Raises ValueError if the body is not a json object with an
+    optional str dataSetId and an optional positive number
+    deadline.
+
+    Returns the keyword arguments of MergeService.run_job.
+    """
+    if not body:
+        return {}
+    try:
+        job = json.loads(body.decode('utf-8'))
+    except ValueError:
+        raise ValueError('Body is not json.')
+    if type(job) is not dict:
+        raise ValueError('Body {} is not a json object.'.format(job))
+    data_set_id = job.get('dataSetId')
+    if data_set_id is not None and type(data_set_id) is not str:
+        raise ValueError('dataSetId {} is not a str.'.format(data_set_id))
+    deadline = job.get('deadline')
+    if deadline is not None and (type(deadline) not in (int, float) or
+                                 deadline <= 0):
+        raise ValueError('deadline {} is not a positive number.'
+                         .format(deadline))
+    return {'data_set_id': data_set_id, 'deadline': deadline}
+
+
+class HandlerThreadsMixIn(ThreadingMixIn):
+    """
+    ThreadingMixIn keeping its daemon handler threads so they can be
+    joined, which ThreadingMixIn only does from python 3.7 and not
+    for daemon threads.
+    """
+    daemon_threads = True
+
+    def process_request(self, request, client_address):
+        thread = Thread(target=self.process_request_thread,
+                        args=(request, client_address),
+                        daemon=self.daemon_threads)
+        with self._handler_threads_lock:
+            self._handler_threads = [
+                handler for handler in self._handler_threads
+                if handler.is_alive()]
+            self._handler_threads.append(thread)
+        thread.start()
+
+    def join_handlers(self, timeout=None):
+        """
+        Waits up to timeout seconds, or forever if None, for the
+        handler threads to finish.
+
+        Returns True if every handler thread finished.
+        """
+        with self._handler_threads_lock:
+            threads = list(self._handler_threads)
+        end = None if timeout is None else time.monotonic() + timeout
+        for thread in threads:
+            thread.join(None if end is None
+                        else max(0, end - time.monotonic()))
+        return not any(thread.is_alive() for thread in threads)
+
+
+class MergeServer(HandlerThreadsMixIn, HTTPServer):
+    """
+    Threaded HTTP server exposing a MergeService on a TCP port.
+    """
+    def __init__(self, service, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        self._handler_threads = []
+        self._handler_threads_lock = Lock()
+        HTTPServer.__init__(self, (host, port), MergeRequestHandler)
+        self.service = service
+
+    @property
+    def base_url(self):
+        """
+        The http url of the server root.
+        """
+        host, port = self.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+
+class UnixMergeServer(HandlerThreadsMixIn, UnixStreamServer):
+    """
+    Threaded HTTP server exposing a MergeService on a Unix socket.
+    Replaces a stale socket file at path.
+    """
+    def __init__(self, service, path):
+        if os.path.exists(path):
+            os.remove(path)
+        self._handler_threads = []
+        self._handler_threads_lock = Lock()
+        UnixStreamServer.__init__(self, path, MergeRequestHandler)
+        self.service = service
+
+    def server_close(self):
+        UnixStreamServer.server_close(self)
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def create_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                  socket_path=None):
+    """
+    Returns a UnixMergeServer for service if socket_path is given,
+    otherwise a MergeServer on host and port.
+    """
+    if socket_path:
+        return UnixMergeServer(service=service, path=socket_path)
+    return MergeServer(service=service, host=host, port=port)
+
+
+def serve(server, drain_timeout=None):
+    """
+    Serves merge jobs on server until SIGTERM or SIGINT, then
+    drains its service: new jobs keep getting HTTP 503 while running
+    jobs finish, waiting up to drain_timeout seconds, or forever if
+    None. The server then stops and, if every job finished, waits
+    for the handler threads to write their last responses. Must be
+    called from the main thread.
+    """
+    drained = []
+
+    def drain_and_shutdown():
+        drained.append(server.service.drain(timeout=drain_timeout))
+        server.shutdown()
+
+    def stop(signum, frame):
+        if server.service.draining:
+            return
+        logging.info('Received signal {}, draining.'.format(signum))
+        server.service.start_drain()
+        # Serving goes on so jobs sent while draining get 503. The
+        # drain runs on another thread as shutdown waits for
+        # serve_forever, which runs on this one.
+        Thread(target=drain_and_shutdown, daemon=True).start()
+    previous = {signum: signal.signal(signum, stop)
+                for signum in (signal.SIGTERM, signal.SIGINT)}
+    try:
+        logging.info('Serving merge jobs at {}'.format(
+            server.server_address))
+        server.serve_forever()
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+        finished = (drained[0] if drained
+                    else server.service.drain(timeout=drain_timeout))
+        server.server_close()
+        if finished:
+            server.join_handlers()
+        logging.info('Merge service stopped after {} jobs{}.'.format(
+            server.service.completed_jobs,
+            '' if finished else ' with jobs still running'))
@@ -1,11 +1,98 @@
-from threading import (Thread)
-from .request_tools import (get_json_request)
+from concurrent.futures import (ThreadPoolExecutor,
+                                wait,
+                                FIRST_COMPLETED)
+import time
+from contextlib import (contextmanager)
+from itertools import (islice)
+from .endpoints import (get_endpoints)
+from .records import (Dealer,
+                      Vehicle)
+from .json_stream import (NotAnArrayError,
+                          NotAnObjectError,
+                          iter_json_array)
+from .request_tools import (DeadlineExceeded,
+                            ensure_pool_size,
+                            get_json_request,
+                            stream_json_request)
+from .validation import (RecordSchema,
+                         ValidationError,
+                         is_list_of)
+
+
+# Upper bound on the number of vehicle or dealer requests in flight
+# at once when no executor or max_workers value is provided.
+DEFAULT_MAX_WORKERS = 32
+# error_message given to vehicles and dealers not downloaded before
+# the deadline passed to a collection function.
+DEADLINE_ERROR_MESSAGE = 'Did not finish before deadline.'
+# Number of ids handed to the bulk fetcher at once when no
+# batch_size is provided to BatchFetchStrategy.
+DEFAULT_BATCH_SIZE = 100
+# Schemas of the vehicle and dealer detail payloads, built once and
+# shared by every request.
+VEHICLE_INFO_SCHEMA = RecordSchema(name='vehicle info',
+                                   fields=[('vehicleId', int),
+                                           ('year', int),
+                                           ('make', str),
+                                           ('model', str),
+                                           ('dealerId', int)])
+DEALER_INFO_SCHEMA = RecordSchema(name='dealer info',
+                                  fields=[('name', str),
+                                          ('dealerId', int)])
+
+
+def create_executor(max_workers=None):
+    """
+    Creates a bounded thread pool used to fan out vehicle and
+    dealer requests.
+
+    max_workers caps the number of concurrent requests. Defaults
+    to DEFAULT_MAX_WORKERS. The pool of the shared session is grown
+    to max_workers connections per host if it is smaller.
+
+    Returns a concurrent.futures.ThreadPoolExecutor. The caller
+    is responsible for shutting it down.
+    """
+    if max_workers is None:
+        max_workers = DEFAULT_MAX_WORKERS
+    if type(max_workers) is not int or max_workers < 1:
+        raise ValueError('max_workers {} is not a positive int.'
+                         .format(max_workers))
+    ensure_pool_size(max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers)
 
 
-def get_dataset_id():
+@contextmanager
+def executor_scope(executor=None, max_workers=None, deadline=None):
+    """
+    Yields the provided executor, or a new bounded executor
+    created with max_workers which is shut down on exit.
+
+    Lets callers share one pool across several fan-outs while
+    still allowing each fan-out to be called on its own.
+
+    deadline is an optional time.monotonic() value. If it has
+    passed on exit, the executor is shut down without waiting, as
+    the fan-outs have cancelled their queued futures and running
+    requests end on their own request timeouts.
+    """
+    if executor is not None:
+        yield executor
+        return
+    executor = create_executor(max_workers=max_workers)
+    try:
+        yield executor
+    finally:
+        if deadline is not None and time.monotonic() >= deadline:
+            executor.shutdown(wait=False)
+        else:
+            executor.shutdown(wait=True)
+
+
+def get_dataset_id(deadline=None, endpoints=None):
     """
     Makes a request to the
-    https://vautointerview.azurewebsites.net/api/datasetid
+    {baseUrl}/api/datasetid
     url to get a datasetId.
 
     Does not catch exceptions.
@@ -17,26 +104,46 @@ def get_dataset_id():
 
     Returns the sting value for the 'datasetId' key in the
     received dict.
+
+    deadline is an optional time.monotonic() value passed to
+    get_json_request.
+
+    endpoints is an optional endpoints.ApiEndpoints giving the
+    urls to request. Defaults to endpoints.get_endpoints().
+    """
+    if endpoints is None:
+        endpoints = get_endpoints()
+    url = endpoints.dataset_id()
+    return check_dataset_id(url=url,
+                            data_set_dict=get_json_request(
+                                url=url, deadline=deadline))
+
+
+def check_dataset_id(url, data_set_dict):
+    """
+    Checks the data returned from the datasetid url.
+
+    Raises the errors described in get_dataset_id.
+
+    Returns the string value for the 'datasetId' key.
     """
-    url = 'https://vautointerview.azurewebsites.net/api/datasetid'
-    data_set_dict = get_json_request(url=url)
     if type(data_set_dict) is not dict:
-        raise RuntimeError('Data returned {} from {} is not of type '
-                           'dict.'.format(data_set_dict, url))
+        raise ValidationError('Data returned {} from {} is not of type '
+                              'dict.', data_set_dict, url)
     # Check if key in dict; expected to raise KeyError if key
     # not in dict.
     value = data_set_dict['datasetId']
     if type(value) is not str:
-        raise RuntimeError('Data returned {} from {} does not have value '
-                           'of type str for key datasetId.'
-                           .format(data_set_dict, url))
+        raise ValidationError('Data returned {} from {} does not have '
+                              'value of type str for key datasetId.',
+                              data_set_dict, url)
     return value
 
 
-def get_vehicle_ids(data_set_id):
+def get_vehicle_ids(data_set_id, deadline=None, endpoints=None):
     """
     Makes a request to the
-    https://vautointerview.azurewebsites.net/api/{datasetId}/vehicles
+    {baseUrl}/api/{datasetId}/vehicles
     url to get a list of vehicle ids.
 
     Does not catch exceptions.
@@ -48,43 +155,131 @@ def get_vehicle_ids(data_set_id):
     key doesn't exist.
 
     Returns a list of the vehicle ids.
+
+    deadline is an optional time.monotonic() value passed to
+    get_json_request.
+
+    endpoints is an optional endpoints.ApiEndpoints giving the
+    urls to request. Defaults to endpoints.get_endpoints().
+    """
+    if endpoints is None:
+        endpoints = get_endpoints()
+    url = endpoints.vehicles(data_set_id)
+    return check_vehicle_ids(url=url,
+                             vehicle_id_dict=get_json_request(
+                                 url=url, deadline=deadline))
+
+
+def stream_vehicle_ids(data_set_id, deadline=None, endpoints=None):
+    """
+    Streaming version of get_vehicle_ids. Makes the request to the
+    {baseUrl}/api/{datasetId}/vehicles
+    url and parses the body as it downloads, so the caller can start
+    on the first vehicle ids before the list is complete and the
+    whole list is never held in memory at once.
+
+    Raises the errors of request_tools.stream_json_request when the
+    response is opened.
+
+    Returns a generator of the vehicle ids. The generator raises the
+    errors described in get_vehicle_ids, or json.JSONDecodeError if
+    the body is not valid json or ends early, when it reaches the
+    problem; ids before it have already been yielded.
+
+    deadline and endpoints are used as in get_vehicle_ids.
+    """
+    if endpoints is None:
+        endpoints = get_endpoints()
+    url = endpoints.vehicles(data_set_id)
+    chunks = stream_json_request(url=url, deadline=deadline)
+    return check_vehicle_id_stream(url=url, chunks=chunks)
+
+
+def check_vehicle_id_stream(url, chunks):
+    """
+    Parses and checks the vehicle ids in the body of the vehicles
+    url streamed as chunks of bytes.
+
+    Yields each vehicle id once it is checked.
+    """
+    try:
+        for i, v_id in enumerate(iter_json_array(chunks=chunks,
+                                                 key='vehicleIds')):
+            if type(v_id) is not int:
+                raise ValidationError('Data {} at index {} in list of '
+                                      'vehicle ids returned from {} does '
+                                      'not have value of type int.',
+                                      v_id, i, url)
+            yield v_id
+    except NotAnObjectError:
+        raise ValidationError('Data returned from {} is not of type dict.',
+                              url)
+    except NotAnArrayError:
+        raise ValidationError('Data returned from {} does not have value '
+                              'of type list for key vehicleIds.', url)
+
+
+def check_vehicle_ids(url, vehicle_id_dict):
+    """
+    Checks the data returned from the vehicles url.
+
+    Raises the errors described in get_vehicle_ids.
+
+    Returns the list value for the 'vehicleIds' key.
     """
-    url = ('https://vautointerview.azurewebsites.net/api/{}/vehicles'
-           .format(data_set_id))
-    vehicle_id_dict = get_json_request(url=url)
     if type(vehicle_id_dict) is not dict:
-        raise RuntimeError('Data returned {} from {} is not of type '
-                           'dict.'.format(vehicle_id_dict, url))
+        raise ValidationError('Data returned {} from {} is not of type '
+                              'dict.', vehicle_id_dict, url)
     # Check if key in dict; expected to raise KeyError if key
     # not in dict.
     value = vehicle_id_dict['vehicleIds']
+    if is_list_of(value, int):
+        return value
     if type(value) is not list:
-        raise RuntimeError('Data returned {} from {} does not have value '
-                           'of type list for key vehicleIds.'
-                           .format(vehicle_id_dict, url))
+        raise ValidationError('Data returned {} from {} does not have '
+                              'value of type list for key vehicleIds.',
+                              vehicle_id_dict, url)
     for i, v_id in enumerate(value):
         if type(v_id) is not int:
-            raise RuntimeError('Data {} at index {} in list of vehicle ids {} '
-                               'returned from {} does not have value '
-                               'of type int.'
-                               .format(v_id, i, value, url))
-    return value
+            raise ValidationError('Data {} at index {} in list of vehicle '
+                                  'ids {} returned from {} does not have '
+                                  'value of type int.',
+                                  v_id, i, value, url)
 
 
-def get_data_for_vehicles(data_set_id, vehicle_ids):
+def get_data_for_vehicles(data_set_id, vehicle_ids, executor=None,
+                          max_workers=None, cache=None, deadline=None,
+                          endpoints=None, fetch_strategy=None):
     """
-    Calls get_vehicle_data to get details for a specific
-    vehicle id at the url
-    https://vautointerview.azurewebsites.net/api/{datasetId}/vehicles/{vehicleId}.
+    Uses fetch_strategy to get details for each vehicle id from
+    the url
+    {baseUrl}/api/{datasetId}/vehicles/{vehicleId}.
+
+    Requests are run through a bounded thread pool. Uses the
+    provided executor if given, otherwise creates one limited to
+    max_workers concurrent requests for the duration of the call.
+
+    cache is an optional response_cache.ResponseCache passed to
+    each detail request.
+
+    deadline is an optional time.monotonic() value. Vehicles not
+    downloaded by then are reported in the error list with
+    DEADLINE_ERROR_MESSAGE and the rest are returned.
+
+    endpoints is an optional endpoints.ApiEndpoints giving the
+    urls to request. Defaults to endpoints.get_endpoints().
+
+    fetch_strategy is an optional PerIdFetchStrategy or
+    BatchFetchStrategy deciding how ids are fetched. Defaults to
+    one request per id.
 
     Does not catch exceptions.
 
     Returns a list of of dealers and an error list.
 
-    The dealer list contains a list of dicts which contain
-    the dealerId and the list of vehicles for each dealer.
-    Each vehicle in the list of vehicles is a dict containing
-    the vehicleId, year, make, and model keys.
+    The dealer list contains a records.Dealer for each dealer
+    holding its dealer_id and a list of records.Vehicle with the
+    vehicle_id, year, make, and model of each of its vehicles.
 
     If an error occurs when downloading vehicle info, will
     save the error for that vehicle id in the dict under the
@@ -93,24 +288,233 @@ def get_data_for_vehicles(data_set_id, vehicle_ids):
     error. Any vehicle with an error will be saved in an
     error list which is returned separately.
     """
+    if endpoints is None:
+        endpoints = get_endpoints()
+    if fetch_strategy is None:
+        fetch_strategy = PerIdFetchStrategy()
+    future_list = []
+    with executor_scope(executor=executor,
+                        max_workers=max_workers,
+                        deadline=deadline) as pool:
+        for chunk in chunk_ids(ids=vehicle_ids,
+                               size=fetch_strategy.batch_size):
+            future_list.append((chunk,
+                                pool.submit(fetch_strategy.fetch_vehicles,
+                                            data_set_id=data_set_id,
+                                            vehicle_ids=chunk,
+                                            endpoints=endpoints,
+                                            cache=cache,
+                                            deadline=deadline)))
+        vehicle_info_list = get_results_by_deadline(future_list=future_list,
+                                                    id_key='vehicleId',
+                                                    deadline=deadline)
+    return group_vehicles_by_dealer(vehicle_info_list=vehicle_info_list)
+
+
+def chunk_ids(ids, size):
+    """
+    Yields lists of at most size consecutive ids from the iterable
+    ids.
+    """
+    id_iter = iter(ids)
+    while True:
+        chunk = list(islice(id_iter, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def get_results_by_deadline(future_list, id_key, deadline=None):
+    """
+    Waits for the futures in future_list, a list of (id list,
+    future) pairs, until deadline, an optional time.monotonic()
+    value. Each future returns a dict of results keyed by the ids
+    in its id list, as returned by the fetch strategy methods.
+
+    Futures not done by then are all cancelled and the result for
+    each of their ids is an error dict holding the id under id_key
+    and DEADLINE_ERROR_MESSAGE under error_message, even if a
+    running future finishes while the results are read.
+
+    Returns the list of results in the order of the ids in
+    future_list.
+    """
+    unfinished = set()
+    if deadline is not None:
+        _, unfinished = wait({future for _, future in future_list},
+                             timeout=max(0, deadline - time.monotonic()))
+        # Cancelled before any result is read, so queued futures are
+        # not started by the workers while the results are gathered.
+        for future in unfinished:
+            future.cancel()
+    result_list = []
+    for id_list, future in future_list:
+        if future in unfinished:
+            result_list.extend({id_key: item_id,
+                                'error_message': DEADLINE_ERROR_MESSAGE}
+                               for item_id in id_list)
+        else:
+            results = future.result()
+            result_list.extend(results[item_id] for item_id in id_list)
+    return result_list
+
+
+def get_data_for_vehicles_and_dealers(data_set_id, vehicle_ids,
+                                      executor=None, max_workers=None,
+                                      cache=None, dealer_memo=None,
+                                      deadline=None, endpoints=None,
+                                      fetch_strategy=None):
+    """
+    Combines get_data_for_vehicles and get_dealer_names so dealer
+    requests overlap with vehicle requests. The first time a
+    dealerId appears in a vehicle response, the request for that
+    dealer's info is scheduled on the same pool.
+
+    Vehicle requests are submitted as earlier ones finish, keeping
+    at most max_workers (or DEFAULT_MAX_WORKERS) requests queued or
+    running, so dealer requests never wait behind the whole vehicle
+    backlog. With a BatchFetchStrategy each request is a batch, and
+    the new dealerIds from each vehicle batch are fetched together.
+    Uses the provided executor if given, otherwise creates one
+    limited to max_workers. cache is passed to each detail request
+    and dealer_memo to each dealer request.
+
+    deadline is an optional time.monotonic() value. Once it passes
+    no more requests are started, and vehicles or dealers not
+    downloaded are reported in the error lists with
+    DEADLINE_ERROR_MESSAGE.
+
+    endpoints is an optional endpoints.ApiEndpoints giving the
+    urls to request. Defaults to endpoints.get_endpoints().
+
+    fetch_strategy is an optional PerIdFetchStrategy or
+    BatchFetchStrategy deciding how ids are fetched. Defaults to
+    one request per id.
+
+    Does not catch exceptions.
+
+    Returns the dealer list, the vehicle error list, and the dealer
+    error list. These are the same as those returned by calling
+    get_data_for_vehicles then get_dealer_names.
+    """
+    if max_workers is None:
+        max_workers = DEFAULT_MAX_WORKERS
+    if endpoints is None:
+        endpoints = get_endpoints()
+    if fetch_strategy is None:
+        fetch_strategy = PerIdFetchStrategy()
+    batch_size = fetch_strategy.batch_size
+    vehicle_futures = []
+    # Vehicle futures whose dealers have been scheduled.
+    processed = set()
+    dealer_futures = {}
+    dealer_future_set = set()
+    with executor_scope(executor=executor,
+                        max_workers=max_workers,
+                        deadline=deadline) as pool:
+        vehicle_id_iter = iter(vehicle_ids)
+        ids_exhausted = False
+        pending = set()
+        while True:
+            while (not ids_exhausted and len(pending) < max_workers
+                   and (deadline is None or time.monotonic() < deadline)):
+                chunk = list(islice(vehicle_id_iter, batch_size))
+                if not chunk:
+                    ids_exhausted = True
+                    break
+                future = pool.submit(fetch_strategy.fetch_vehicles,
+                                     data_set_id=data_set_id,
+                                     vehicle_ids=chunk,
+                                     endpoints=endpoints,
+                                     cache=cache,
+                                     deadline=deadline)
+                vehicle_futures.append((chunk, future))
+                pending.add(future)
+            if not pending:
+                break
+            if deadline is None:
+                timeout = None
+            else:
+                timeout = max(0, deadline - time.monotonic())
+            done, pending = wait(pending, timeout=timeout,
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future in dealer_future_set:
+                    continue
+                processed.add(future)
+                new_dealer_ids = []
+                for vehicle_info in future.result().values():
+                    if 'error_message' in vehicle_info:
+                        continue
+                    dealer_id = vehicle_info['dealerId']
+                    if dealer_id not in dealer_futures:
+                        # Placeholder so the id is only scheduled once.
+                        dealer_futures[dealer_id] = None
+                        new_dealer_ids.append(dealer_id)
+                for chunk in chunk_ids(ids=new_dealer_ids, size=batch_size):
+                    dealer_future = pool.submit(fetch_strategy.fetch_dealers,
+                                                data_set_id=data_set_id,
+                                                dealer_ids=chunk,
+                                                endpoints=endpoints,
+                                                cache=cache,
+                                                memo=dealer_memo,
+                                                deadline=deadline)
+                    for dealer_id in chunk:
+                        dealer_futures[dealer_id] = dealer_future
+                    dealer_future_set.add(dealer_future)
+                    pending.add(dealer_future)
+        # Vehicles finished after the loop stopped at the deadline are
+        # dropped, as their dealers were never scheduled.
+        vehicle_info_list = []
+        for chunk, future in vehicle_futures:
+            if future in processed:
+                results = future.result()
+                vehicle_info_list.extend(results[vehicle_id]
+                                         for vehicle_id in chunk)
+            else:
+                future.cancel()
+                vehicle_info_list.extend(
+                    {'vehicleId': vehicle_id,
+                     'error_message': DEADLINE_ERROR_MESSAGE}
+                    for vehicle_id in chunk)
+        # Ids never submitted because the deadline passed.
+        vehicle_info_list.extend({'vehicleId': vehicle_id,
+                                  'error_message': DEADLINE_ERROR_MESSAGE}
+                                 for vehicle_id in vehicle_id_iter)
+        dealer_list, vehicle_error_list = group_vehicles_by_dealer(
+            vehicle_info_list=vehicle_info_list)
+        if dealer_list is None:
+            return dealer_list, vehicle_error_list, None
+        dealer_info_list = get_results_by_deadline(
+            future_list=[([dealer.dealer_id],
+                          dealer_futures[dealer.dealer_id])
+                         for dealer in dealer_list],
+            id_key='dealerId',
+            deadline=deadline)
+    dealer_list, dealer_error_list = add_dealer_names(
+        dealer_list=dealer_list,
+        dealer_info_list=dealer_info_list)
+    return dealer_list, vehicle_error_list, dealer_error_list
+
+
+def group_vehicles_by_dealer(vehicle_info_list):
+    """
+    Groups a list of vehicle info dicts, as returned by
+    get_vehicle_data, by dealerId.
+
+    Returns a list of dealers and an error list as described
+    in get_data_for_vehicles. Dealers are ordered by the first
+    appearance of their dealerId in vehicle_info_list.
+    """
     error_list = None
     dealer_list = None
-    download_return = {}
-    thread_list = []
-    for vehicle_id in vehicle_ids:
-        url = ('https://vautointerview.azurewebsites.net/api/{}/vehicles/{}'
-               .format(data_set_id, vehicle_id))
-        download_return[vehicle_id] = {}
-        kwargs = {'url': url,
-                  'data_return': download_return,
-                  'vehicle_id': vehicle_id}
-        v_thread = Thread(target=get_vehicle_data, kwargs=kwargs)
-        v_thread.start()
-        thread_list.append(v_thread)
-    for v_thread in thread_list:
-        v_thread.join()
-    for vehicle_id in download_return:
-        vehicle_info = download_return[vehicle_id]
+    # Maps dealerId to its entry in dealer_list so each vehicle is
+    # grouped in constant time while dealer_list keeps the order of
+    # first appearance.
+    dealer_index = {}
+    for vehicle_info in vehicle_info_list:
         if 'error_message' in vehicle_info:
             if error_list:
                 error_list.append(vehicle_info)
@@ -118,37 +522,31 @@ def get_data_for_vehicles(data_set_id, vehicle_ids):
                 error_list = [vehicle_info]
         else:
             dealer_id = vehicle_info['dealerId']
-            d_v_info = {k: v
-                        for k, v in vehicle_info.items()
-                        if k != 'dealerId'}
-            if dealer_list:
-                dealer = next((dealer_info
-                               for dealer_info in dealer_list
-                               if dealer_info['dealerId'] ==
-                               dealer_id),
-                              None)
-                if dealer:
-                    dealer['vehicles'].append(d_v_info)
-                else:
-                    dealer_list.append({'dealerId': dealer_id,
-                                        'vehicles': [d_v_info]})
+            vehicle = Vehicle.from_info(vehicle_info)
+            dealer = dealer_index.get(dealer_id)
+            if dealer:
+                dealer.vehicles.append(vehicle)
             else:
-                dealer_list = [{'dealerId': dealer_id,
-                                'vehicles': [d_v_info]}]
+                dealer = Dealer(dealer_id=dealer_id, vehicles=[vehicle])
+                dealer_index[dealer_id] = dealer
+                if dealer_list:
+                    dealer_list.append(dealer)
+                else:
+                    dealer_list = [dealer]
     return dealer_list, error_list
 
 
-def get_vehicle_data(url, data_return, vehicle_id):
+def get_vehicle_data(url, vehicle_id, cache=None, deadline=None):
     """
     Makes requests to the
-    https://vautointerview.azurewebsites.net/api/{datasetId}/vehicles/{vehicleId}
+    {baseUrl}/api/{datasetId}/vehicles/{vehicleId}
     url to get details for a specific vehicle id.
 
     Catches exceptions and adds them to error_message field.
 
-    Fills in the provided data_return variable with the
-    vehicle info. The vehicle info is a dict containing
-    the dealerId, vehicleId, year, make, and model keys.
+    Returns the vehicle info. The vehicle info is a dict
+    containing the dealerId, vehicleId, year, make, and model
+    keys.
 
     If an error occurs when downloading vehicle info, will
     save the error for that vehicle id in the dict under the
@@ -162,57 +560,110 @@ def get_vehicle_data(url, data_return, vehicle_id):
     is expected to be an integer. The make is expected to
     be a string. The model is expected to be a string. The
     dealerId is expected to be an integer.
+
+    If cache is provided, a cached response for url is used
+    instead of making a request, and a valid downloaded response
+    is added to the cache.
+
+    deadline is an optional time.monotonic() value passed to
+    get_json_request.
     """
     try:
-        vehicle_info_dict = get_json_request(url=url)
-        if type(vehicle_info_dict) is not dict:
-            raise RuntimeError('Data returned {} from {} is not '
-                               'of type dict.'
-                               .format(vehicle_info_dict, url))
-        expected_keys_and_types = {'vehicleId': int,
-                                   'year': int,
-                                   'make': str,
-                                   'model': str,
-                                   'dealerId': int}
-        for key in expected_keys_and_types:
-            if key not in vehicle_info_dict:
-                raise KeyError('Key {} not found in vehicle '
-                               'info dict {} returned from '
-                               'url {}'
-                               .format(key,
-                                       vehicle_info_dict,
-                                       url))
-            if type(vehicle_info_dict
-                    [key]) is not expected_keys_and_types[key]:
-                raise RuntimeError('Value {} is not type {} '
-                                   'in vehicle info '
-                                   'dict {} returned from url {}'
-                                   .format(vehicle_info_dict[key],
-                                           expected_keys_and_types
-                                           [key].__name__,
-                                           vehicle_info_dict,
-                                           url))
-        data_return[vehicle_id] = vehicle_info_dict
+        return get_checked_json_request(url=url,
+                                        check=check_vehicle_info,
+                                        cache=cache,
+                                        deadline=deadline)
     except Exception as e:
-        data_return[vehicle_id]['vehicleId'] = vehicle_id
-        data_return[vehicle_id]['error_message'] = str(e)
+        return {'vehicleId': vehicle_id,
+                'error_message': get_error_message(error=e,
+                                                   deadline=deadline)}
 
 
-def get_dealer_names(data_set_id, dealer_list):
+def get_error_message(error, deadline=None):
     """
-    Calls get_dealer_info to get details for a specific
-    dealer id at the url
-    https://vautointerview.azurewebsites.net/api/{datasetId}/dealers/{dealerId}.
+    Returns the error_message for an error caught while fetching an
+    id: DEADLINE_ERROR_MESSAGE if it is a
+    request_tools.DeadlineExceeded or was raised after deadline, an
+    optional time.monotonic() value, so the id is reported as
+    unfinished, otherwise str(error).
+    """
+    if isinstance(error, DeadlineExceeded) or (
+            deadline is not None and time.monotonic() >= deadline):
+        return DEADLINE_ERROR_MESSAGE
+    return str(error)
+
+
+def get_checked_json_request(url, check, cache=None, deadline=None):
+    """
+    Calls get_json_request for url and passes the url and returned
+    data to check, which raises if the data is not valid.
+
+    If cache is provided, returns the cached data for url when there
+    is an entry, and stores newly downloaded data only after it
+    passes check. deadline is passed to get_json_request.
+
+    Returns the checked data.
+    """
+    if cache is not None:
+        data = cache.get(url)
+        if data is not None:
+            return data
+    data = check(url, get_json_request(url=url, deadline=deadline))
+    if cache is not None:
+        cache.set(url, data)
+    return data
+
+
+def check_vehicle_info(url, vehicle_info_dict):
+    """
+    Checks the data returned from a vehicle detail url.
+
+    Raises validation.MissingKeyError, a KeyError, or
+    validation.ValidationError, a RuntimeError, for the problems
+    described in get_vehicle_data.
+
+    Returns the vehicle info dict.
+    """
+    return VEHICLE_INFO_SCHEMA.check(url=url, data=vehicle_info_dict)
+
+
+def get_dealer_names(data_set_id, dealer_list, executor=None,
+                     max_workers=None, cache=None, dealer_memo=None,
+                     deadline=None, endpoints=None, fetch_strategy=None):
+    """
+    Uses fetch_strategy to get details for each dealer id from
+    the url
+    {baseUrl}/api/{datasetId}/dealers/{dealerId}.
+
+    Requests are run through a bounded thread pool. Uses the
+    provided executor if given, otherwise creates one limited to
+    max_workers concurrent requests for the duration of the call.
+
+    cache is an optional response_cache.ResponseCache passed to
+    each detail request.
+
+    dealer_memo is an optional memo.LRUMemo passed to each dealer
+    request.
+
+    deadline is an optional time.monotonic() value. Dealers not
+    downloaded by then are reported in the error list with
+    DEADLINE_ERROR_MESSAGE.
+
+    endpoints is an optional endpoints.ApiEndpoints giving the
+    urls to request. Defaults to endpoints.get_endpoints().
+
+    fetch_strategy is an optional PerIdFetchStrategy or
+    BatchFetchStrategy deciding how ids are fetched. Defaults to
+    one request per id.
 
     Does not catch exceptions.
 
     Returns an updated dealer list where the name has been added
-    for each dealer and an error list.
+    for each dealer and an error list. Both are None if dealer_list
+    is None, as when no vehicle was downloaded before a deadline.
 
-    The dealer list contains a list of dicts which contain
-    the dealerId, name, and the list of vehicles for each dealer.
-    Each vehicle in the list of vehicles is a dict containing
-    the vehicleId, year, make, and model keys.
+    The dealer list contains the records.Dealer for each dealer
+    with its name set.
 
     If an error occurs when downloading dealer info, will
     save the error for that dealer id in the dict under the
@@ -221,45 +672,66 @@ def get_dealer_names(data_set_id, dealer_list):
     error. Any dealer with an error will be saved in an
     error list which is returned separately.
     """
+    if dealer_list is None:
+        return None, None
+    if endpoints is None:
+        endpoints = get_endpoints()
+    if fetch_strategy is None:
+        fetch_strategy = PerIdFetchStrategy()
+    future_list = []
+    with executor_scope(executor=executor,
+                        max_workers=max_workers,
+                        deadline=deadline) as pool:
+        for chunk in chunk_ids(ids=[dealer.dealer_id
+                                    for dealer in dealer_list],
+                               size=fetch_strategy.batch_size):
+            future_list.append((chunk,
+                                pool.submit(fetch_strategy.fetch_dealers,
+                                            data_set_id=data_set_id,
+                                            dealer_ids=chunk,
+                                            endpoints=endpoints,
+                                            cache=cache,
+                                            memo=dealer_memo,
+                                            deadline=deadline)))
+        dealer_info_list = get_results_by_deadline(future_list=future_list,
+                                                   id_key='dealerId',
+                                                   deadline=deadline)
+    return add_dealer_names(dealer_list=dealer_list,
+                            dealer_info_list=dealer_info_list)
+
+
+def add_dealer_names(dealer_list, dealer_info_list):
+    """
+    Adds the name from each dealer info dict, as returned by
+    get_dealer_info, to the dealer at the same position in
+    dealer_list.
+
+    Returns the updated dealer list and an error list as described
+    in get_dealer_names.
+    """
     error_list = None
-    download_return = {}
-    thread_list = []
-    for dealer in dealer_list:
-        dealer_id = dealer['dealerId']
-        url = ('https://vautointerview.azurewebsites.net/api/{}/dealers/{}'
-               .format(data_set_id, dealer_id))
-        download_return[dealer_id] = {}
-        kwargs = {'url': url,
-                  'data_return': download_return,
-                  'dealer_id': dealer_id}
-        d_thread = Thread(target=get_dealer_info, kwargs=kwargs)
-        d_thread.start()
-        thread_list.append(d_thread)
-    for d_thread in thread_list:
-        d_thread.join()
-    for dealer in dealer_list:
-        dealer_id = dealer['dealerId']
-        dealer_info = download_return[dealer_id]
+    for dealer, dealer_info in zip(dealer_list, dealer_info_list):
         if 'error_message' in dealer_info:
             if error_list:
                 error_list.append(dealer_info)
             else:
                 error_list = [dealer_info]
         else:
-            dealer['name'] = dealer_info['name']
+            dealer.name = dealer_info['name']
     return dealer_list, error_list
 
 
-def get_dealer_info(url, data_return, dealer_id):
+def get_dealer_info(url, dealer_id, cache=None, memo=None,
+                    deadline=None):
     """
     Makes requests to the
-    https://vautointerview.azurewebsites.net/api/{datasetId}/dealers/{dealerId}
+    {baseUrl}/api/{datasetId}/dealers/{dealerId}
     url to get details for a specific dealer id.
 
     Catches exceptions and adds them to error_message field.
 
-    Adds the name field for the dealer in the provided data_return variable
-    which comes from the downloaded dealer info.
+    Returns the downloaded dealer info dict which contains
+    the dealerId and name keys.
 
     If an error occurs when downloading dealer info, will
     save the error for that dealer id in the dict under the
@@ -271,34 +743,211 @@ def get_dealer_info(url, data_return, dealer_id):
     with the keys of dealerId and name.
     The dealerId is expected to be an integer. The name is
     expected to be a string.
+
+    If cache is provided, a cached response for url is used
+    instead of making a request, and a valid downloaded response
+    is added to the cache.
+
+    If memo is provided, dealer info already in memory for the
+    dealer id is returned without a request. Dealer info downloaded
+    successfully is added to memo so later datasets sharing the
+    dealer can reuse it.
+
+    deadline is an optional time.monotonic() value passed to
+    get_json_request.
     """
     try:
-        dealer_info_dict = get_json_request(url=url)
-        if type(dealer_info_dict) is not dict:
-            raise RuntimeError('Data returned {} from {} is not '
-                               'of type dict.'
-                               .format(dealer_info_dict, url))
-        expected_keys_and_types = {'name': str,
-                                   'dealerId': int}
-        for key in expected_keys_and_types:
-            if key not in dealer_info_dict:
-                raise KeyError('Key {} not found in dealer '
-                               'info dict {} returned from '
-                               'url {}'
-                               .format(key,
-                                       dealer_info_dict,
-                                       url))
-            if type(dealer_info_dict
-                    [key]) is not expected_keys_and_types[key]:
-                raise RuntimeError('Value {} is not type {} '
-                                   'in dealer info '
-                                   'dict {} returned from url {}'
-                                   .format(dealer_info_dict[key],
-                                           expected_keys_and_types
-                                           [key].__name__,
-                                           dealer_info_dict,
-                                           url))
-        data_return[dealer_id] = dealer_info_dict
+        if memo is not None:
+            dealer_info_dict = memo.get(dealer_id)
+            if dealer_info_dict is not None:
+                return dealer_info_dict
+        dealer_info_dict = get_checked_json_request(url=url,
+                                                    check=check_dealer_info,
+                                                    cache=cache,
+                                                    deadline=deadline)
+        if memo is not None:
+            memo.put(dealer_id, dealer_info_dict)
+        return dealer_info_dict
     except Exception as e:
-        data_return[dealer_id]['dealerId'] = dealer_id
-        data_return[dealer_id]['error_message'] = str(e)
+        return {'dealerId': dealer_id,
+                'error_message': get_error_message(error=e,
+                                                   deadline=deadline)}
+
+
+def check_dealer_info(url, dealer_info_dict):
+    """
+    Checks the data returned from a dealer detail url.
+
+    Raises validation.MissingKeyError, a KeyError, or
+    validation.ValidationError, a RuntimeError, for the problems
+    described in get_dealer_info.
+
+    Returns the dealer info dict.
+    """
+    return DEALER_INFO_SCHEMA.check(url=url, data=dealer_info_dict)
+
+
+def get_bulk_records(kind, data_set_id, ids, endpoints, deadline=None):
+    """
+    Default bulk fetcher of BatchFetchStrategy. Makes one request to
+    the {baseUrl}/api/{datasetId}/vehicles?ids={ids} url, or the
+    dealers one when kind is 'dealer', for the info of every id in
+    ids.
+
+    Does not catch exceptions.
+
+    Raises validation.ValidationError, a RuntimeError, if data back
+    from url is not a list.
+
+    Returns the list of records. Records are matched to ids and
+    checked by the strategy.
+    """
+    if kind == 'vehicle':
+        url = endpoints.vehicle_batch(data_set_id, ids)
+    else:
+        url = endpoints.dealer_batch(data_set_id, ids)
+    records = get_json_request(url=url, deadline=deadline)
+    if type(records) is not list:
+        raise ValidationError('Data returned {} from {} is not of type '
+                              'list.', records, url)
+    return records
+
+
+class PerIdFetchStrategy(object):
+    """
+    Fetch strategy making one request per vehicle or dealer id
+    through get_vehicle_data and get_dealer_info.
+
+    The fetch methods take a list of at most batch_size ids and
+    return a dict of the info dict, or error dict, for each id.
+    """
+    batch_size = 1
+
+    def fetch_vehicles(self, data_set_id, vehicle_ids, endpoints,
+                       cache=None, deadline=None):
+        return {vehicle_id: get_vehicle_data(
+                    url=endpoints.vehicle(data_set_id, vehicle_id),
+                    vehicle_id=vehicle_id,
+                    cache=cache,
+                    deadline=deadline)
+                for vehicle_id in vehicle_ids}
+
+    def fetch_dealers(self, data_set_id, dealer_ids, endpoints,
+                      cache=None, memo=None, deadline=None):
+        return {dealer_id: get_dealer_info(
+                    url=endpoints.dealer(data_set_id, dealer_id),
+                    dealer_id=dealer_id,
+                    cache=cache,
+                    memo=memo,
+                    deadline=deadline)
+                for dealer_id in dealer_ids}
+
+
+class BatchFetchStrategy(object):
+    """
+    Fetch strategy handing up to batch_size ids at once to
+    bulk_fetcher, for backends or proxies that can return many
+    records per request.
+
+    bulk_fetcher is called with kind ('vehicle' or 'dealer'),
+    data_set_id, ids, endpoints and deadline and returns a list of
+    records. Defaults to get_bulk_records.
+
+    Each record is matched to its id and checked with
+    check_vehicle_info or check_dealer_info, so a bad or missing
+    record only gives an error dict for its own id. A failed bulk
+    request gives an error dict for every id in the batch. cache
+    and memo are used per id as in get_vehicle_data and
+    get_dealer_info, with the same keys, so both strategies share
+    cached responses.
+    """
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, bulk_fetcher=None):
+        if type(batch_size) is not int or batch_size < 1:
+            raise ValueError('batch_size {} is not a positive int.'
+                             .format(batch_size))
+        if bulk_fetcher is None:
+            bulk_fetcher = get_bulk_records
+        self.batch_size = batch_size
+        self.bulk_fetcher = bulk_fetcher
+
+    def fetch_vehicles(self, data_set_id, vehicle_ids, endpoints,
+                       cache=None, deadline=None):
+        return self.fetch(kind='vehicle',
+                          data_set_id=data_set_id,
+                          urls={vehicle_id:
+                                endpoints.vehicle(data_set_id, vehicle_id)
+                                for vehicle_id in vehicle_ids},
+                          check=check_vehicle_info,
+                          endpoints=endpoints,
+                          cache=cache,
+                          deadline=deadline)
+
+    def fetch_dealers(self, data_set_id, dealer_ids, endpoints,
+                      cache=None, memo=None, deadline=None):
+        return self.fetch(kind='dealer',
+                          data_set_id=data_set_id,
+                          urls={dealer_id:
+                                endpoints.dealer(data_set_id, dealer_id)
+                                for dealer_id in dealer_ids},
+                          check=check_dealer_info,
+                          endpoints=endpoints,
+                          cache=cache,
+                          memo=memo,
+                          deadline=deadline)
+
+    def fetch(self, kind, data_set_id, urls, check, endpoints,
+              cache=None, memo=None, deadline=None):
+        """
+        Fetches the info for each id in urls, a dict of id to its
+        detail url, with one bulk_fetcher call for the ids not
+        found in memo or cache.
+
+        Returns a dict of the info dict, or error dict, for each id.
+        """
+        id_key = kind + 'Id'
+        results = {}
+        missing_ids = []
+        for item_id, url in urls.items():
+            data = None
+            if memo is not None:
+                data = memo.get(item_id)
+            if data is None and cache is not None:
+                data = cache.get(url)
+            if data is None:
+                missing_ids.append(item_id)
+            else:
+                results[item_id] = data
+        if not missing_ids:
+            return results
+        try:
+            records = self.bulk_fetcher(kind=kind,
+                                        data_set_id=data_set_id,
+                                        ids=missing_ids,
+                                        endpoints=endpoints,
+                                        deadline=deadline)
+        except Exception as e:
+            error_message = get_error_message(error=e, deadline=deadline)
+            for item_id in missing_ids:
+                results[item_id] = {id_key: item_id,
+                                    'error_message': error_message}
+            return results
+        records_by_id = {record.get(id_key): record
+                         for record in records
+                         if type(record) is dict}
+        for item_id in missing_ids:
+            url = urls[item_id]
+            try:
+                if item_id not in records_by_id:
+                    raise KeyError('No {} info for id {} in bulk response '
+                                   'for url {}'.format(kind, item_id, url))
+                data = check(url, records_by_id[item_id])
+            except Exception as e:
+                results[item_id] = {id_key: item_id,
+                                    'error_message': str(e)}
+                continue
+            if cache is not None:
+                cache.set(url, data)
+            if memo is not None:
+                memo.put(item_id, data)
+            results[item_id] = data
+        return results
@@ -1,12 +1,41 @@
+import asyncio
 import logging
-from .data_collection import (get_dataset_id,
+import time
+from concurrent.futures import (ThreadPoolExecutor)
+from .async_data_collection import (async_get_dataset_id,
+                                    async_get_vehicle_ids,
+                                    async_get_data_for_vehicles,
+                                    async_get_dealer_names,
+                                    DEFAULT_MAX_CONCURRENCY)
+from .checkpoint import (CheckpointFetchStrategy,
+                         SnapshotFetchStrategy,
+                         load_snapshot,
+                         open_checkpoint)
+from .data_collection import (DEADLINE_ERROR_MESSAGE,
+                              get_dataset_id,
                               get_vehicle_ids,
+                              stream_vehicle_ids,
                               get_data_for_vehicles,
-                              get_dealer_names)
-from .request_tools import (post_json_request)
+                              get_dealer_names,
+                              get_data_for_vehicles_and_dealers,
+                              executor_scope)
+from .endpoints import (get_endpoints)
+from .memo import (LRUMemo)
+from .metrics import (get_metrics)
+from .records import (iter_answer_json,
+                      serialize_dealers)
+from .request_tools import (post_json_request,
+                            post_json_stream_request,
+                            async_post_json_request,
+                            create_async_session)
+from .sharded_data_collection import (get_data_for_vehicles_sharded)
 
 
-def merge():
+def merge(max_workers=None, stream_dealers=True, cache=None,
+          dealer_memo=None, deadline=None, endpoints=None,
+          fetch_strategy=None, stream_ids=False, stream_answer=False,
+          compress_answer=False, data_set_id=None, executor=None,
+          shards=None, checkpoint_dir=None, snapshot_path=None):
     """
     Gets the data set id from the challenge API.
     Then gets the list of vehicle ids for that data set.
@@ -16,6 +45,75 @@ def merge():
     Adds the dealer name for each dealer id in the dealer list.
     Submits the dealer list to the answer API endpoint.
 
+    Vehicle and dealer requests share one bounded thread pool
+    which runs at most max_workers requests at once. When
+    stream_dealers is True, each dealer's info is requested as soon
+    as its dealerId is first seen instead of after all vehicles are
+    downloaded.
+
+    cache is an optional response_cache.ResponseCache used for
+    vehicle and dealer detail requests so ids seen in earlier runs
+    are not downloaded again. dealer_memo is an optional
+    memo.LRUMemo of dealer info kept in memory across merges run
+    in the same process.
+
+    deadline is an optional number of seconds the merge may spend
+    collecting data. Requests are not started after it and
+    vehicles or dealers still outstanding are left out of the
+    answer, which is submitted with the data collected so far. The
+    ids that did not finish are logged.
+
+    endpoints is an optional endpoints.ApiEndpoints giving the urls
+    of every request, defaulting to endpoints.get_endpoints().
+    fetch_strategy is an optional data_collection.BatchFetchStrategy
+    used to fetch vehicles and dealers in batches instead of one
+    request per id.
+
+    When stream_ids is True the vehicle id list is parsed as it
+    downloads and vehicle requests start on the first ids instead of
+    after the whole list. A failure part way through the list is not
+    retried and fails the merge.
+
+    When stream_answer is True the answer is encoded one dealer at a
+    time as it is sent with chunked transfer encoding instead of
+    being built as one json string first. compress_answer also
+    gzips the streamed answer.
+
+    data_set_id is an optional dataset to merge instead of
+    requesting a new one. executor is an optional thread pool to
+    run requests on instead of a new one of max_workers threads,
+    which lets several merges share one pool.
+
+    When shards is more than 1 the vehicle details are fetched by
+    that many processes with
+    sharded_data_collection.get_data_for_vehicles_sharded, sharing
+    the max_workers request budget, and the dealer names are then
+    fetched by this process. Dealers are not streamed in this mode
+    and cache is not used for vehicles.
+
+    checkpoint_dir is an optional directory holding an append-only
+    checkpoint.CheckpointLog per dataset. Every vehicle and dealer
+    fetched is appended to the log of the dataset, and ids already
+    in it are not fetched again, so rerunning a merge that died
+    with the same data_set_id only fetches the missing ids. Not
+    supported with shards.
+
+    snapshot_path is an optional checkpoint.CheckpointLog file of an
+    earlier version of the dataset, such as the log of a previous
+    run written to checkpoint_dir. Only vehicle ids missing from it
+    are fetched, and only dealers missing from it, while the answer
+    is built from the vehicles and dealers of the new vehicle id
+    list. Vehicles and dealers are assumed not to change between
+    versions; ids dropped from the dataset are left out of the
+    answer.
+
+    The time of each phase is recorded in the merge_phase_seconds
+    metric of metrics.get_metrics() and logged as a structured json
+    line. The phases are dataset_id, vehicle_ids, vehicle_detail,
+    dealer_detail and post, with vehicle_and_dealer_detail replacing
+    the two detail phases when stream_dealers is True. With
+    stream_ids the vehicle id download overlaps the detail phase.
+
     Doesn't catch errors.
 
     Logs errors in getting vehicle and dealer info without stopping
@@ -24,26 +122,337 @@ def merge():
     Returns the python object generated from the json response of the
     answer submission.
     """
-    logging.info('Getting data set id.')
-    data_set_id = get_dataset_id()
+    if checkpoint_dir is not None and shards is not None and shards > 1:
+        raise ValueError('checkpoint_dir is not supported with shards.')
+    if deadline is not None:
+        deadline = time.monotonic() + deadline
+    if endpoints is None:
+        endpoints = get_endpoints()
+    metrics = get_metrics()
+    if data_set_id is None:
+        logging.info('Getting data set id.')
+        with metrics.phase('dataset_id'):
+            data_set_id = get_dataset_id(deadline=deadline,
+                                         endpoints=endpoints)
+    if snapshot_path is not None:
+        snapshot = load_snapshot(snapshot_path)
+        logging.info('Snapshot {} has {} vehicles and {} dealers.'
+                     .format(snapshot.path, len(snapshot.vehicles),
+                             len(snapshot.dealers)))
+        fetch_strategy = SnapshotFetchStrategy(
+            snapshot=snapshot, fetch_strategy=fetch_strategy)
+    checkpoint = None
+    if checkpoint_dir is not None:
+        checkpoint = open_checkpoint(directory=checkpoint_dir,
+                                     data_set_id=data_set_id)
+        logging.info('Checkpoint {} has {} vehicles and {} dealers.'
+                     .format(checkpoint.path, len(checkpoint.vehicles),
+                             len(checkpoint.dealers)))
+        fetch_strategy = CheckpointFetchStrategy(
+            checkpoint=checkpoint, fetch_strategy=fetch_strategy)
+    try:
+        return collect_and_post(
+            data_set_id=data_set_id, max_workers=max_workers,
+            stream_dealers=stream_dealers, cache=cache,
+            dealer_memo=dealer_memo, deadline=deadline,
+            endpoints=endpoints, fetch_strategy=fetch_strategy,
+            stream_ids=stream_ids, stream_answer=stream_answer,
+            compress_answer=compress_answer, executor=executor,
+            shards=shards)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+
+
+def collect_and_post(data_set_id, max_workers, stream_dealers, cache,
+                     dealer_memo, deadline, endpoints, fetch_strategy,
+                     stream_ids, stream_answer, compress_answer, executor,
+                     shards):
+    """
+    Collects the vehicles and dealers of data_set_id and posts the
+    answer as described in merge. deadline is a time.monotonic()
+    value and endpoints is not None.
+    """
+    metrics = get_metrics()
     logging.info('Getting vehicle ids for data set id {}.'
                  .format(data_set_id))
-    vehicle_ids = get_vehicle_ids(data_set_id=data_set_id)
-    logging.info('Getting vehicle info.')
-    dealer_list, error_list = get_data_for_vehicles(data_set_id=data_set_id,
-                                                    vehicle_ids=vehicle_ids)
-    if error_list:
-        for item in error_list:
-            logging.info('Error {} in getting info for vehicle id {}'
-                         .format(item['error_message'], item['vehicleId']))
+    with metrics.phase('vehicle_ids'):
+        if stream_ids:
+            vehicle_ids = stream_vehicle_ids(data_set_id=data_set_id,
+                                             deadline=deadline,
+                                             endpoints=endpoints)
+        else:
+            vehicle_ids = get_vehicle_ids(data_set_id=data_set_id,
+                                          deadline=deadline,
+                                          endpoints=endpoints)
+    with executor_scope(executor=executor,
+                        max_workers=max_workers,
+                        deadline=deadline) as executor:
+        sharded = shards is not None and shards > 1
+        if stream_dealers and not sharded:
+            logging.info('Getting vehicle and dealer info.')
+            with metrics.phase('vehicle_and_dealer_detail'):
+                dealer_list, vehicle_error_list, dealer_error_list = \
+                    get_data_for_vehicles_and_dealers(
+                        data_set_id=data_set_id,
+                        vehicle_ids=vehicle_ids,
+                        executor=executor,
+                        max_workers=max_workers,
+                        cache=cache,
+                        dealer_memo=dealer_memo,
+                        deadline=deadline,
+                        endpoints=endpoints,
+                        fetch_strategy=fetch_strategy)
+            log_errors(error_list=vehicle_error_list, kind='vehicle')
+            log_errors(error_list=dealer_error_list, kind='dealer')
+        else:
+            with metrics.phase('vehicle_detail'):
+                if sharded:
+                    logging.info('Getting vehicle info in {} shards.'
+                                 .format(shards))
+                    dealer_list, vehicle_error_list = \
+                        get_data_for_vehicles_sharded(
+                            data_set_id=data_set_id,
+                            vehicle_ids=vehicle_ids,
+                            shards=shards,
+                            max_workers=max_workers,
+                            deadline=deadline,
+                            endpoints=endpoints,
+                            fetch_strategy=fetch_strategy)
+                else:
+                    logging.info('Getting vehicle info.')
+                    dealer_list, vehicle_error_list = get_data_for_vehicles(
+                        data_set_id=data_set_id,
+                        vehicle_ids=vehicle_ids,
+                        executor=executor,
+                        cache=cache,
+                        deadline=deadline,
+                        endpoints=endpoints,
+                        fetch_strategy=fetch_strategy)
+            dealer_list, dealer_error_list = collect_dealers(
+                data_set_id=data_set_id,
+                dealer_list=dealer_list,
+                vehicle_error_list=vehicle_error_list,
+                executor=executor,
+                cache=cache,
+                dealer_memo=dealer_memo,
+                deadline=deadline,
+                endpoints=endpoints,
+                fetch_strategy=fetch_strategy)
+    log_unfinished(vehicle_error_list=vehicle_error_list,
+                   dealer_error_list=dealer_error_list)
+    if dealer_memo is not None:
+        logging.info('Dealer memo has {} hits and {} misses.'
+                     .format(dealer_memo.hits, dealer_memo.misses))
+    with metrics.phase('post'):
+        if stream_answer or compress_answer:
+            return post_json_stream_request(
+                url=endpoints.answer(data_set_id),
+                get_pieces=lambda: iter_answer_json(dealer_list or []),
+                compress=compress_answer)
+        dealer_dict = {'dealers': serialize_dealers(dealer_list)}
+        return post_json_request(url=endpoints.answer(data_set_id),
+                                 post_data=dealer_dict)
+
+
+def collect_dealers(data_set_id, dealer_list, vehicle_error_list, executor,
+                    cache, dealer_memo, deadline, endpoints, fetch_strategy):
+    """
+    Runs the dealer_detail phase of a merge fetching dealers after
+    vehicles: logs vehicle_error_list, gets the names of the dealers
+    in dealer_list, as returned by get_data_for_vehicles, and logs
+    their errors. The other arguments are used as in merge, with
+    deadline a time.monotonic() value.
+
+    Returns the dealer list and the dealer error list.
+    """
+    log_errors(error_list=vehicle_error_list, kind='vehicle')
     logging.info('Getting dealer info.')
-    dealer_list, error_list = get_dealer_names(data_set_id=data_set_id,
-                                               dealer_list=dealer_list)
+    with get_metrics().phase('dealer_detail'):
+        dealer_list, dealer_error_list = get_dealer_names(
+            data_set_id=data_set_id,
+            dealer_list=dealer_list,
+            executor=executor,
+            cache=cache,
+            dealer_memo=dealer_memo,
+            deadline=deadline,
+            endpoints=endpoints,
+            fetch_strategy=fetch_strategy)
+    log_errors(error_list=dealer_error_list, kind='dealer')
+    return dealer_list, dealer_error_list
+
+
+def merge_many(count, max_workers=None, max_datasets=None,
+               dealer_memo=None, **merge_kwargs):
+    """
+    Runs merge for count new datasets in one process.
+
+    Every merge shares one thread pool of max_workers threads, so
+    max_workers is a budget of concurrent requests across all
+    datasets, and the pooled session from
+    request_tools.get_session, so connections and TLS sessions are
+    reused between datasets. They also share dealer_memo, an
+    LRUMemo created if not given, so dealers seen by one dataset are
+    not requested again by another. At most max_datasets merges run
+    at once, defaulting to all of them. merge_kwargs are passed to
+    each merge; a deadline applies to each dataset from its start.
+
+    Doesn't raise errors from single merges.
+
+    Returns a list of one summary dict per merge in start order,
+    with the keys dataSetId (None if no dataset id was obtained),
+    success, message, totalMilliseconds and seconds, the client
+    side duration of the merge. A merge that raised has success
+    False, its error as message and no totalMilliseconds.
+    """
+    if type(count) is not int or count < 1:
+        raise ValueError('count {} is not a positive int.'.format(count))
+    if max_datasets is None:
+        max_datasets = count
+    if dealer_memo is None:
+        dealer_memo = LRUMemo()
+    if 'endpoints' not in merge_kwargs or merge_kwargs['endpoints'] is None:
+        merge_kwargs['endpoints'] = get_endpoints()
+    with executor_scope(max_workers=max_workers) as executor:
+        # Each merge blocks on its requests in the shared pool, so
+        # the merges themselves run in a separate pool.
+        with ThreadPoolExecutor(max_workers=max_datasets) as merges:
+            futures = [merges.submit(merge_summary, executor=executor,
+                                     max_workers=max_workers,
+                                     dealer_memo=dealer_memo,
+                                     **merge_kwargs)
+                       for _ in range(count)]
+            return [future.result() for future in futures]
+
+
+def merge_summary(data_set_id=None, **merge_kwargs):
+    """
+    Runs merge with merge_kwargs for data_set_id, or for a new
+    dataset id if it is None. merge_kwargs must include endpoints.
+
+    Returns the summary dict described in merge_many.
+    """
+    start = time.monotonic()
+    summary = {'dataSetId': data_set_id}
+    try:
+        if data_set_id is None:
+            with get_metrics().phase('dataset_id'):
+                summary['dataSetId'] = get_dataset_id(
+                    endpoints=merge_kwargs['endpoints'])
+        result = merge(data_set_id=summary['dataSetId'], **merge_kwargs)
+        summary['success'] = result['success']
+        summary['message'] = result['message']
+        summary['totalMilliseconds'] = result['totalMilliseconds']
+    except Exception as e:
+        logging.error('Merge of data set id {} failed.'
+                      .format(summary['dataSetId']), exc_info=True)
+        summary['success'] = False
+        summary['message'] = str(e)
+    summary['seconds'] = time.monotonic() - start
+    return summary
+
+
+async def async_merge(max_concurrency=None, endpoints=None):
+    """
+    Coroutine version of merge.
+
+    Runs every request on the current event loop instead of a
+    thread pool. Vehicle and dealer requests share one semaphore
+    which allows at most max_concurrency requests in flight,
+    defaulting to DEFAULT_MAX_CONCURRENCY. endpoints is used as in
+    merge.
+
+    Doesn't catch errors.
+
+    Returns the python object generated from the json response of the
+    answer submission.
+    """
+    if max_concurrency is None:
+        max_concurrency = DEFAULT_MAX_CONCURRENCY
+    if endpoints is None:
+        endpoints = get_endpoints()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    session = create_async_session(limit=max_concurrency,
+                                   limit_per_host=max_concurrency)
+    metrics = get_metrics()
+    try:
+        logging.info('Getting data set id.')
+        with metrics.phase('dataset_id'):
+            data_set_id = await async_get_dataset_id(session=session,
+                                                     endpoints=endpoints)
+        logging.info('Getting vehicle ids for data set id {}.'
+                     .format(data_set_id))
+        with metrics.phase('vehicle_ids'):
+            vehicle_ids = await async_get_vehicle_ids(
+                data_set_id=data_set_id,
+                session=session,
+                endpoints=endpoints)
+        logging.info('Getting vehicle info.')
+        with metrics.phase('vehicle_detail'):
+            dealer_list, error_list = await async_get_data_for_vehicles(
+                data_set_id=data_set_id,
+                vehicle_ids=vehicle_ids,
+                session=session,
+                semaphore=semaphore,
+                endpoints=endpoints)
+        log_errors(error_list=error_list, kind='vehicle')
+        logging.info('Getting dealer info.')
+        with metrics.phase('dealer_detail'):
+            dealer_list, error_list = await async_get_dealer_names(
+                data_set_id=data_set_id,
+                dealer_list=dealer_list,
+                session=session,
+                semaphore=semaphore,
+                endpoints=endpoints)
+        log_errors(error_list=error_list, kind='dealer')
+        dealer_dict = {'dealers': serialize_dealers(dealer_list)}
+        with metrics.phase('post'):
+            return await async_post_json_request(
+                url=endpoints.answer(data_set_id),
+                post_data=dealer_dict,
+                session=session)
+    finally:
+        if session is not None:
+            await session.close()
+
+
+def run_async_merge(max_concurrency=None, endpoints=None):
+    """
+    Runs async_merge to completion on a new event loop.
+
+    Returns the result of async_merge.
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(
+            async_merge(max_concurrency=max_concurrency,
+                        endpoints=endpoints))
+    finally:
+        loop.close()
+
+
+def log_errors(error_list, kind):
+    """
+    Logs each error in an error list returned by the collection
+    functions. kind is either 'vehicle' or 'dealer'.
+    """
     if error_list:
         for item in error_list:
-            logging.info('Error {} in getting info for dealer id {}'
-                         .format(item['error_message'], item['dealerId']))
-    dealer_dict = {'dealers': dealer_list}
-    post_url = ('https://vautointerview.azurewebsites.net/api/{}/answer'
-                .format(data_set_id))
-    return post_json_request(url=post_url, post_data=dealer_dict)
+            logging.info('Error {} in getting info for {} id {}'
+                         .format(item['error_message'], kind,
+                                 item[kind + 'Id']))
+
+
+def log_unfinished(vehicle_error_list, dealer_error_list):
+    """
+    Logs the vehicle and dealer ids in the error lists that did not
+    finish before the merge deadline.
+    """
+    for kind, error_list in (('vehicle', vehicle_error_list),
+                             ('dealer', dealer_error_list)):
+        unfinished = [item[kind + 'Id']
+                      for item in error_list or []
+                      if item['error_message'] == DEADLINE_ERROR_MESSAGE]
+        if unfinished:
+            logging.info('Deadline reached before {} {} ids finished: {}'
+                         .format(len(unfinished), kind, unfinished))
@@ -0,0 +1,146 @@
+import os
+import re
+from threading import (Lock)
+from urllib.parse import (urlsplit)
+
+
+# Root of the challenge API used when no base url is configured.
+DEFAULT_BASE_URL = 'https://vautointerview.azurewebsites.net'
+# Environment variable read for the base url when none is given.
+BASE_URL_ENV_VAR = 'COX_AUTO_API_BASE_URL'
+
+_endpoints = None
+_endpoints_lock = Lock()
+
+
+class ApiEndpoints(object):
+    """
+    Builds the urls of the challenge API endpoints from a base url
+    and a path template for each endpoint.
+
+    base_url defaults to the value of the COX_AUTO_API_BASE_URL
+    environment variable, or DEFAULT_BASE_URL if it is not set, so
+    requests can be pointed at a caching proxy, a mirror or a local
+    stand-in without code changes.
+    """
+    DATASET_ID = '/api/datasetid'
+    VEHICLES = '/api/{data_set_id}/vehicles'
+    VEHICLE = '/api/{data_set_id}/vehicles/{vehicle_id}'
+    DEALER = '/api/{data_set_id}/dealers/{dealer_id}'
+    VEHICLE_BATCH = '/api/{data_set_id}/vehicles?ids={ids}'
+    DEALER_BATCH = '/api/{data_set_id}/dealers?ids={ids}'
+    ANSWER = '/api/{data_set_id}/answer'
+
+    def __init__(self, base_url=None):
+        if base_url is None:
+            base_url = os.environ.get(BASE_URL_ENV_VAR) or DEFAULT_BASE_URL
+        if not base_url.startswith(('http://', 'https://')):
+            raise ValueError('base_url {} is not an http or https url.'
+                             .format(base_url))
+        self.base_url = base_url.rstrip('/')
+
+    def dataset_id(self):
+        """
+        Returns the url that creates a new datasetId.
+        """
+        return self.base_url + self.DATASET_ID
+
+    def vehicles(self, data_set_id):
+        """
+        Returns the url listing the vehicle ids of a dataset.
+        """
+        return self.base_url + self.VEHICLES.format(data_set_id=data_set_id)
+
+    def vehicle(self, data_set_id, vehicle_id):
+        """
+        Returns the url of the details of a vehicle.
+        """
+        return self.base_url + self.VEHICLE.format(data_set_id=data_set_id,
+                                                   vehicle_id=vehicle_id)
+
+    def dealer(self, data_set_id, dealer_id):
+        """
+        Returns the url of the details of a dealer.
+        """
+        return self.base_url + self.DEALER.format(data_set_id=data_set_id,
+                                                  dealer_id=dealer_id)
+
+    def vehicle_batch(self, data_set_id, vehicle_ids):
+        """
+        Returns the url of the details of several vehicles, served
+        by bulk capable backends or proxies.
+        """
+        return self.base_url + self.VEHICLE_BATCH.format(
+            data_set_id=data_set_id,
+            ids=','.join(str(vehicle_id) for vehicle_id in vehicle_ids))
+
+    def dealer_batch(self, data_set_id, dealer_ids):
+        """
+        Returns the url of the details of several dealers, served
+        by bulk capable backends or proxies.
+        """
+        return self.base_url + self.DEALER_BATCH.format(
+            data_set_id=data_set_id,
+            ids=','.join(str(dealer_id) for dealer_id in dealer_ids))
+
+    def answer(self, data_set_id):
+        """
+        Returns the url the answer for a dataset is posted to.
+        """
+        return self.base_url + self.ANSWER.format(data_set_id=data_set_id)
+
+
+def compile_path_patterns():
+    """
+    Returns (name, regex) pairs matching the path and query of each
+    ApiEndpoints template, bulk templates first since their paths
+    match the plain list templates.
+    """
+    names = ['dataset_id', 'vehicle_batch', 'dealer_batch', 'vehicles',
+             'vehicle', 'dealer', 'answer']
+    patterns = []
+    for name in names:
+        template = getattr(ApiEndpoints, name.upper())
+        regex = re.sub(r'\\\{\w+\\\}', '[^/?]+', re.escape(template))
+        patterns.append((name, re.compile(regex + '$')))
+    return patterns
+
+
+_PATH_PATTERNS = compile_path_patterns()
+
+
+def endpoint_name(url):
+    """
+    Returns the name of the ApiEndpoints method that builds url,
+    such as 'vehicle' or 'answer', whatever its base url, or
+    'other' if it matches none. Used to label request metrics.
+    """
+    split = urlsplit(url)
+    path = split.path + ('?' + split.query if split.query else '')
+    for name, pattern in _PATH_PATTERNS:
+        if pattern.search(path):
+            return name
+    return 'other'
+
+
+def set_endpoints(endpoints):
+    """
+    Sets the ApiEndpoints used when a collection function is not
+    given one. None restores the default built from the environment
+    on next use.
+    """
+    global _endpoints
+    with _endpoints_lock:
+        _endpoints = endpoints
+
+
+def get_endpoints():
+    """
+    Returns the shared ApiEndpoints, creating it from the
+    environment on first use.
+    """
+    global _endpoints
+    with _endpoints_lock:
+        if _endpoints is None:
+            _endpoints = ApiEndpoints()
+        return _endpoints
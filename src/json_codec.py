@@ -0,0 +1,139 @@
+import json
+from threading import (Lock)
+try:
+    import orjson
+except ImportError:
+    # orjson is optional. Without it the fastest installed codec is
+    # used.
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    # ujson is optional, like orjson.
+    ujson = None
+
+
+_codec = None
+_codec_lock = Lock()
+
+
+class StdlibJsonCodec(object):
+    """
+    Json codec backed by the standard library json module, used when
+    no faster backend is installed.
+    """
+    name = 'json'
+
+    def __init__(self):
+        self._encoder = json.JSONEncoder(ensure_ascii=False,
+                                         separators=(',', ':'))
+
+    def loads(self, data):
+        """
+        Returns the python objects for json data given as utf-8
+        bytes or str.
+        """
+        return json.loads(data)
+
+    def dumps(self, obj):
+        """
+        Returns obj encoded as json in utf-8 bytes.
+        """
+        return self._encoder.encode(obj).encode('utf-8')
+
+
+class OrjsonCodec(object):
+    """
+    Json codec backed by orjson, which parses bytes directly and
+    encodes straight to bytes.
+    """
+    name = 'orjson'
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError('orjson is not installed.')
+
+    def loads(self, data):
+        """
+        Returns the python objects for json data given as utf-8
+        bytes or str.
+        """
+        return orjson.loads(data)
+
+    def dumps(self, obj):
+        """
+        Returns obj encoded as json in utf-8 bytes.
+        """
+        return orjson.dumps(obj)
+
+
+class UjsonCodec(object):
+    """
+    Json codec backed by ujson.
+    """
+    name = 'ujson'
+
+    def __init__(self):
+        if ujson is None:
+            raise ImportError('ujson is not installed.')
+
+    def loads(self, data):
+        """
+        Returns the python objects for json data given as utf-8
+        bytes or str.
+        """
+        return ujson.loads(data)
+
+    def dumps(self, obj):
+        """
+        Returns obj encoded as json in utf-8 bytes.
+        """
+        return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+CODECS = {'json': StdlibJsonCodec,
+          'orjson': OrjsonCodec,
+          'ujson': UjsonCodec}
+
+
+def create_codec(name=None):
+    """
+    Returns a codec by name, one of the keys of CODECS. If name is
+    None returns the fastest installed codec: orjson, then ujson,
+    then the standard library.
+
+    Raises ValueError for an unknown name and ImportError if the
+    named backend is not installed.
+    """
+    if name is None:
+        if orjson is not None:
+            return OrjsonCodec()
+        if ujson is not None:
+            return UjsonCodec()
+        return StdlibJsonCodec()
+    if name not in CODECS:
+        raise ValueError('Unknown json codec {}. Expected one of {}.'
+                         .format(name, ', '.join(sorted(CODECS))))
+    return CODECS[name]()
+
+
+def set_codec(codec):
+    """
+    Sets the codec used to encode and decode request and response
+    bodies. None restores the default from create_codec on next use.
+    """
+    global _codec
+    with _codec_lock:
+        _codec = codec
+
+
+def get_codec():
+    """
+    Returns the shared codec, creating it with create_codec on first
+    use.
+    """
+    global _codec
+    with _codec_lock:
+        if _codec is None:
+            _codec = create_codec()
+        return _codec
@@ -0,0 +1,160 @@
+import codecs
+import json
+import re
+
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# Characters that may continue a json number.
+_NUMBER_TAIL = re.compile(r'[0-9.eE+-]*')
+_decoder = json.JSONDecoder()
+
+
+class NotAnObjectError(ValueError):
+    """
+    Raised by iter_json_array when the streamed json is not an
+    object.
+    """
+
+
+class NotAnArrayError(ValueError):
+    """
+    Raised by iter_json_array when the value under the key is not
+    an array.
+    """
+
+
+class JsonStreamReader(object):
+    """
+    Reads json tokens and values from an iterable of utf-8 encoded
+    byte chunks, holding only the unread part of the current chunk
+    and any value split across chunks in memory.
+    """
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.exhausted = False
+
+    def read_more(self):
+        """
+        Appends the next chunk to the unread text.
+
+        Returns False if there were no chunks left.
+        """
+        if self.exhausted:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self.exhausted = True
+            decoded = self._utf8.decode(b'', final=True)
+        else:
+            decoded = self._utf8.decode(chunk)
+        self.text = self.text[self.pos:] + decoded
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Skips whitespace and returns the next character, or '' at
+        the end of the stream.
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.read_more():
+                return ''
+
+    def expect(self, char):
+        """
+        Consumes the next character, which must be char.
+
+        Raises json.JSONDecodeError if it is not.
+        """
+        if self.peek() != char:
+            raise json.JSONDecodeError('Expecting {!r}'.format(char),
+                                       self.text, self.pos)
+        self.pos += 1
+
+    def read_value(self):
+        """
+        Returns the next complete json value.
+
+        Raises json.JSONDecodeError if the stream ends first or the
+        value is not valid json.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.read_more():
+                    continue
+                raise
+            # A value ending at the end of the text may continue in
+            # the next chunk. A number may also have been cut before
+            # the rest of it, like 1 of 1.5 when the text ends at 1.
+            tail_end = end
+            if type(value) in (int, float):
+                tail_end = _NUMBER_TAIL.match(self.text, end).end()
+            if tail_end == len(self.text) and self.read_more():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_array(chunks, key):
+    """
+    Parses a json object streamed as an iterable of utf-8 byte
+    chunks and yields each item of the array under key as soon as
+    it is parsed. Other members of the object are parsed and
+    dropped. The rest of the object is read after the array so a
+    truncated body is still detected.
+
+    Raises NotAnObjectError if the json is not an object,
+    NotAnArrayError if the value for key is not an array, KeyError
+    if key is missing, and json.JSONDecodeError if the json is not
+    valid or ends early.
+    """
+    reader = JsonStreamReader(chunks)
+    if reader.peek() != '{':
+        raise NotAnObjectError('Json is not an object.')
+    reader.pos += 1
+    found = False
+    if reader.peek() == '}':
+        reader.pos += 1
+    else:
+        while True:
+            member_key = reader.read_value()
+            if type(member_key) is not str:
+                raise json.JSONDecodeError('Expecting property name',
+                                           reader.text, reader.pos)
+            reader.expect(':')
+            if member_key == key and not found:
+                found = True
+                if reader.peek() != '[':
+                    raise NotAnArrayError('Value for key {} is not an '
+                                          'array.'.format(key))
+                reader.pos += 1
+                if reader.peek() == ']':
+                    reader.pos += 1
+                else:
+                    while True:
+                        yield reader.read_value()
+                        if reader.peek() == ',':
+                            reader.pos += 1
+                            continue
+                        reader.expect(']')
+                        break
+            else:
+                reader.read_value()
+            if reader.peek() == ',':
+                reader.pos += 1
+                continue
+            reader.expect('}')
+            break
+    if reader.peek() != '':
+        raise json.JSONDecodeError('Extra data', reader.text, reader.pos)
+    if not found:
+        raise KeyError(key)
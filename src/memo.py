@@ -0,0 +1,61 @@
+from collections import (OrderedDict)
+from threading import (Lock)
+
+
+# Number of entries kept when no max_size is provided.
+DEFAULT_MAX_SIZE = 10000
+
+
+class LRUMemo(object):
+    """
+    In-memory least recently used memo with hit and miss counters.
+
+    Holds at most max_size entries; adding an entry beyond that
+    drops the least recently used one. Safe to share between
+    threads.
+    """
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        if type(max_size) is not int or max_size < 1:
+            raise ValueError('max_size {} is not a positive int.'
+                             .format(max_size))
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        """
+        Returns the value stored for key, or None if there is none.
+        Counts the lookup as a hit or a miss.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """
+        Stores value for key as the most recently used entry.
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes every entry and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,324 @@
+import json
+import logging
+import time
+from bisect import (bisect_left)
+from contextlib import (contextmanager)
+from threading import (Lock)
+from .endpoints import (endpoint_name)
+
+
+# Upper bounds in seconds of the request latency histogram buckets.
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                           1.0, 2.5, 5.0, 10.0)
+# Upper bounds in seconds of the merge phase histogram buckets.
+DEFAULT_PHASE_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+                         120.0, 300.0)
+
+_metrics = None
+_metrics_lock = Lock()
+
+
+class Histogram(object):
+    """
+    Counts of observed values in cumulative buckets with upper
+    bounds buckets, plus their sum and count, as in a Prometheus
+    histogram.
+    """
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        Adds value to the bucket of the smallest bound it does not
+        exceed, or the +Inf bucket.
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        """
+        Returns (upper bound, count of values up to it) pairs ending
+        with the +Inf bound.
+        """
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float('inf'),),
+                                self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics(object):
+    """
+    Thread safe registry of counters, gauges and histograms, each
+    identified by a name and keyword labels.
+
+    Requests made through request_tools report their latency,
+    in-flight count, outcome, retries and bytes to the shared
+    registry from get_metrics, and merge reports the time of each of
+    its phases. The values can be logged as structured json lines
+    with log_summary or dumped in the Prometheus text format with
+    to_prometheus.
+    """
+    def __init__(self, latency_buckets=DEFAULT_LATENCY_BUCKETS,
+                 phase_buckets=DEFAULT_PHASE_BUCKETS):
+        self.latency_buckets = tuple(latency_buckets)
+        self.phase_buckets = tuple(phase_buckets)
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._lock = Lock()
+
+    def inc(self, name, value=1, **labels):
+        """
+        Adds value to a counter.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def add_gauge(self, name, value, **labels):
+        """
+        Adds value, which may be negative, to a gauge.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0) + value
+
+    def observe(self, name, value, buckets=None, **labels):
+        """
+        Adds value to a histogram, created with buckets, defaulting
+        to latency_buckets, on first use.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = Histogram(buckets or self.latency_buckets)
+                self._histograms[key] = histogram
+            histogram.observe(value)
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Times the body as the merge phase name, adding it to the
+        merge_phase_seconds histogram and logging it as a structured
+        json line.
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            seconds = time.monotonic() - start
+            self.observe('merge_phase_seconds', seconds,
+                         buckets=self.phase_buckets, phase=name)
+            logging.info(json.dumps({'event': 'merge_phase',
+                                     'phase': name,
+                                     'seconds': round(seconds, 6)}))
+
+    def snapshot(self):
+        """
+        Returns a list of dicts describing every metric, sorted by
+        name and labels. Histograms include their sum, count and
+        cumulative bucket counts.
+        """
+        with self._lock:
+            counters = list(self._counters.items())
+            gauges = list(self._gauges.items())
+            histograms = [(key, histogram.sum, histogram.count,
+                           histogram.cumulative_counts())
+                          for key, histogram in self._histograms.items()]
+        result = []
+        for kind, items in (('counter', counters), ('gauge', gauges)):
+            for (name, labels), value in items:
+                result.append({'type': kind, 'name': name,
+                               'labels': dict(labels), 'value': value})
+        for (name, labels), total, count, buckets in histograms:
+            result.append({'type': 'histogram', 'name': name,
+                           'labels': dict(labels), 'sum': total,
+                           'count': count, 'buckets': buckets})
+        result.sort(key=lambda metric: (metric['name'],
+                                        sorted(metric['labels'].items())))
+        return result
+
+    def add_snapshot(self, snapshot):
+        """
+        Adds the values of a snapshot from another registry, such as
+        one returned from a worker process, to this one.
+        """
+        for metric in snapshot:
+            labels = metric['labels']
+            if metric['type'] == 'counter':
+                self.inc(metric['name'], metric['value'], **labels)
+            elif metric['type'] == 'gauge':
+                self.add_gauge(metric['name'], metric['value'], **labels)
+            else:
+                self.add_histogram(metric['name'], metric['buckets'],
+                                   metric['sum'], metric['count'],
+                                   **labels)
+
+    def add_histogram(self, name, buckets, total, count, **labels):
+        """
+        Adds the cumulative (upper bound, count) buckets, sum and
+        count of a histogram snapshot to a histogram with the same
+        bounds.
+        """
+        bounds = tuple(bound for bound, _ in buckets[:-1])
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = Histogram(bounds)
+                self._histograms[key] = histogram
+            elif histogram.buckets != bounds:
+                raise ValueError('Buckets of histogram {} do not match.'
+                                 .format(name))
+            previous = 0
+            for index, (_, cumulative) in enumerate(buckets):
+                histogram.counts[index] += cumulative - previous
+                previous = cumulative
+            histogram.sum += total
+            histogram.count += count
+
+    def log_summary(self):
+        """
+        Logs every metric as a structured json line. Histograms are
+        logged with their count, sum and mean, without buckets.
+        """
+        for metric in self.snapshot():
+            entry = {'event': 'metric', 'type': metric['type'],
+                     'name': metric['name'], 'labels': metric['labels']}
+            if metric['type'] == 'histogram':
+                entry['count'] = metric['count']
+                entry['sum'] = round(metric['sum'], 6)
+                if metric['count']:
+                    entry['mean'] = round(metric['sum'] / metric['count'],
+                                          6)
+            else:
+                entry['value'] = metric['value']
+            logging.info(json.dumps(entry, sort_keys=True))
+
+    def to_prometheus(self):
+        """
+        Returns every metric in the Prometheus text exposition
+        format.
+        """
+        lines = []
+        typed = set()
+        for metric in self.snapshot():
+            name = metric['name']
+            if name not in typed:
+                typed.add(name)
+                lines.append('# TYPE {} {}'.format(name, metric['type']))
+            labels = metric['labels']
+            if metric['type'] != 'histogram':
+                lines.append('{}{} {}'.format(name, format_labels(labels),
+                                              format_value(metric['value'])))
+                continue
+            for bound, count in metric['buckets']:
+                bucket_labels = dict(labels, le=format_value(bound))
+                lines.append('{}_bucket{} {}'.format(
+                    name, format_labels(bucket_labels), count))
+            lines.append('{}_sum{} {}'.format(name, format_labels(labels),
+                                              format_value(metric['sum'])))
+            lines.append('{}_count{} {}'.format(
+                name, format_labels(labels), metric['count']))
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    """
+    Returns labels in the Prometheus {key="value",...} form, or an
+    empty string if there are none.
+    """
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in sorted(labels.items())) + '}'
+
+
+def format_value(value):
+    """
+    Returns a number in the Prometheus text format.
+    """
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if type(value) is float else str(value)
+
+
+@contextmanager
+def track_request(method, url):
+    """
+    Reports one request attempt to the shared Metrics: the
+    http_requests_in_flight gauge while the body runs, then the
+    http_request_seconds histogram and the http_requests_total
+    counter labelled with the outcome, the status code or the name
+    of the error raised.
+    """
+    metrics = get_metrics()
+    endpoint = endpoint_name(url)
+    metrics.add_gauge('http_requests_in_flight', 1, endpoint=endpoint)
+    start = time.monotonic()
+    outcome = '200'
+    try:
+        yield
+    except Exception as e:
+        outcome = error_outcome(e)
+        raise
+    finally:
+        metrics.add_gauge('http_requests_in_flight', -1, endpoint=endpoint)
+        metrics.observe('http_request_seconds', time.monotonic() - start,
+                        method=method, endpoint=endpoint)
+        metrics.inc('http_requests_total', method=method,
+                    endpoint=endpoint, outcome=outcome)
+
+
+def error_outcome(error):
+    """
+    Returns the metric label for a failed request: the status code
+    of an error with a status_code, such as
+    request_tools.HTTPStatusError, or else the error class name.
+    """
+    status_code = getattr(error, 'status_code', None)
+    if status_code is not None:
+        return str(status_code)
+    return type(error).__name__
+
+
+def count_bytes(direction, url, size):
+    """
+    Adds size to the http_{direction}_bytes_total counter for the
+    endpoint of url. direction is 'request' or 'response'.
+    """
+    get_metrics().inc('http_{}_bytes_total'.format(direction), size,
+                      endpoint=endpoint_name(url))
+
+
+def set_metrics(metrics):
+    """
+    Sets the Metrics that requests and merges report to. None
+    restores a new empty registry on next use.
+    """
+    global _metrics
+    with _metrics_lock:
+        _metrics = metrics
+
+
+def get_metrics():
+    """
+    Returns the shared Metrics, creating it on first use.
+    """
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
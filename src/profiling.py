@@ -0,0 +1,170 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import (contextmanager)
+
+
+# Number of functions and allocation sites listed in the reports.
+DEFAULT_TOP = 40
+# Stack frames kept by tracemalloc for each allocation. One frame is
+# enough to group by line and keeps tracing overhead low.
+DEFAULT_TRACE_FRAMES = 1
+
+
+class ThreadProfiler(object):
+    """
+    cProfile profiler covering the calling thread and every thread
+    started while it runs, such as the merge worker pool.
+
+    Before python 3.12 a cProfile.Profile only sees the thread that
+    enabled it, so each new thread gets its own profiler through
+    threading.setprofile and the stats are added together at the
+    end. From 3.12 one profiler sees every thread.
+    """
+    def __init__(self):
+        self.per_thread = sys.version_info < (3, 12)
+        self._profilers = []
+        self._lock = threading.Lock()
+
+    def add_profiler(self):
+        profiler = cProfile.Profile()
+        with self._lock:
+            self._profilers.append(profiler)
+        return profiler
+
+    def start_thread(self, frame, event, arg):
+        """
+        Profile function run by each new thread on its first event,
+        which replaces itself with the thread's own profiler.
+        """
+        self.add_profiler().enable()
+
+    def start(self):
+        if self.per_thread:
+            threading.setprofile(self.start_thread)
+        self.add_profiler().enable()
+
+    def stop(self):
+        """
+        Stops profiling and returns the pstats.Stats of every
+        thread.
+        """
+        if self.per_thread:
+            threading.setprofile(None)
+        with self._lock:
+            profilers = list(self._profilers)
+        # Disabling only affects the calling thread; worker threads
+        # have finished by the time the merge returns.
+        profilers[0].disable()
+        stats = pstats.Stats(profilers[0])
+        for profiler in profilers[1:]:
+            profiler.create_stats()
+            if profiler.stats:
+                stats.add(profiler)
+        return stats
+
+
+@contextmanager
+def profile_scope(report_dir, top=DEFAULT_TOP,
+                  trace_frames=DEFAULT_TRACE_FRAMES):
+    """
+    Profiles the body with cProfile, across all threads it starts,
+    and traces its memory allocations with tracemalloc.
+
+    Afterwards writes three files named with the start time to
+    report_dir, creating it if needed:
+
+    profile-<time>.pstats: raw stats for pstats, snakeviz or similar
+    tools. profile-<time>.txt: the top functions by cumulative and
+    by own time. allocations-<time>.txt: the peak traced memory and
+    the top lines by memory still allocated at the end, and by
+    growth over the run.
+
+    The report paths are logged. Reports are written even if the
+    body raises.
+    """
+    stamp = '{}-{}'.format(time.strftime('%Y%m%d-%H%M%S'), os.getpid())
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start(trace_frames)
+    start_snapshot = tracemalloc.take_snapshot()
+    profiler = ThreadProfiler()
+    profiler.start()
+    try:
+        yield
+    finally:
+        end_snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+        stats = profiler.stop()
+        paths = write_reports(report_dir=report_dir, stamp=stamp,
+                              stats=stats, start_snapshot=start_snapshot,
+                              end_snapshot=end_snapshot, peak=peak,
+                              top=top)
+        logging.info('Profile reports written to {}'
+                     .format(', '.join(paths)))
+
+
+def write_reports(report_dir, stamp, stats, start_snapshot, end_snapshot,
+                  peak, top=DEFAULT_TOP):
+    """
+    Writes the reports described in profile_scope.
+
+    Returns the list of paths written.
+    """
+    os.makedirs(report_dir, exist_ok=True)
+    stats_path = os.path.join(report_dir,
+                              'profile-{}.pstats'.format(stamp))
+    text_path = os.path.join(report_dir, 'profile-{}.txt'.format(stamp))
+    memory_path = os.path.join(report_dir,
+                               'allocations-{}.txt'.format(stamp))
+    stats.dump_stats(stats_path)
+    with open(text_path, 'w') as text_file:
+        text_file.write(format_stats(stats, top=top))
+    with open(memory_path, 'w') as memory_file:
+        memory_file.write(format_allocations(start_snapshot=start_snapshot,
+                                             end_snapshot=end_snapshot,
+                                             peak=peak, top=top))
+    return [stats_path, text_path, memory_path]
+
+
+def format_stats(stats, top=DEFAULT_TOP):
+    """
+    Returns the top functions of stats by cumulative and by own
+    time as text.
+    """
+    stream = io.StringIO()
+    stats.stream = stream
+    for sort_key in ('cumulative', 'tottime'):
+        stream.write('Top {} functions by {} time\n'.format(top, sort_key))
+        stats.sort_stats(sort_key).print_stats(top)
+    return stream.getvalue()
+
+
+def format_allocations(start_snapshot, end_snapshot, peak,
+                       top=DEFAULT_TOP):
+    """
+    Returns the peak traced memory and the top allocation lines
+    held at the end and grown since the start as text.
+    """
+    filters = [tracemalloc.Filter(False, module.__file__)
+               for module in (tracemalloc, cProfile, pstats)]
+    filters.append(tracemalloc.Filter(False, __file__))
+    start_snapshot = start_snapshot.filter_traces(filters)
+    end_snapshot = end_snapshot.filter_traces(filters)
+    lines = ['Peak traced memory: {:.1f} KiB'.format(peak / 1024), '',
+             'Top {} lines by memory held at the end'.format(top)]
+    lines.extend(str(stat)
+                 for stat in end_snapshot.statistics('lineno')[:top])
+    lines.extend(['', 'Top {} lines by growth over the run'.format(top)])
+    lines.extend(str(stat)
+                 for stat in end_snapshot.compare_to(start_snapshot,
+                                                     'lineno')[:top])
+    return '\n'.join(lines) + '\n'
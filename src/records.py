@@ -0,0 +1,114 @@
+from .json_codec import (get_codec)
+
+
+class Vehicle(object):
+    """
+    Vehicle record grouped under a Dealer.
+
+    Uses __slots__ so large datasets hold one small object per
+    vehicle instead of a dict. Converted to the answer json format
+    by to_dict only when the answer is submitted.
+    """
+    __slots__ = ('vehicle_id', 'year', 'make', 'model')
+
+    def __init__(self, vehicle_id, year, make, model):
+        self.vehicle_id = vehicle_id
+        self.year = year
+        self.make = make
+        self.model = model
+
+    @classmethod
+    def from_info(cls, vehicle_info):
+        """
+        Creates a Vehicle from a checked vehicle info dict as
+        returned by data_collection.get_vehicle_data.
+        """
+        return cls(vehicle_id=vehicle_info['vehicleId'],
+                   year=vehicle_info['year'],
+                   make=vehicle_info['make'],
+                   model=vehicle_info['model'])
+
+    def to_dict(self):
+        """
+        Returns the vehicle in the answer json format.
+        """
+        return {'vehicleId': self.vehicle_id,
+                'year': self.year,
+                'make': self.make,
+                'model': self.model}
+
+    def __eq__(self, other):
+        if type(other) is not Vehicle:
+            return NotImplemented
+        return ((self.vehicle_id, self.year, self.make, self.model) ==
+                (other.vehicle_id, other.year, other.make, other.model))
+
+    def __repr__(self):
+        return ('Vehicle(vehicle_id={!r}, year={!r}, make={!r}, '
+                'model={!r})'.format(self.vehicle_id, self.year,
+                                     self.make, self.model))
+
+
+class Dealer(object):
+    """
+    Dealer record holding the dealer name, once known, and the list
+    of its Vehicle records.
+
+    Uses __slots__ like Vehicle. Converted to the answer json format
+    by to_dict only when the answer is submitted.
+    """
+    __slots__ = ('dealer_id', 'name', 'vehicles')
+
+    def __init__(self, dealer_id, name=None, vehicles=None):
+        self.dealer_id = dealer_id
+        self.name = name
+        self.vehicles = [] if vehicles is None else vehicles
+
+    def to_dict(self):
+        """
+        Returns the dealer and its vehicles in the answer json
+        format. The name key is left out if the name is not known.
+        """
+        dealer_dict = {'dealerId': self.dealer_id}
+        if self.name is not None:
+            dealer_dict['name'] = self.name
+        dealer_dict['vehicles'] = [vehicle.to_dict()
+                                   for vehicle in self.vehicles]
+        return dealer_dict
+
+    def __eq__(self, other):
+        if type(other) is not Dealer:
+            return NotImplemented
+        return ((self.dealer_id, self.name, self.vehicles) ==
+                (other.dealer_id, other.name, other.vehicles))
+
+    def __repr__(self):
+        return ('Dealer(dealer_id={!r}, name={!r}, vehicles={!r})'
+                .format(self.dealer_id, self.name, self.vehicles))
+
+
+def serialize_dealers(dealer_list):
+    """
+    Converts a list of Dealer records to the answer json format.
+
+    Returns the list of dealer dicts, or None if dealer_list is None.
+    """
+    if dealer_list is None:
+        return None
+    return [dealer.to_dict() for dealer in dealer_list]
+
+
+def iter_answer_json(dealer_list):
+    """
+    Generates the json answer body {"dealers": [...]} for a list of
+    Dealer records as a sequence of utf-8 bytes pieces, one per
+    dealer encoded with json_codec.get_codec(), so the whole body is
+    never held in memory at once.
+    """
+    dumps = get_codec().dumps
+    yield b'{"dealers":['
+    for index, dealer in enumerate(dealer_list):
+        if index:
+            yield b','
+        yield dumps(dealer.to_dict())
+    yield b']}'
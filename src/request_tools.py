@@ -1,43 +1,855 @@
+import asyncio
+import logging
+import random
+import time
+import zlib
+from contextlib import (contextmanager)
+from functools import (partial)
+from threading import (Condition,
+                       Lock)
 import requests
+from requests.adapters import (HTTPAdapter)
+from .json_codec import (get_codec)
+from .metrics import (count_bytes,
+                      error_outcome,
+                      get_metrics,
+                      track_request)
+try:
+    import aiohttp
+except ImportError:
+    # aiohttp is optional. Without it the async request functions
+    # run the pooled requests session in the event loop's executor.
+    aiohttp = None
 
 
-def get_json_request(url):
+# Seconds an idle async connection is kept open for reuse.
+DEFAULT_KEEPALIVE_TIMEOUT = 15
+# Number of distinct hosts to keep connection pools for.
+DEFAULT_POOL_CONNECTIONS = 10
+# Number of keep-alive connections kept open per host. Matches the
+# default worker count so every worker can hold a warm connection.
+DEFAULT_POOL_MAXSIZE = 32
+
+# Seconds to wait for a connection and for each read of a response.
+DEFAULT_TIMEOUT = (3.05, 27)
+# Bytes read at a time from a streamed response body.
+DEFAULT_STREAM_CHUNK_SIZE = 64 * 1024
+# Bytes of encoded json sent at a time in a streamed request body.
+DEFAULT_POST_CHUNK_SIZE = 64 * 1024
+# zlib level used to gzip streamed request bodies. Low levels keep
+# compression from becoming the bottleneck of the upload.
+DEFAULT_GZIP_LEVEL = 5
+# Headers of a request with a json body.
+JSON_HEADERS = {'Content-Type': 'application/json'}
+# HTTP status codes treated as transient by the default retry policy.
+DEFAULT_RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Exceptions treated as transient by the default retry policy.
+DEFAULT_RETRY_EXCEPTIONS = (requests.ConnectionError,
+                            requests.Timeout)
+if aiohttp is not None:
+    DEFAULT_RETRY_EXCEPTIONS += (aiohttp.ClientConnectionError,
+                                 asyncio.TimeoutError)
+
+_session = None
+_session_kwargs = {}
+_session_lock = Lock()
+_retry_policy = None
+_timeout = DEFAULT_TIMEOUT
+_rate_limiter = None
+_concurrency_limiter = None
+
+
+class HTTPStatusError(RuntimeError):
+    """
+    Raised by check_response when a response has an unexpected
+    HTTP status code. The code is kept in status_code so retry
+    policies can tell transient failures from permanent ones.
+    """
+    def __init__(self, message, status_code):
+        super(HTTPStatusError, self).__init__(message)
+        self.status_code = status_code
+
+
+class DeadlineExceeded(RuntimeError):
+    """
+    Raised when a request would start after its deadline.
+    """
+
+
+class RetryPolicy(object):
+    """
+    Retries a request that fails with a transient error.
+
+    A request is tried at most attempts times. Before retry n
+    (starting at 0) the policy sleeps for up to
+    backoff * 2 ** n seconds, capped at max_backoff. With jitter,
+    the sleep is a random value between zero and that bound so
+    concurrent retries spread out.
+
+    HTTPStatusError with a status code in retry_statuses and any
+    exception in retry_exceptions are retried; everything else is
+    raised straight away. If deadline is set, no retry is started
+    that would sleep past deadline seconds from the first attempt.
+    """
+    def __init__(self, attempts=3, backoff=0.2, max_backoff=5.0,
+                 jitter=True, retry_statuses=DEFAULT_RETRY_STATUSES,
+                 retry_exceptions=DEFAULT_RETRY_EXCEPTIONS,
+                 deadline=None):
+        if type(attempts) is not int or attempts < 1:
+            raise ValueError('attempts {} is not a positive int.'
+                             .format(attempts))
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_exceptions = tuple(retry_exceptions)
+        self.deadline = deadline
+
+    def is_retryable(self, error):
+        """
+        Returns True if error is a transient failure under this
+        policy.
+        """
+        if isinstance(error, HTTPStatusError):
+            return error.status_code in self.retry_statuses
+        return isinstance(error, self.retry_exceptions)
+
+    def get_delay(self, retry):
+        """
+        Returns the seconds to sleep before the given retry number.
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** retry)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def next_delay(self, error, retry, start, deadline=None):
+        """
+        Returns the seconds to sleep before retrying after error, or
+        None if the request should not be retried. deadline is an
+        optional time.monotonic() value the retry must not sleep
+        past, in addition to the policy's own deadline.
+        """
+        if retry + 1 >= self.attempts or not self.is_retryable(error):
+            return None
+        delay = self.get_delay(retry)
+        retry_at = time.monotonic() + delay
+        if (self.deadline is not None and
+                retry_at - start > self.deadline):
+            return None
+        if deadline is not None and retry_at >= deadline:
+            return None
+        return delay
+
+    def call(self, request, deadline=None):
+        """
+        Calls request, a function taking no arguments, retrying it
+        under this policy. No retry is started after deadline, an
+        optional time.monotonic() value.
+
+        Returns the result of request or raises its last error.
+        """
+        start = time.monotonic()
+        retry = 0
+        while True:
+            try:
+                return request()
+            except Exception as e:
+                delay = self.next_delay(error=e, retry=retry, start=start,
+                                        deadline=deadline)
+                if delay is None:
+                    raise
+                get_metrics().inc('http_retries_total',
+                                  reason=error_outcome(e))
+                logging.info('Retrying after error {} in {:.3f} seconds.'
+                             .format(e, delay))
+                time.sleep(delay)
+                retry += 1
+
+    async def async_call(self, request):
+        """
+        Coroutine version of call. request is a function taking no
+        arguments that returns an awaitable.
+        """
+        start = time.monotonic()
+        retry = 0
+        while True:
+            try:
+                return await request()
+            except Exception as e:
+                delay = self.next_delay(error=e, retry=retry, start=start)
+                if delay is None:
+                    raise
+                get_metrics().inc('http_retries_total',
+                                  reason=error_outcome(e))
+                logging.info('Retrying after error {} in {:.3f} seconds.'
+                             .format(e, delay))
+                await asyncio.sleep(delay)
+                retry += 1
+
+
+def set_retry_policy(retry_policy):
+    """
+    Sets the retry policy used by the request functions when none
+    is passed to them. Passing None restores the default policy.
+    """
+    global _retry_policy
+    _retry_policy = retry_policy
+
+
+def get_retry_policy():
+    """
+    Returns the retry policy used by the request functions when
+    none is passed to them, creating a default RetryPolicy on first
+    use.
+    """
+    global _retry_policy
+    if _retry_policy is None:
+        _retry_policy = RetryPolicy()
+    return _retry_policy
+
+
+def create_session(pool_connections=DEFAULT_POOL_CONNECTIONS,
+                   pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                   pool_block=True,
+                   keep_alive=True):
+    """
+    Creates a requests session backed by a connection pool.
+
+    pool_connections is the number of hosts to cache pools for and
+    pool_maxsize is the number of connections kept per host. When
+    pool_block is True, no more than pool_maxsize connections are
+    opened to a single host at once; extra requests wait for a free
+    connection. When keep_alive is False, connections are closed
+    after each request.
+
+    Returns the new requests.Session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections,
+                          pool_maxsize=pool_maxsize,
+                          pool_block=pool_block)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+def configure_session(**kwargs):
+    """
+    Replaces the shared session with one created by create_session
+    using the provided keyword arguments. Closes the previous shared
+    session if there was one.
+
+    Returns the new shared session.
+    """
+    global _session, _session_kwargs
+    session = create_session(**kwargs)
+    with _session_lock:
+        old_session, _session = _session, session
+        _session_kwargs = kwargs
+    if old_session is not None:
+        old_session.close()
+    return session
+
+
+def ensure_pool_size(max_workers):
+    """
+    Replaces the shared session with one keeping max_workers
+    connections per host if its pool is smaller, so a worker budget
+    above DEFAULT_POOL_MAXSIZE is not capped by requests waiting for
+    a blocked connection. Other settings given to configure_session
+    are kept.
+
+    The previous session is not closed, as requests may still be in
+    flight on it.
+    """
+    global _session, _session_kwargs
+    with _session_lock:
+        pool_maxsize = _session_kwargs.get('pool_maxsize',
+                                           DEFAULT_POOL_MAXSIZE)
+        if max_workers <= pool_maxsize:
+            return
+        _session_kwargs = dict(_session_kwargs, pool_maxsize=max_workers)
+        _session = create_session(**_session_kwargs)
+
+
+def get_session():
+    """
+    Returns the shared session used by the request functions,
+    creating it with default pool settings on first use.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session(**_session_kwargs)
+    return _session
+
+
+class TokenBucket(object):
+    """
+    Client-side rate limiter.
+
+    Tokens are added at rate per second up to capacity. Each
+    request takes one token, waiting for it if the bucket is empty,
+    so bursts of up to capacity requests are allowed while the
+    sustained rate stays at rate. Safe to share between threads.
+    """
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError('rate {} is not positive.'.format(rate))
+        if capacity is None:
+            capacity = max(1, rate)
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def reserve(self):
+        """
+        Takes a token, borrowing against future tokens if none are
+        available.
+
+        Returns the seconds the caller must wait before using it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity,
+                               self._tokens +
+                               (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """
+        Blocks until a token is available.
+        """
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def async_acquire(self):
+        """
+        Coroutine version of acquire.
+        """
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class AdaptiveConcurrencyLimiter(object):
+    """
+    Additive increase, multiplicative decrease (AIMD) limit on the
+    number of requests in flight.
+
+    Each request that finishes under latency_target without
+    signalling overload raises the limit by about one per limit
+    requests, up to max_limit. An overload signal (HTTP 429 or 5xx,
+    a connection error or timeout) or a response slower than
+    latency_target multiplies the limit by decrease_factor, down to
+    min_limit, at most once per latency_target so a burst of
+    failures counts as one. Safe to share between threads.
+    """
+    def __init__(self, initial_limit=8, min_limit=1, max_limit=256,
+                 latency_target=1.0, decrease_factor=0.5):
+        if not 1 <= min_limit <= initial_limit <= max_limit:
+            raise ValueError('Limits must satisfy 1 <= min_limit {} <= '
+                             'initial_limit {} <= max_limit {}.'
+                             .format(min_limit, initial_limit, max_limit))
+        if not 0 < decrease_factor < 1:
+            raise ValueError('decrease_factor {} is not between 0 and 1.'
+                             .format(decrease_factor))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._last_decrease = None
+        self._condition = Condition()
+
+    @property
+    def limit(self):
+        """
+        The current whole number of requests allowed in flight.
+        """
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        """
+        The number of requests currently in flight.
+        """
+        return self._in_flight
+
+    def acquire(self):
+        """
+        Blocks until fewer than limit requests are in flight, then
+        counts the caller as in flight.
+        """
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, latency, overloaded):
+        """
+        Counts a request as finished and adjusts the limit from its
+        latency in seconds and whether it signalled overload.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if overloaded or latency > self.latency_target:
+                now = time.monotonic()
+                if (self._last_decrease is None or
+                        now - self._last_decrease >= self.latency_target):
+                    self._limit = max(self.min_limit,
+                                      self._limit * self.decrease_factor)
+                    self._last_decrease = now
+            else:
+                self._limit = min(self.max_limit,
+                                  self._limit + 1 / self._limit)
+            self._condition.notify_all()
+
+
+def set_timeout(timeout):
+    """
+    Sets the timeout used by the request functions when none is
+    passed to them. timeout is a (connect, read) tuple of seconds
+    or a single number for both. Passing None restores
+    DEFAULT_TIMEOUT.
+    """
+    global _timeout
+    _timeout = DEFAULT_TIMEOUT if timeout is None else timeout
+
+
+def get_timeout(timeout=None, deadline=None):
+    """
+    Returns the (connect, read) timeout for a request, using the
+    configured timeout if timeout is None. Each part is capped by
+    the seconds left before deadline, an optional time.monotonic()
+    value.
+
+    Raises DeadlineExceeded if deadline has passed.
+    """
+    if timeout is None:
+        timeout = _timeout
+    if type(timeout) is not tuple:
+        timeout = (timeout, timeout)
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded('Deadline exceeded before request.')
+    return tuple(min(part, remaining) for part in timeout)
+
+
+def set_rate_limiter(rate_limiter):
+    """
+    Sets the TokenBucket applied to every request, or None to
+    disable rate limiting.
+    """
+    global _rate_limiter
+    _rate_limiter = rate_limiter
+
+
+def set_concurrency_limiter(concurrency_limiter):
+    """
+    Sets the AdaptiveConcurrencyLimiter applied to every synchronous
+    request, or None to disable it.
+    """
+    global _concurrency_limiter
+    _concurrency_limiter = concurrency_limiter
+
+
+def is_overload_error(error):
+    """
+    Returns True if error suggests the API is overloaded: HTTP 429
+    or 5xx, or a connection error or timeout.
+    """
+    if isinstance(error, HTTPStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, DEFAULT_RETRY_EXCEPTIONS)
+
+
+@contextmanager
+def limited_request():
+    """
+    Waits for the configured rate and concurrency limiters, if any,
+    before the body runs, and reports its latency and outcome to the
+    concurrency limiter afterwards.
+    """
+    rate_limiter = _rate_limiter
+    concurrency_limiter = _concurrency_limiter
+    if rate_limiter is not None:
+        rate_limiter.acquire()
+    if concurrency_limiter is None:
+        yield
+        return
+    concurrency_limiter.acquire()
+    start = time.monotonic()
+    overloaded = False
+    try:
+        yield
+    except Exception as e:
+        overloaded = is_overload_error(e)
+        raise
+    finally:
+        concurrency_limiter.release(latency=time.monotonic() - start,
+                                    overloaded=overloaded)
+
+
+def get_json_request(url, session=None, retry_policy=None, timeout=None,
+                     deadline=None):
     """
     Makes a get request to the provided url.
 
+    Uses the provided session, or the shared pooled session if
+    not given, so connections are reused across requests.
+
+    Transient failures are retried under retry_policy, or the
+    policy from get_retry_policy if not given. Each attempt waits
+    for the limiters set with set_rate_limiter and
+    set_concurrency_limiter.
+
+    timeout is a (connect, read) tuple of seconds, defaulting to
+    the one set with set_timeout. deadline is an optional
+    time.monotonic() value after which no attempt is started;
+    timeouts are shortened so an attempt cannot run much past it.
+
     Raises Runtime errors if the response HTTP status code is
     not 200 or the content-type is not application/json.
 
     Returns the json data in the body encoded in python
     data objects.
     """
-    resp = requests.get(url)
-    return check_response(url=url, response=resp)
+    if session is None:
+        session = get_session()
+    if retry_policy is None:
+        retry_policy = get_retry_policy()
+
+    def request():
+        with limited_request(), track_request('GET', url):
+            resp = session.get(url, timeout=get_timeout(timeout=timeout,
+                                                        deadline=deadline))
+            return check_response(url=url, response=resp)
+    return retry_policy.call(request, deadline=deadline)
 
 
-def post_json_request(url, post_data):
+def post_json_request(url, post_data, session=None, retry_policy=None,
+                      timeout=None, deadline=None):
     """
     Makes a post request to the provided url with the provided data
     as json in the post request.
 
+    Uses the provided session, or the shared pooled session if
+    not given. Transient failures, timeout and deadline are
+    handled as in get_json_request.
+
     Raises Runtime errors if the response HTTP status code is
     not 200 or the content-type is not application/json.
 
     Returns the json data in the body encoded in python
     data objects.
     """
-    resp = requests.post(url, json=post_data)
-    return check_response(url=url, response=resp)
+    if session is None:
+        session = get_session()
+    if retry_policy is None:
+        retry_policy = get_retry_policy()
+    body = get_codec().dumps(post_data)
+
+    def request():
+        with limited_request(), track_request('POST', url):
+            count_bytes('request', url, len(body))
+            resp = session.post(url, data=body, headers=JSON_HEADERS,
+                                timeout=get_timeout(timeout=timeout,
+                                                    deadline=deadline))
+            return check_response(url=url, response=resp)
+    return retry_policy.call(request, deadline=deadline)
+
+
+def post_json_stream_request(url, get_pieces, session=None,
+                             retry_policy=None, timeout=None,
+                             deadline=None, compress=False,
+                             chunk_size=DEFAULT_POST_CHUNK_SIZE):
+    """
+    Makes a post request to the provided url with a json body sent
+    with chunked transfer encoding as it is encoded.
+
+    get_pieces is a function returning an iterable of the str or
+    bytes pieces of the json body, such as records.iter_answer_json.
+    It is called again for each retry so the body is regenerated
+    instead of buffered. When compress is True the body is gzipped as it is
+    sent with a Content-Encoding: gzip header.
+
+    Session, retries, limiters, timeout and deadline are handled as
+    in post_json_request.
+
+    Raises the errors of check_response.
+
+    Returns the json data in the body encoded in python
+    data objects.
+    """
+    if session is None:
+        session = get_session()
+    if retry_policy is None:
+        retry_policy = get_retry_policy()
+    headers = dict(JSON_HEADERS)
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+
+    def request():
+        body = encode_chunks(pieces=get_pieces(), chunk_size=chunk_size)
+        if compress:
+            body = gzip_chunks(chunks=body)
+        body = count_chunk_bytes(chunks=body, url=url)
+        with limited_request(), track_request('POST', url):
+            resp = session.post(url, data=body, headers=headers,
+                                timeout=get_timeout(timeout=timeout,
+                                                    deadline=deadline))
+            return check_response(url=url, response=resp)
+    return retry_policy.call(request, deadline=deadline)
+
+
+def encode_chunks(pieces, chunk_size=DEFAULT_POST_CHUNK_SIZE):
+    """
+    Yields str or bytes pieces utf-8 encoded and joined into byte
+    chunks of
+    at least chunk_size bytes, except for the last, so a body made
+    of many small pieces is not sent as many tiny http chunks.
+    """
+    buffer = []
+    size = 0
+    for piece in pieces:
+        data = piece.encode('utf-8') if type(piece) is str else piece
+        buffer.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def count_chunk_bytes(chunks, url):
+    """
+    Yields byte chunks of a request body to url, counting them in
+    the http_request_bytes_total metric as they are sent.
+    """
+    for chunk in chunks:
+        count_bytes('request', url, len(chunk))
+        yield chunk
+
+
+def gzip_chunks(chunks, level=DEFAULT_GZIP_LEVEL):
+    """
+    Yields byte chunks gzip compressed as a single gzip stream.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_json_request(url, session=None, retry_policy=None,
+                        timeout=None, deadline=None,
+                        chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+    """
+    Makes a get request to the provided url without reading the
+    body up front.
+
+    Session, retries, limiters, timeout and deadline are handled as
+    in get_json_request, but only cover opening the response and
+    checking its headers. An error while the body is read is raised
+    from the returned generator and not retried.
+
+    Raises the errors of check_response_headers.
+
+    Returns a generator of the body as byte chunks of up to
+    chunk_size bytes, which closes the response when done.
+    """
+    if session is None:
+        session = get_session()
+    if retry_policy is None:
+        retry_policy = get_retry_policy()
+
+    def request():
+        with limited_request(), track_request('GET', url):
+            resp = session.get(url, stream=True,
+                               timeout=get_timeout(timeout=timeout,
+                                                   deadline=deadline))
+            try:
+                check_response_headers(url=url, response=resp)
+            except Exception:
+                resp.close()
+                raise
+            return resp
+    return iter_response_chunks(url=url,
+                                response=retry_policy.call(
+                                    request, deadline=deadline),
+                                chunk_size=chunk_size)
+
+
+def iter_response_chunks(url, response, chunk_size):
+    """
+    Yields the body of a streamed requests response from url in
+    chunks of up to chunk_size bytes and closes the response.
+    """
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            count_bytes('response', url, len(chunk))
+            yield chunk
+    finally:
+        response.close()
 
 
 def check_response(url, response):
-    if response.status_code == 200:
+    """
+    Checks a requests response.
+
+    Raises the errors of check_response_headers.
+
+    Returns the json data in the body encoded in python
+    data objects.
+    """
+    check_response_headers(url=url, response=response)
+    content = response.content
+    count_bytes('response', url, len(content))
+    return get_codec().loads(content)
+
+
+def check_response_headers(url, response):
+    """
+    Checks the status and headers of a requests response.
+
+    Raises HTTPStatusError if the HTTP status code is not 200 and
+    RuntimeError if the content-type is not application/json.
+    """
+    if response.status_code != 200:
+        raise HTTPStatusError('Got unexpected status code {} from url {}'
+                              .format(response.status_code, url),
+                              status_code=response.status_code)
+    if 'application/json' not in response.headers['content-type']:
+        raise RuntimeError('Expected json content type '
+                           'from url {} but got {}'
+                           .format(url, response.headers['content-type']))
+
+
+def create_async_session(limit=DEFAULT_POOL_MAXSIZE,
+                         limit_per_host=DEFAULT_POOL_MAXSIZE,
+                         keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT,
+                         timeout=None):
+    """
+    Creates an aiohttp client session whose connector keeps at most
+    limit connections open in total and limit_per_host to a single
+    host. Idle connections are kept for keepalive_timeout seconds.
+    timeout is a (connect, read) tuple of seconds, defaulting to
+    the one set with set_timeout.
+
+    Must be called from a running event loop.
+
+    Returns None if aiohttp is not installed, in which case the
+    async request functions fall back to the shared requests session.
+    """
+    if aiohttp is None:
+        return None
+    connector = aiohttp.TCPConnector(limit=limit,
+                                     limit_per_host=limit_per_host,
+                                     keepalive_timeout=keepalive_timeout)
+    connect_timeout, read_timeout = get_timeout(timeout=timeout)
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout,
+                                      sock_read=read_timeout))
+
+
+async def async_get_json_request(url, session=None, retry_policy=None):
+    """
+    Coroutine version of get_json_request.
+
+    Uses the provided aiohttp session. If session is None, runs
+    get_json_request in the event loop's default executor.
+    Transient failures are retried as in get_json_request. With an
+    aiohttp session only the rate limiter applies; concurrency is
+    bounded by the caller's semaphore.
+
+    Raises the same errors and returns the same data as
+    get_json_request.
+    """
+    if session is None:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, partial(get_json_request, url=url,
+                          retry_policy=retry_policy))
+    if retry_policy is None:
+        retry_policy = get_retry_policy()
+
+    async def request():
+        if _rate_limiter is not None:
+            await _rate_limiter.async_acquire()
+        with track_request('GET', url):
+            async with session.get(url) as resp:
+                return await async_check_response(url=url, response=resp)
+    return await retry_policy.async_call(request)
+
+
+async def async_post_json_request(url, post_data, session=None,
+                                  retry_policy=None):
+    """
+    Coroutine version of post_json_request.
+
+    Uses the provided aiohttp session. If session is None, runs
+    post_json_request in the event loop's default executor.
+    Transient failures are retried as in get_json_request.
+
+    Raises the same errors and returns the same data as
+    post_json_request.
+    """
+    if session is None:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, partial(post_json_request, url=url, post_data=post_data,
+                          retry_policy=retry_policy))
+    if retry_policy is None:
+        retry_policy = get_retry_policy()
+    body = get_codec().dumps(post_data)
+
+    async def request():
+        if _rate_limiter is not None:
+            await _rate_limiter.async_acquire()
+        count_bytes('request', url, len(body))
+        with track_request('POST', url):
+            async with session.post(url, data=body,
+                                    headers=JSON_HEADERS) as resp:
+                return await async_check_response(url=url,
+                                                  response=resp)
+    return await retry_policy.async_call(request)
+
+
+async def async_check_response(url, response):
+    """
+    Coroutine version of check_response for aiohttp responses.
+    """
+    if response.status == 200:
         if 'application/json' in response.headers['content-type']:
-            return response.json()
+            content = await response.read()
+            count_bytes('response', url, len(content))
+            return get_codec().loads(content)
         else:
             raise RuntimeError('Expected json content type '
                                'from url {} but got {}'
                                .format(url, response.headers['content-type']))
     else:
-        raise RuntimeError('Got unexpected status code {} from url {}'
-                           .format(response.status_code, url))
+        raise HTTPStatusError('Got unexpected status code {} from url {}'
+                              .format(response.status, url),
+                              status_code=response.status)
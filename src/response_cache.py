@@ -0,0 +1,166 @@
+import sqlite3
+import time
+from threading import (Lock)
+from .json_codec import (get_codec)
+
+
+# Seconds a cached response stays valid when no ttl is provided.
+DEFAULT_TTL = 24 * 60 * 60
+# Number of responses kept when no max_entries is provided.
+DEFAULT_MAX_ENTRIES = 200000
+# Number of writes grouped into one commit when no commit_every is
+# provided.
+DEFAULT_COMMIT_EVERY = 500
+
+
+class ResponseCache(object):
+    """
+    Persistent cache of json responses keyed by url, stored in a
+    local SQLite file.
+
+    Entries older than ttl seconds are treated as missing. Once
+    more than max_entries are stored, the least recently used
+    entries are evicted. Safe to share between threads.
+
+    Writes are committed in batches of commit_every and access
+    times are kept in memory until the next commit, so gets do not
+    write to the file. Writes not yet committed are lost if the
+    process dies before flush or close.
+    """
+    def __init__(self, path, ttl=DEFAULT_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES,
+                 commit_every=DEFAULT_COMMIT_EVERY):
+        if ttl <= 0:
+            raise ValueError('ttl {} is not positive.'.format(ttl))
+        if type(max_entries) is not int or max_entries < 1:
+            raise ValueError('max_entries {} is not a positive int.'
+                             .format(max_entries))
+        if type(commit_every) is not int or commit_every < 1:
+            raise ValueError('commit_every {} is not a positive int.'
+                             .format(commit_every))
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.commit_every = commit_every
+        self._lock = Lock()
+        self._accessed = {}
+        self._pending = 0
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        # The cache can be rebuilt from the API, so commits only need
+        # to survive a crash of the process, not of the machine.
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'url TEXT PRIMARY KEY, '
+                'body TEXT NOT NULL, '
+                'stored_at REAL NOT NULL, '
+                'accessed_at REAL NOT NULL)')
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS responses_accessed_at '
+                'ON responses (accessed_at)')
+        self._count = self._connection.execute(
+            'SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def get(self, url):
+        """
+        Returns the cached python data for url, or None if there is
+        no entry or the entry has expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT body, stored_at FROM responses WHERE url = ?',
+                (url,)).fetchone()
+            if row is None:
+                return None
+            body, stored_at = row
+            if now - stored_at > self.ttl:
+                self._connection.execute(
+                    'DELETE FROM responses WHERE url = ?', (url,))
+                self._accessed.pop(url, None)
+                self._count -= 1
+                self.wrote()
+                return None
+            self._accessed[url] = now
+        return get_codec().loads(body)
+
+    def set(self, url, data):
+        """
+        Stores data, which must be json serializable, for url and
+        evicts the least recently used entries over max_entries.
+        """
+        body = get_codec().dumps(data)
+        now = time.time()
+        with self._lock:
+            exists = self._connection.execute(
+                'SELECT 1 FROM responses WHERE url = ?',
+                (url,)).fetchone()
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses '
+                '(url, body, stored_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (url, body, now, now))
+            self._accessed.pop(url, None)
+            if exists is None:
+                self._count += 1
+            if self._count > self.max_entries:
+                # Eviction orders by accessed_at, so the access times
+                # kept in memory are written first.
+                self.write_accessed()
+                self._connection.execute(
+                    'DELETE FROM responses WHERE url IN ('
+                    'SELECT url FROM responses '
+                    'ORDER BY accessed_at LIMIT ?)',
+                    (self._count - self.max_entries,))
+                self._count = self.max_entries
+            self.wrote()
+
+    def wrote(self):
+        """
+        Counts a write and commits once commit_every are pending.
+        Called with the lock held.
+        """
+        self._pending += 1
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def write_accessed(self):
+        """
+        Writes the access times kept in memory. Called with the lock
+        held.
+        """
+        if self._accessed:
+            self._connection.executemany(
+                'UPDATE responses SET accessed_at = ? WHERE url = ?',
+                [(accessed_at, url)
+                 for url, accessed_at in self._accessed.items()])
+            self._accessed.clear()
+
+    def commit(self):
+        """
+        Writes the access times kept in memory and commits pending
+        writes. Called with the lock held.
+        """
+        self.write_accessed()
+        self._connection.commit()
+        self._pending = 0
+
+    def flush(self):
+        """
+        Commits pending writes and access times to the file.
+        """
+        with self._lock:
+            self.commit()
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        """
+        Commits pending writes and closes the underlying SQLite
+        connection.
+        """
+        with self._lock:
+            self.commit()
+            self._connection.close()
@@ -0,0 +1,169 @@
+import multiprocessing
+import time
+from .data_collection import (DEFAULT_MAX_WORKERS,
+                              chunk_ids,
+                              get_data_for_vehicles)
+from .endpoints import (get_endpoints)
+from .json_codec import (create_codec,
+                         get_codec,
+                         set_codec)
+from .metrics import (Metrics,
+                      get_metrics,
+                      set_metrics)
+from .request_tools import (configure_session,
+                            get_retry_policy,
+                            get_timeout,
+                            set_retry_policy,
+                            set_timeout)
+
+
+# Start method of shard processes. spawn gives each shard a clean
+# interpreter instead of forking a parent that is running threads
+# and holding pooled connections.
+DEFAULT_START_METHOD = 'spawn'
+
+
+def get_data_for_vehicles_sharded(data_set_id, vehicle_ids, shards,
+                                  max_workers=None, deadline=None,
+                                  endpoints=None, fetch_strategy=None,
+                                  start_method=DEFAULT_START_METHOD):
+    """
+    Process pool version of data_collection.get_data_for_vehicles
+    for datasets large enough that json decoding and validation in
+    one process is bound by the GIL.
+
+    Splits vehicle_ids into shards contiguous slices, each fetched
+    and grouped by dealer in its own process with
+    get_data_for_vehicles, then merges the partial groupings in
+    shard order so the result is the same as from one process.
+
+    max_workers is the budget of concurrent requests across all
+    shards, defaulting to data_collection.DEFAULT_MAX_WORKERS, and
+    is split evenly between them. Each shard gets the parent's
+    retry policy, timeout and json codec, but its own connection
+    pool. The rate limiter and adaptive concurrency limiter are not
+    shared with shards. Request metrics from each shard are added
+    to the parent's metrics.get_metrics().
+
+    deadline, endpoints and fetch_strategy are used as in
+    get_data_for_vehicles. fetch_strategy must be picklable.
+
+    Does not catch exceptions.
+
+    Returns a dealer list and an error list as described in
+    get_data_for_vehicles.
+    """
+    if type(shards) is not int or shards < 1:
+        raise ValueError('shards {} is not a positive int.'.format(shards))
+    if max_workers is None:
+        max_workers = DEFAULT_MAX_WORKERS
+    if endpoints is None:
+        endpoints = get_endpoints()
+    vehicle_ids = list(vehicle_ids)
+    shard_size = max(1, -(-len(vehicle_ids) // shards))
+    shard_workers = max(1, max_workers // shards)
+    # multiprocessing.Pool rather than ProcessPoolExecutor, whose
+    # mp_context and initializer arguments need python 3.7.
+    context = multiprocessing.get_context(start_method)
+    with context.Pool(processes=shards,
+                      initializer=init_shard_process,
+                      initargs=(get_retry_policy(), get_timeout(),
+                                get_codec().name)) as pool:
+        results = []
+        for shard_ids in chunk_ids(ids=vehicle_ids, size=shard_size):
+            results.append(pool.apply_async(
+                collect_shard,
+                kwds={'data_set_id': data_set_id,
+                      'vehicle_ids': shard_ids,
+                      'max_workers': shard_workers,
+                      'deadline_seconds': get_remaining(deadline),
+                      'endpoints': endpoints,
+                      'fetch_strategy': fetch_strategy}))
+        partials = []
+        for result in results:
+            dealer_list, error_list, metrics_snapshot = result.get()
+            get_metrics().add_snapshot(metrics_snapshot)
+            partials.append((dealer_list, error_list))
+    return merge_dealer_groupings(partials=partials)
+
+
+def get_remaining(deadline):
+    """
+    Returns the seconds left before deadline, an optional
+    time.monotonic() value, or None if there is no deadline.
+    monotonic values are not comparable between processes, so shards
+    are given the seconds left instead.
+    """
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def init_shard_process(retry_policy, timeout, codec_name):
+    """
+    Configures the request settings of a shard process. Also
+    replaces the session in case the process was forked from a
+    parent that had already used it.
+    """
+    configure_session()
+    set_retry_policy(retry_policy)
+    set_timeout(timeout)
+    set_codec(create_codec(codec_name))
+
+
+def collect_shard(data_set_id, vehicle_ids, max_workers, deadline_seconds,
+                  endpoints, fetch_strategy):
+    """
+    Runs get_data_for_vehicles for one shard in a shard process.
+
+    Returns the dealer list, the error list and a snapshot of the
+    metrics recorded for the shard.
+    """
+    deadline = None
+    if deadline_seconds is not None:
+        deadline = time.monotonic() + deadline_seconds
+    # A process runs several shards when there are more shards than
+    # processes, so each shard records into its own registry.
+    metrics = Metrics()
+    set_metrics(metrics)
+    dealer_list, error_list = get_data_for_vehicles(
+        data_set_id=data_set_id,
+        vehicle_ids=vehicle_ids,
+        max_workers=max_workers,
+        deadline=deadline,
+        endpoints=endpoints,
+        fetch_strategy=fetch_strategy)
+    return dealer_list, error_list, metrics.snapshot()
+
+
+def merge_dealer_groupings(partials):
+    """
+    Merges (dealer list, error list) pairs of consecutive slices of
+    the vehicle ids, as returned by get_data_for_vehicles, into one
+    pair as if the ids had been grouped together. A dealer appearing
+    in several slices keeps its first position and gets the vehicles
+    of later slices appended.
+
+    Returns a dealer list and an error list as described in
+    get_data_for_vehicles.
+    """
+    dealer_list = None
+    error_list = None
+    dealer_index = {}
+    for partial_dealers, partial_errors in partials:
+        if partial_errors:
+            if error_list:
+                error_list.extend(partial_errors)
+            else:
+                error_list = list(partial_errors)
+        for dealer in partial_dealers or []:
+            existing = dealer_index.get(dealer.dealer_id)
+            if existing is not None:
+                existing.vehicles.extend(dealer.vehicles)
+                continue
+            dealer_index[dealer.dealer_id] = dealer
+            if dealer_list:
+                dealer_list.append(dealer)
+            else:
+                dealer_list = [dealer]
+    return dealer_list, error_list
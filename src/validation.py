@@ -0,0 +1,138 @@
+# Longest text of a payload included in a validation error message.
+MAX_ERROR_DATA_LENGTH = 1000
+
+
+def format_data(data, max_length=MAX_ERROR_DATA_LENGTH):
+    """
+    Returns str(data), cut to max_length characters with a note of
+    how many were left out if it is longer.
+    """
+    text = str(data)
+    if len(text) <= max_length:
+        return text
+    return '{}... ({} more characters)'.format(text[:max_length],
+                                               len(text) - max_length)
+
+
+class ValidationError(RuntimeError):
+    """
+    RuntimeError raised for a payload that fails validation.
+
+    The message is built from template and values only when it is
+    read, with each value formatted by format_data so large
+    payloads do not make large messages.
+    """
+    def __init__(self, template, *values):
+        super(ValidationError, self).__init__(template, *values)
+        self.template = template
+        self.values = values
+        self._message = None
+
+    @property
+    def message(self):
+        if self._message is None:
+            self._message = self.template.format(
+                *[format_data(value) for value in self.values])
+        return self._message
+
+    def __str__(self):
+        return self.message
+
+
+class MissingKeyError(KeyError):
+    """
+    KeyError raised for a payload missing a required key, with the
+    lazily built and capped message of ValidationError. Like
+    KeyError, str() gives the quoted message.
+    """
+    def __init__(self, template, *values):
+        super(MissingKeyError, self).__init__(template, *values)
+        self.template = template
+        self.values = values
+        self._message = None
+
+    message = ValidationError.message
+
+    def __str__(self):
+        return repr(self.message)
+
+
+def is_list_of(value, item_type):
+    """
+    Returns True if value is a list whose items are all exactly of
+    type item_type.
+    """
+    return (type(value) is list and
+            (not value or set(map(type, value)) == {item_type}))
+
+
+class RecordSchema(object):
+    """
+    Precompiled check that a json payload is a dict with a value of
+    exactly the given type for each key in fields, a sequence of
+    (key, type) pairs.
+
+    The fast path for valid payloads only checks types over the
+    precomputed fields tuple. Only a payload failing it is checked
+    again to build the error for the first problem. name describes
+    the payload in error messages, such as 'vehicle info'.
+    """
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = tuple(fields)
+        if not self.fields:
+            raise ValueError('Schema {} has no fields.'.format(name))
+        for key, _ in self.fields:
+            if type(key) is not str:
+                raise ValueError('Key {!r} of schema {} is not a str.'
+                                 .format(key, name))
+
+    def is_valid(self, data):
+        """
+        Returns True if data is a dict with the right type for every
+        field.
+        """
+        if type(data) is not dict:
+            return False
+        try:
+            for key, field_type in self.fields:
+                if type(data[key]) is not field_type:
+                    return False
+        except KeyError:
+            return False
+        return True
+
+    def check(self, url, data):
+        """
+        Checks data returned from url.
+
+        Raises ValidationError if data is not a dict or a value has
+        the wrong type, and MissingKeyError if a key is missing.
+
+        Returns data.
+        """
+        if self.is_valid(data):
+            return data
+        raise self.get_error(url, data)
+
+    def get_error(self, url, data):
+        """
+        Returns the error for the first problem with data, which is
+        not valid.
+        """
+        if type(data) is not dict:
+            return ValidationError('Data returned {} from {} is not '
+                                   'of type dict.', data, url)
+        for key, field_type in self.fields:
+            if key not in data:
+                return MissingKeyError('Key {} not found in ' + self.name +
+                                       ' dict {} returned from url {}',
+                                       key, data, url)
+            if type(data[key]) is not field_type:
+                return ValidationError('Value {} is not type ' +
+                                       field_type.__name__ + ' in ' +
+                                       self.name + ' dict {} returned '
+                                       'from url {}',
+                                       data[key], data, url)
+        raise ValueError('Data {} is valid for {} schema.'
+                         .format(format_data(data), self.name))
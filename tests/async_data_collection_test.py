@@ -0,0 +1,121 @@
+import asyncio
+import mock
+import pytest
+from cox_auto_app.async_data_collection import (async_get_dataset_id,
+                                                async_get_vehicle_ids,
+                                                async_get_data_for_vehicles,
+                                                async_get_dealer_names)
+from cox_auto_app.records import (Dealer)
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestAsyncGetDatasetid(object):
+    """
+    Tests for async_get_dataset_id function.
+    """
+    @mock.patch('cox_auto_app.async_data_collection.async_get_json_request')
+    def test_return_not_dict(self, mock_get):
+        url = 'https://vautointerview.azurewebsites.net/api/datasetid'
+        json_data = 1
+        expected_error = ('Data returned {} from {} is not of type '
+                          'dict.'.format(json_data, url))
+        mock_get.return_value = json_data
+        with pytest.raises(RuntimeError, match=expected_error):
+            run(async_get_dataset_id())
+
+    @mock.patch('cox_auto_app.async_data_collection.async_get_json_request')
+    def test_good_return(self, mock_get):
+        json_data = {'datasetId': 'test'}
+        mock_get.return_value = json_data
+        assert run(async_get_dataset_id()) == json_data['datasetId']
+
+
+class TestAsyncGetVehicleids(object):
+    """
+    Tests for async_get_vehicle_ids function.
+    """
+    @mock.patch('cox_auto_app.async_data_collection.async_get_json_request')
+    def test_value_in_list_not_int(self, mock_get):
+        json_data = {'vehicleIds': [1, 'hi']}
+        mock_get.return_value = json_data
+        with pytest.raises(RuntimeError):
+            run(async_get_vehicle_ids(data_set_id='7'))
+
+    @mock.patch('cox_auto_app.async_data_collection.async_get_json_request')
+    def test_good_return(self, mock_get):
+        json_data = {'vehicleIds': [1, 2]}
+        mock_get.return_value = json_data
+        assert (run(async_get_vehicle_ids(data_set_id='7')) ==
+                json_data['vehicleIds'])
+
+
+class TestAsyncGetDataForVehicles(object):
+    """
+    Tests for async_get_data_for_vehicles function.
+    """
+    @mock.patch('cox_auto_app.async_data_collection.async_get_json_request')
+    def test_good_return(self, mock_get):
+        dealer_ids = {1: 5, 2: 6, 3: 5}
+
+        async def vehicle_data(url, session):
+            vehicle_id = int(url.rsplit('/', 1)[1])
+            return {'vehicleId': vehicle_id,
+                    'year': 1,
+                    'make': 'test',
+                    'model': 'test',
+                    'dealerId': dealer_ids[vehicle_id]}
+        mock_get.side_effect = vehicle_data
+        dealer_list, error_list = run(async_get_data_for_vehicles(
+            data_set_id='7',
+            vehicle_ids=[1, 2, 3]))
+        assert error_list is None
+        assert [dealer.dealer_id for dealer in dealer_list] == [5, 6]
+        assert ([vehicle.vehicle_id
+                 for vehicle in dealer_list[0].vehicles] == [1, 3])
+
+    @mock.patch('cox_auto_app.async_data_collection.async_get_json_request')
+    def test_error_return(self, mock_get):
+        mock_get.side_effect = RuntimeError('test')
+        dealer_list, error_list = run(async_get_data_for_vehicles(
+            data_set_id='7',
+            vehicle_ids=[1]))
+        assert dealer_list is None
+        assert error_list == [{'vehicleId': 1, 'error_message': 'test'}]
+
+
+class TestAsyncGetDealerNames(object):
+    """
+    Tests for async_get_dealer_names function.
+    """
+    @mock.patch('cox_auto_app.async_data_collection.async_get_json_request')
+    def test_good_return(self, mock_get):
+        async def dealer_data(url, session):
+            dealer_id = int(url.rsplit('/', 1)[1])
+            return {'dealerId': dealer_id,
+                    'name': 'dealer {}'.format(dealer_id)}
+        mock_get.side_effect = dealer_data
+        dealer_list = [Dealer(dealer_id=1),
+                       Dealer(dealer_id=2)]
+        dealer_list, error_list = run(async_get_dealer_names(
+            data_set_id='7',
+            dealer_list=dealer_list))
+        assert error_list is None
+        assert ([dealer.name for dealer in dealer_list] ==
+                ['dealer 1', 'dealer 2'])
+
+    @mock.patch('cox_auto_app.async_data_collection.async_get_json_request')
+    def test_error_return(self, mock_get):
+        mock_get.side_effect = RuntimeError('test')
+        dealer_list = [Dealer(dealer_id=1)]
+        dealer_list, error_list = run(async_get_dealer_names(
+            data_set_id='7',
+            dealer_list=dealer_list))
+        assert dealer_list[0].name is None
+        assert error_list == [{'dealerId': 1, 'error_message': 'test'}]
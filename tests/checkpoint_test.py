@@ -0,0 +1,159 @@
+import mock
+import pytest
+from cox_auto_app.checkpoint import (CheckpointFetchStrategy,
+                                     CheckpointLog,
+                                     SnapshotFetchStrategy,
+                                     load_snapshot,
+                                     open_checkpoint)
+from cox_auto_app.endpoints import (ApiEndpoints)
+from cox_auto_app.metrics import (Metrics)
+
+
+def vehicle_info(vehicle_id, dealer_id=10):
+    return {'vehicleId': vehicle_id, 'year': 2000, 'make': 'test',
+            'model': 'test', 'dealerId': dealer_id}
+
+
+class TestCheckpointLog(object):
+    """
+    Tests for CheckpointLog class.
+    """
+    def test_reload(self, tmpdir):
+        path = str(tmpdir.join('7.jsonl'))
+        checkpoint = CheckpointLog(path)
+        checkpoint.add_vehicle(vehicle_info(1))
+        checkpoint.add_dealer({'dealerId': 10, 'name': 'test'})
+        checkpoint.close()
+        checkpoint = CheckpointLog(path)
+        assert checkpoint.vehicles == {1: vehicle_info(1)}
+        assert checkpoint.dealers == {10: {'dealerId': 10, 'name': 'test'}}
+        checkpoint.close()
+
+    @mock.patch('cox_auto_app.checkpoint.logging')
+    def test_skips_cut_short_and_bad_lines(self, mock_logging, tmpdir):
+        log_file = tmpdir.join('7.jsonl')
+        log_file.write('{"vehicle": {"vehicleId": "bad"}}\n'
+                       '{"dealer": {"dealerId": 10, "name": "test"}}\n'
+                       '{"vehicle": {"vehic')
+        checkpoint = CheckpointLog(str(log_file))
+        assert checkpoint.vehicles == {}
+        assert list(checkpoint.dealers) == [10]
+        assert mock_logging.warning.call_count == 2
+        checkpoint.add_vehicle(vehicle_info(2))
+        checkpoint.close()
+        assert list(CheckpointLog(str(log_file)).vehicles) == [2]
+
+
+class TestOpenCheckpoint(object):
+    """
+    Tests for open_checkpoint function.
+    """
+    def test_path(self, tmpdir):
+        checkpoint = open_checkpoint(str(tmpdir.join('logs')), 'aB3_x-1')
+        assert checkpoint.path == str(tmpdir.join('logs', 'aB3_x-1.jsonl'))
+        checkpoint.close()
+
+    def test_bad_data_set_id(self, tmpdir):
+        with pytest.raises(ValueError):
+            open_checkpoint(str(tmpdir), '../7')
+
+
+class TestLoadSnapshot(object):
+    """
+    Tests for load_snapshot function.
+    """
+    def test_load(self, tmpdir):
+        path = str(tmpdir.join('7.jsonl'))
+        checkpoint = CheckpointLog(path)
+        checkpoint.add_vehicle(vehicle_info(1))
+        checkpoint.close()
+        snapshot = load_snapshot(path)
+        assert snapshot.vehicles == {1: vehicle_info(1)}
+        assert snapshot.dealers == {}
+
+    def test_missing(self, tmpdir):
+        with pytest.raises(ValueError):
+            load_snapshot(str(tmpdir.join('7.jsonl')))
+
+
+class TestSnapshotFetchStrategy(object):
+    """
+    Tests for SnapshotFetchStrategy class.
+    """
+    @mock.patch('cox_auto_app.checkpoint.get_metrics')
+    def test_fetches_new_ids(self, mock_get_metrics, tmpdir):
+        metrics = Metrics()
+        mock_get_metrics.return_value = metrics
+        path = str(tmpdir.join('7.jsonl'))
+        checkpoint = CheckpointLog(path)
+        checkpoint.add_vehicle(vehicle_info(1))
+        checkpoint.add_dealer({'dealerId': 10, 'name': 'test'})
+        checkpoint.close()
+        inner = mock.Mock(batch_size=1)
+        inner.fetch_vehicles.return_value = {2: vehicle_info(2, 11)}
+        inner.fetch_dealers.return_value = {11: {'dealerId': 11,
+                                                 'name': 'new'}}
+        strategy = SnapshotFetchStrategy(snapshot=load_snapshot(path),
+                                         fetch_strategy=inner)
+        endpoints = ApiEndpoints('http://localhost')
+        results = strategy.fetch_vehicles(data_set_id='8',
+                                          vehicle_ids=[1, 2],
+                                          endpoints=endpoints)
+        assert sorted(results) == [1, 2]
+        assert inner.fetch_vehicles.call_args[1]['vehicle_ids'] == [2]
+        results = strategy.fetch_dealers(data_set_id='8',
+                                         dealer_ids=[10, 11],
+                                         endpoints=endpoints)
+        assert sorted(results) == [10, 11]
+        assert inner.fetch_dealers.call_args[1]['dealer_ids'] == [11]
+        # The snapshot is not changed by what is fetched.
+        assert list(strategy.snapshot.vehicles) == [1]
+        assert list(load_snapshot(path).dealers) == [10]
+        counts = {(metric['labels']['kind'], metric['labels']['source']):
+                  metric['value'] for metric in metrics.snapshot()}
+        assert counts == {('vehicle', 'snapshot'): 1,
+                          ('vehicle', 'fetched'): 1,
+                          ('dealer', 'snapshot'): 1,
+                          ('dealer', 'fetched'): 1}
+
+
+class TestCheckpointFetchStrategy(object):
+    """
+    Tests for CheckpointFetchStrategy class.
+    """
+    def test_fetches_missing_ids(self, tmpdir):
+        checkpoint = CheckpointLog(str(tmpdir.join('7.jsonl')))
+        checkpoint.add_vehicle(vehicle_info(1))
+        inner = mock.Mock(batch_size=5)
+        error = {'vehicleId': 3, 'error_message': 'Boom'}
+        inner.fetch_vehicles.return_value = {2: vehicle_info(2), 3: error}
+        strategy = CheckpointFetchStrategy(checkpoint=checkpoint,
+                                           fetch_strategy=inner)
+        endpoints = ApiEndpoints('http://localhost')
+        results = strategy.fetch_vehicles(data_set_id='7',
+                                          vehicle_ids=[1, 2, 3],
+                                          endpoints=endpoints)
+        assert strategy.batch_size == 5
+        assert results == {1: vehicle_info(1), 2: vehicle_info(2), 3: error}
+        assert inner.fetch_vehicles.call_args[1]['vehicle_ids'] == [2, 3]
+        assert sorted(checkpoint.vehicles) == [1, 2]
+        inner.fetch_vehicles.reset_mock()
+        strategy.fetch_vehicles(data_set_id='7', vehicle_ids=[1, 2],
+                                endpoints=endpoints)
+        inner.fetch_vehicles.assert_not_called()
+        checkpoint.close()
+
+    def test_dealers(self, tmpdir):
+        checkpoint = CheckpointLog(str(tmpdir.join('7.jsonl')))
+        inner = mock.Mock(batch_size=1)
+        inner.fetch_dealers.return_value = {10: {'dealerId': 10,
+                                                 'name': 'test'}}
+        strategy = CheckpointFetchStrategy(checkpoint=checkpoint,
+                                           fetch_strategy=inner)
+        memo = mock.Mock()
+        strategy.fetch_dealers(data_set_id='7', dealer_ids=[10],
+                               endpoints=ApiEndpoints('http://localhost'),
+                               memo=memo)
+        assert inner.fetch_dealers.call_args[1]['memo'] is memo
+        assert list(checkpoint.dealers) == [10]
+        checkpoint.close()
@@ -0,0 +1,25 @@
+import pytest
+from cox_auto_app.endpoints import (ApiEndpoints,
+                                    set_endpoints)
+from fake_api import (FakeApiServer)
+
+
+@pytest.fixture
+def fake_api():
+    """
+    Returns a function starting a FakeApiServer with the given
+    keyword arguments and pointing endpoints.get_endpoints() at it.
+    Servers are stopped and the endpoints reset after the test.
+    """
+    servers = []
+
+    def start(**kwargs):
+        server = FakeApiServer(**kwargs)
+        server.start()
+        servers.append(server)
+        set_endpoints(ApiEndpoints(base_url=server.base_url))
+        return server
+    yield start
+    set_endpoints(None)
+    for server in servers:
+        server.stop()
@@ -0,0 +1,178 @@
+import os
+import signal
+import socket
+import time
+import pytest
+import requests
+from threading import (Thread,
+                       Timer)
+from cox_auto_app.daemon import (MergeServer,
+                                 MergeService,
+                                 ServiceDraining,
+                                 UnixMergeServer,
+                                 parse_job,
+                                 serve)
+from cox_auto_app.endpoints import (ApiEndpoints)
+
+
+def start_service(fake_api_server, **kwargs):
+    service = MergeService(
+        max_workers=4,
+        endpoints=ApiEndpoints(base_url=fake_api_server.base_url),
+        **kwargs)
+    server = MergeServer(service=service, port=0)
+    Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05},
+           daemon=True).start()
+    return server
+
+
+class TestParseJob(object):
+    """
+    Tests for parse_job function.
+    """
+    def test_empty(self):
+        assert parse_job(b'') == {}
+
+    def test_options(self):
+        assert (parse_job(b'{"dataSetId": "abc", "deadline": 2.5}') ==
+                {'data_set_id': 'abc', 'deadline': 2.5})
+
+    @pytest.mark.parametrize('body', [b'[]', b'{"dataSetId": 1}',
+                                      b'{"deadline": -1}', b'{bad'])
+    def test_bad_body(self, body):
+        with pytest.raises(ValueError):
+            parse_job(body)
+
+
+class TestMergeServer(object):
+    """
+    Tests for MergeServer running merges against the fake API.
+    """
+    def test_jobs_share_state(self, fake_api):
+        api = fake_api(vehicle_count=50, dealer_count=7)
+        server = start_service(api)
+        try:
+            for _ in range(2):
+                summary = requests.post(server.base_url + '/merge').json()
+                assert summary['success'] is True
+            data_set_id = api.create_dataset().data_set_id
+            summary = requests.post(server.base_url + '/merge',
+                                    json={'dataSetId': data_set_id}).json()
+            assert summary['dataSetId'] == data_set_id
+            assert summary['success'] is True
+            health = requests.get(server.base_url + '/health').json()
+            assert health == {'status': 'ok', 'activeJobs': 0,
+                              'completedJobs': 3}
+            metrics = requests.get(server.base_url + '/metrics').text
+            assert 'merge_phase_seconds_count' in metrics
+        finally:
+            server.shutdown()
+            server.service.drain()
+            server.server_close()
+
+    def test_bad_request(self, fake_api):
+        server = start_service(fake_api(vehicle_count=50, dealer_count=7))
+        try:
+            result = requests.post(server.base_url + '/merge',
+                                   json={'deadline': 'soon'})
+            assert result.status_code == 400
+        finally:
+            server.shutdown()
+            server.service.drain()
+            server.server_close()
+
+    def test_drain_finishes_running_jobs(self, fake_api):
+        api = fake_api(vehicle_count=50, dealer_count=7, latency=0.02)
+        server = start_service(api)
+        service = server.service
+        results = []
+
+        def send_job():
+            results.append(requests.post(server.base_url + '/merge').json())
+        job = Thread(target=send_job)
+        job.start()
+        while service.status()['activeJobs'] == 0:
+            time.sleep(0.01)
+        service.start_drain()
+        assert requests.post(server.base_url + '/merge').status_code == 503
+        assert service.drain(timeout=30) is True
+        job.join()
+        assert results[0]['success'] is True
+        with pytest.raises(ServiceDraining):
+            service.run_job()
+        server.shutdown()
+        server.server_close()
+
+
+class TestUnixMergeServer(object):
+    """
+    Tests for UnixMergeServer.
+    """
+    def test_health(self, tmpdir):
+        path = str(tmpdir.join('merge.sock'))
+        service = MergeService(endpoints=ApiEndpoints('http://localhost'))
+        server = UnixMergeServer(service=service, path=path)
+        Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05},
+               daemon=True).start()
+        try:
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.connect(path)
+            client.sendall(b'GET /health HTTP/1.1\r\nHost: x\r\n'
+                           b'Connection: close\r\n\r\n')
+            response = b''
+            while True:
+                data = client.recv(4096)
+                if not data:
+                    break
+                response += data
+            client.close()
+            assert response.startswith(b'HTTP/1.1 200')
+            assert b'"status": "ok"' in response
+        finally:
+            server.shutdown()
+            service.drain()
+            server.server_close()
+        assert not os.path.exists(path)
+
+
+class TestServe(object):
+    """
+    Tests for serve function.
+    """
+    def test_stops_on_sigterm(self, fake_api):
+        api = fake_api(vehicle_count=50, dealer_count=7)
+        service = MergeService(endpoints=ApiEndpoints(base_url=api.base_url))
+        server = MergeServer(service=service, port=0)
+        Timer(0.2, os.kill, args=(os.getpid(), signal.SIGTERM)).start()
+        serve(server=server)
+        assert service.draining is True
+        assert signal.getsignal(signal.SIGTERM) == signal.SIG_DFL
+
+    def test_refuses_jobs_while_draining(self, fake_api):
+        api = fake_api(vehicle_count=50, dealer_count=7, latency=0.05)
+        service = MergeService(max_workers=4,
+                               endpoints=ApiEndpoints(base_url=api.base_url))
+        server = MergeServer(service=service, port=0)
+        results = []
+        refused = []
+
+        def send_job():
+            results.append(requests.post(server.base_url + '/merge').json())
+
+        def drain_during_job():
+            while service.status()['activeJobs'] == 0:
+                time.sleep(0.01)
+            os.kill(os.getpid(), signal.SIGTERM)
+            while not service.draining:
+                time.sleep(0.01)
+            refused.append(requests.post(server.base_url + '/merge'))
+        clients = [Thread(target=send_job), Thread(target=drain_during_job)]
+        for client in clients:
+            client.start()
+        serve(server=server)
+        for client in clients:
+            client.join()
+        assert results[0]['success'] is True
+        assert refused[0].status_code == 503
+        assert refused[0].headers['Connection'] == 'close'
+        assert service.completed_jobs == 1
@@ -1,9 +1,32 @@
+import threading
+import time
+from concurrent.futures import (ALL_COMPLETED,
+                                wait)
 import mock
 import pytest
 from cox_auto_app.data_collection import (get_dataset_id,
                                           get_vehicle_ids,
+                                          stream_vehicle_ids,
+                                          get_data_for_vehicles,
+                                          get_data_for_vehicles_and_dealers,
+                                          group_vehicles_by_dealer,
                                           get_vehicle_data,
-                                          get_dealer_info)
+                                          get_dealer_names,
+                                          get_dealer_info,
+                                          get_bulk_records,
+                                          get_results_by_deadline,
+                                          create_executor,
+                                          executor_scope,
+                                          chunk_ids,
+                                          BatchFetchStrategy,
+                                          DEADLINE_ERROR_MESSAGE)
+from cox_auto_app.endpoints import (ApiEndpoints)
+from cox_auto_app.memo import (LRUMemo)
+from cox_auto_app.records import (Dealer,
+                                  Vehicle)
+from cox_auto_app.request_tools import (DeadlineExceeded)
+from cox_auto_app.validation import (MAX_ERROR_DATA_LENGTH,
+                                     ValidationError)
 
 
 class TestGetDatasetid(object):
@@ -153,6 +176,432 @@ class TestGetVehicleids(object):
             data_set_id=data_set_id) == json_data['vehicleIds']
 
 
+class TestStreamVehicleIds(object):
+    """
+    Tests for stream_vehicle_ids function.
+    """
+    url = 'https://vautointerview.azurewebsites.net/api/7/vehicles'
+
+    @mock.patch('cox_auto_app.data_collection.stream_json_request')
+    def test_good_return(self, mock_stream):
+        mock_stream.return_value = iter([b'{"vehicleIds": [1, 2', b'2, 3]}'])
+        assert list(stream_vehicle_ids(data_set_id='7')) == [1, 22, 3]
+        mock_stream.assert_called_once_with(url=self.url, deadline=None)
+
+    @mock.patch('cox_auto_app.data_collection.stream_json_request')
+    def test_value_in_list_not_int(self, mock_stream):
+        mock_stream.return_value = iter([b'{"vehicleIds": [1, "2"]}'])
+        vehicle_ids = stream_vehicle_ids(data_set_id='7')
+        assert next(vehicle_ids) == 1
+        expected_error = ('Data 2 at index 1 in list of vehicle ids '
+                          'returned from {} does not have value of type '
+                          'int.'.format(self.url))
+        with pytest.raises(RuntimeError, match=expected_error):
+            next(vehicle_ids)
+
+    @mock.patch('cox_auto_app.data_collection.stream_json_request')
+    def test_not_list(self, mock_stream):
+        mock_stream.return_value = iter([b'{"vehicleIds": 1}'])
+        with pytest.raises(RuntimeError, match='type list'):
+            list(stream_vehicle_ids(data_set_id='7'))
+
+    @mock.patch('cox_auto_app.data_collection.stream_json_request')
+    def test_key_not_in_return(self, mock_stream):
+        mock_stream.return_value = iter([b'{"other": []}'])
+        with pytest.raises(KeyError):
+            list(stream_vehicle_ids(data_set_id='7'))
+
+
+class TestCreateExecutor(object):
+    """
+    Tests for create_executor function.
+    """
+    def test_bad_max_workers(self):
+        with pytest.raises(ValueError):
+            create_executor(max_workers=0)
+
+    def test_good_max_workers(self):
+        executor = create_executor(max_workers=2)
+        assert executor._max_workers == 2
+        executor.shutdown()
+
+    @mock.patch('cox_auto_app.data_collection.ensure_pool_size')
+    def test_sizes_session_pool(self, mock_ensure):
+        create_executor(max_workers=100).shutdown()
+        mock_ensure.assert_called_once_with(100)
+
+
+class TestExecutorScope(object):
+    """
+    Tests for executor_scope function.
+    """
+    def test_waits_before_deadline(self):
+        with executor_scope(max_workers=1,
+                            deadline=time.monotonic() + 60) as executor:
+            future = executor.submit(time.sleep, 0.1)
+        assert future.done()
+
+    def test_no_wait_after_deadline(self):
+        release = threading.Event()
+        try:
+            with executor_scope(max_workers=1,
+                                deadline=time.monotonic()) as executor:
+                future = executor.submit(release.wait)
+            assert not future.done()
+        finally:
+            release.set()
+
+    def test_provided_executor_not_shut_down(self):
+        executor = create_executor(max_workers=1)
+        try:
+            with executor_scope(executor=executor,
+                                deadline=time.monotonic()) as pool:
+                assert pool is executor
+            assert executor.submit(lambda: 1).result() == 1
+        finally:
+            executor.shutdown()
+
+
+class TestGetDataForVehicles(object):
+    """
+    Tests for get_data_for_vehicles function.
+    """
+    @mock.patch('cox_auto_app.data_collection.get_vehicle_data')
+    def test_error_return(self, mock_vehicle):
+        vehicle_info = {'vehicleId': 1,
+                        'error_message': 'test'}
+        mock_vehicle.return_value = vehicle_info
+        dealer_list, error_list = get_data_for_vehicles(data_set_id='7',
+                                                        vehicle_ids=[1],
+                                                        max_workers=2)
+        assert dealer_list is None
+        assert error_list == [vehicle_info]
+
+    @mock.patch('cox_auto_app.data_collection.get_vehicle_data')
+    def test_good_return(self, mock_vehicle):
+        vehicle_ids = [1, 2, 3]
+        dealer_ids = {1: 5, 2: 6, 3: 5}
+
+        def vehicle_data(url, vehicle_id, **kwargs):
+            return {'vehicleId': vehicle_id,
+                    'year': 1,
+                    'make': 'test',
+                    'model': 'test',
+                    'dealerId': dealer_ids[vehicle_id]}
+        mock_vehicle.side_effect = vehicle_data
+        dealer_list, error_list = get_data_for_vehicles(
+            data_set_id='7',
+            vehicle_ids=vehicle_ids,
+            max_workers=2)
+        assert error_list is None
+        assert [dealer.dealer_id for dealer in dealer_list] == [5, 6]
+        assert ([vehicle.vehicle_id
+                 for vehicle in dealer_list[0].vehicles] == [1, 3])
+        assert not hasattr(dealer_list[0].vehicles[0], 'dealer_id')
+
+
+class TestDeadline(object):
+    """
+    Tests for collection functions given a deadline.
+    """
+    @mock.patch('cox_auto_app.data_collection.get_vehicle_data')
+    def test_get_data_for_vehicles(self, mock_vehicle):
+        release = threading.Event()
+
+        def vehicle_data(url, vehicle_id, **kwargs):
+            if vehicle_id == 2:
+                release.wait()
+            return {'vehicleId': vehicle_id,
+                    'year': 1,
+                    'make': 'test',
+                    'model': 'test',
+                    'dealerId': 5}
+        mock_vehicle.side_effect = vehicle_data
+        executor = create_executor(max_workers=2)
+        try:
+            dealer_list, error_list = get_data_for_vehicles(
+                data_set_id='7',
+                vehicle_ids=[1, 2],
+                executor=executor,
+                deadline=time.monotonic() + 0.2)
+        finally:
+            release.set()
+            executor.shutdown()
+        assert ([vehicle.vehicle_id
+                 for vehicle in dealer_list[0].vehicles] == [1])
+        assert error_list == [{'vehicleId': 2,
+                               'error_message': DEADLINE_ERROR_MESSAGE}]
+
+    @mock.patch('cox_auto_app.data_collection.get_dealer_info')
+    @mock.patch('cox_auto_app.data_collection.get_vehicle_data')
+    def test_no_vehicle_before_deadline(self, mock_vehicle, mock_dealer):
+        release = threading.Event()
+
+        def vehicle_data(url, vehicle_id, **kwargs):
+            release.wait()
+            return {'vehicleId': vehicle_id,
+                    'error_message': 'test'}
+        mock_vehicle.side_effect = vehicle_data
+        executor = create_executor(max_workers=2)
+        deadline = time.monotonic() + 0.1
+        try:
+            dealer_list, vehicle_errors = get_data_for_vehicles(
+                data_set_id='7',
+                vehicle_ids=[1, 2],
+                executor=executor,
+                deadline=deadline)
+            dealer_list, dealer_errors = get_dealer_names(
+                data_set_id='7',
+                dealer_list=dealer_list,
+                executor=executor,
+                deadline=deadline)
+        finally:
+            release.set()
+            executor.shutdown()
+        assert dealer_list is None
+        assert dealer_errors is None
+        assert len(vehicle_errors) == 2
+        mock_dealer.assert_not_called()
+
+    @mock.patch('cox_auto_app.data_collection.get_dealer_info')
+    @mock.patch('cox_auto_app.data_collection.get_vehicle_data')
+    def test_get_data_for_vehicles_and_dealers(self, mock_vehicle,
+                                               mock_dealer):
+        release = threading.Event()
+
+        def vehicle_data(url, vehicle_id, **kwargs):
+            if vehicle_id in (2, 3):
+                release.wait()
+            return {'vehicleId': vehicle_id,
+                    'year': 1,
+                    'make': 'test',
+                    'model': 'test',
+                    'dealerId': vehicle_id}
+
+        def dealer_info(url, dealer_id, **kwargs):
+            return {'dealerId': dealer_id,
+                    'name': 'test'}
+        mock_vehicle.side_effect = vehicle_data
+        mock_dealer.side_effect = dealer_info
+        executor = create_executor(max_workers=2)
+        try:
+            dealer_list, vehicle_errors, dealer_errors = \
+                get_data_for_vehicles_and_dealers(
+                    data_set_id='7',
+                    vehicle_ids=[1, 2, 3, 4],
+                    executor=executor,
+                    max_workers=2,
+                    deadline=time.monotonic() + 0.2)
+        finally:
+            release.set()
+            executor.shutdown()
+        assert [dealer.dealer_id for dealer in dealer_list] == [1]
+        assert dealer_errors is None
+        # Vehicle 4 is never started because 2 and 3 fill the window.
+        assert (sorted(error['vehicleId'] for error in vehicle_errors) ==
+                [2, 3, 4])
+        assert all(error['error_message'] == DEADLINE_ERROR_MESSAGE
+                   for error in vehicle_errors)
+
+    @mock.patch('cox_auto_app.data_collection.wait')
+    @mock.patch('cox_auto_app.data_collection.get_dealer_info')
+    @mock.patch('cox_auto_app.data_collection.get_vehicle_data')
+    def test_vehicle_done_after_deadline_wait(self, mock_vehicle,
+                                              mock_dealer, mock_wait):
+        def vehicle_data(url, vehicle_id, **kwargs):
+            return {'vehicleId': vehicle_id,
+                    'year': 1,
+                    'make': 'test',
+                    'model': 'test',
+                    'dealerId': vehicle_id}
+
+        def late_wait(futures, timeout=None, return_when=ALL_COMPLETED):
+            # The first wait times out just before the vehicles finish.
+            if mock_wait.call_count == 1:
+                wait(futures)
+                return set(), set(futures)
+            return wait(futures, timeout=timeout, return_when=return_when)
+        mock_vehicle.side_effect = vehicle_data
+        mock_wait.side_effect = late_wait
+        dealer_list, vehicle_errors, dealer_errors = \
+            get_data_for_vehicles_and_dealers(
+                data_set_id='7',
+                vehicle_ids=[1, 2],
+                max_workers=2,
+                deadline=time.monotonic() + 10)
+        assert dealer_list is None
+        assert dealer_errors is None
+        assert vehicle_errors == [
+            {'vehicleId': vehicle_id,
+             'error_message': DEADLINE_ERROR_MESSAGE}
+            for vehicle_id in (1, 2)]
+        mock_dealer.assert_not_called()
+
+    @mock.patch('cox_auto_app.data_collection.wait')
+    @mock.patch('cox_auto_app.data_collection.get_dealer_info')
+    @mock.patch('cox_auto_app.data_collection.get_vehicle_data')
+    def test_no_refill_after_deadline(self, mock_vehicle, mock_dealer,
+                                      mock_wait):
+        release = threading.Event()
+        deadline = time.monotonic() + 0.1
+
+        def vehicle_data(url, vehicle_id, **kwargs):
+            if vehicle_id == 2:
+                release.wait()
+            return {'vehicleId': vehicle_id,
+                    'year': 1,
+                    'make': 'test',
+                    'model': 'test',
+                    'dealerId': vehicle_id}
+
+        def dealer_info(url, dealer_id, **kwargs):
+            return {'dealerId': dealer_id,
+                    'name': 'test'}
+
+        def late_wait(futures, timeout=None, return_when=ALL_COMPLETED):
+            # The first wait only returns vehicle 1 after the deadline.
+            if mock_wait.call_count == 1:
+                time.sleep(max(0, deadline - time.monotonic()))
+                return wait(futures, return_when=return_when)
+            return wait(futures, timeout=timeout, return_when=return_when)
+        mock_vehicle.side_effect = vehicle_data
+        mock_dealer.side_effect = dealer_info
+        mock_wait.side_effect = late_wait
+        executor = create_executor(max_workers=2)
+        try:
+            with mock.patch.object(executor, 'submit',
+                                   wraps=executor.submit) as mock_submit:
+                dealer_list, vehicle_errors, dealer_errors = \
+                    get_data_for_vehicles_and_dealers(
+                        data_set_id='7',
+                        vehicle_ids=[1, 2, 3, 4],
+                        executor=executor,
+                        max_workers=2,
+                        deadline=deadline)
+        finally:
+            release.set()
+            executor.shutdown()
+        # Vehicle 3 would fill the window left by vehicle 1.
+        assert [call[1]['vehicle_ids']
+                for call in mock_submit.call_args_list
+                if 'vehicle_ids' in call[1]] == [[1], [2]]
+        assert vehicle_errors == [
+            {'vehicleId': vehicle_id,
+             'error_message': DEADLINE_ERROR_MESSAGE}
+            for vehicle_id in (2, 3, 4)]
+
+    @mock.patch('cox_auto_app.data_collection.get_json_request')
+    def test_deadline_exceeded_before_request(self, mock_get):
+        mock_get.side_effect = DeadlineExceeded(
+            'Deadline exceeded before request.')
+        url = 'https://vautointerview.azurewebsites.net/api/7/vehicles/8'
+        assert (get_vehicle_data(url=url, vehicle_id=8) ==
+                {'vehicleId': 8, 'error_message': DEADLINE_ERROR_MESSAGE})
+        assert (get_dealer_info(url=url, dealer_id=8) ==
+                {'dealerId': 8, 'error_message': DEADLINE_ERROR_MESSAGE})
+
+    @mock.patch('cox_auto_app.data_collection.get_json_request')
+    def test_error_after_deadline(self, mock_get):
+        mock_get.side_effect = RuntimeError('Read timed out.')
+        url = 'https://vautointerview.azurewebsites.net/api/7/vehicles/8'
+        assert (get_vehicle_data(url=url, vehicle_id=8,
+                                 deadline=time.monotonic())['error_message']
+                == DEADLINE_ERROR_MESSAGE)
+        assert (get_vehicle_data(url=url, vehicle_id=8,
+                                 deadline=time.monotonic() + 60)
+                ['error_message'] == 'Read timed out.')
+
+    def test_results_cancelled_before_collecting(self):
+        executor = create_executor(max_workers=1)
+        release = threading.Event()
+        try:
+            running = executor.submit(release.wait)
+            queued = executor.submit(lambda: {2: {'vehicleId': 2}})
+            future_list = [([1], running), ([2], queued)]
+            results = get_results_by_deadline(future_list=future_list,
+                                              id_key='vehicleId',
+                                              deadline=time.monotonic())
+        finally:
+            release.set()
+            executor.shutdown()
+        assert queued.cancelled()
+        assert results == [{'vehicleId': item_id,
+                            'error_message': DEADLINE_ERROR_MESSAGE}
+                           for item_id in (1, 2)]
+
+
+class TestGetDataForVehiclesAndDealers(object):
+    """
+    Tests for get_data_for_vehicles_and_dealers function.
+    """
+    @mock.patch('cox_auto_app.data_collection.get_dealer_info')
+    @mock.patch('cox_auto_app.data_collection.get_vehicle_data')
+    def test_good_return(self, mock_vehicle, mock_dealer):
+        dealer_ids = {1: 5, 2: 6, 3: 5, 4: 7}
+
+        def vehicle_data(url, vehicle_id, **kwargs):
+            if vehicle_id == 4:
+                return {'vehicleId': vehicle_id,
+                        'error_message': 'test'}
+            return {'vehicleId': vehicle_id,
+                    'year': 1,
+                    'make': 'test',
+                    'model': 'test',
+                    'dealerId': dealer_ids[vehicle_id]}
+
+        def dealer_info(url, dealer_id, **kwargs):
+            if dealer_id == 6:
+                return {'dealerId': dealer_id,
+                        'error_message': 'test'}
+            return {'dealerId': dealer_id,
+                    'name': 'dealer {}'.format(dealer_id)}
+        mock_vehicle.side_effect = vehicle_data
+        mock_dealer.side_effect = dealer_info
+        dealer_list, vehicle_errors, dealer_errors = \
+            get_data_for_vehicles_and_dealers(data_set_id='7',
+                                              vehicle_ids=[1, 2, 3, 4],
+                                              max_workers=2)
+        assert mock_dealer.call_count == 2
+        assert [dealer.dealer_id for dealer in dealer_list] == [5, 6]
+        assert dealer_list[0].name == 'dealer 5'
+        assert ([vehicle.vehicle_id
+                 for vehicle in dealer_list[0].vehicles] == [1, 3])
+        assert vehicle_errors == [{'vehicleId': 4,
+                                   'error_message': 'test'}]
+        assert dealer_errors == [{'dealerId': 6,
+                                  'error_message': 'test'}]
+
+    @mock.patch('cox_auto_app.data_collection.get_dealer_info')
+    @mock.patch('cox_auto_app.data_collection.get_vehicle_data')
+    def test_no_vehicles(self, mock_vehicle, mock_dealer):
+        assert (get_data_for_vehicles_and_dealers(data_set_id='7',
+                                                  vehicle_ids=[]) ==
+                (None, None, None))
+        mock_dealer.assert_not_called()
+
+
+class TestGroupVehiclesByDealer(object):
+    """
+    Tests for group_vehicles_by_dealer function.
+    """
+    def test_good_return(self):
+        vehicle_info_list = [{'vehicleId': vehicle_id,
+                              'year': 1,
+                              'make': 'test',
+                              'model': 'test',
+                              'dealerId': dealer_id}
+                             for vehicle_id, dealer_id
+                             in [(1, 9), (2, 3), (3, 9), (4, 5), (5, 3)]]
+        vehicle_info_list.append({'vehicleId': 6,
+                                  'error_message': 'test'})
+        dealer_list, error_list = group_vehicles_by_dealer(
+            vehicle_info_list=vehicle_info_list)
+        assert [dealer.dealer_id for dealer in dealer_list] == [9, 3, 5]
+        assert ([[vehicle.vehicle_id for vehicle in dealer.vehicles]
+                 for dealer in dealer_list] == [[1, 3], [2, 5], [4]])
+        assert error_list == [vehicle_info_list[-1]]
+
+
 class TestGetVehicleData(object):
     """
     Tests for get_vehicle_data function.
@@ -168,18 +617,14 @@ class TestGetVehicleData(object):
         expected_error = ('Got unexpected status code {} from url '
                           '{}'.format(return_status, url))
         mock_get.side_effect = RuntimeError(expected_error)
-        data_return = {vehicle_id: {}}
-        get_vehicle_data(url=url,
-                         data_return=data_return,
-                         vehicle_id=vehicle_id)
-        assert vehicle_id in data_return
+        vehicle_info = get_vehicle_data(url=url, vehicle_id=vehicle_id)
         expected_keys = ['vehicleId', 'error_message']
         for key in expected_keys:
-            assert key in data_return.get(vehicle_id)
+            assert key in vehicle_info
             if key == 'vehicleId':
-                assert data_return.get(vehicle_id).get(key) == vehicle_id
+                assert vehicle_info.get(key) == vehicle_id
             if key == 'error_message':
-                assert data_return.get(vehicle_id).get(key) == expected_error
+                assert vehicle_info.get(key) == expected_error
 
     @mock.patch('cox_auto_app.data_collection.get_json_request')
     def test_bad_content(self, mock_get):
@@ -192,18 +637,14 @@ class TestGetVehicleData(object):
                           'from url {} but got {}'
                           .format(url, return_content))
         mock_get.side_effect = RuntimeError(expected_error)
-        data_return = {vehicle_id: {}}
-        get_vehicle_data(url=url,
-                         data_return=data_return,
-                         vehicle_id=vehicle_id)
-        assert vehicle_id in data_return
+        vehicle_info = get_vehicle_data(url=url, vehicle_id=vehicle_id)
         expected_keys = ['vehicleId', 'error_message']
         for key in expected_keys:
-            assert key in data_return.get(vehicle_id)
+            assert key in vehicle_info
             if key == 'vehicleId':
-                assert data_return.get(vehicle_id).get(key) == vehicle_id
+                assert vehicle_info.get(key) == vehicle_id
             if key == 'error_message':
-                assert data_return.get(vehicle_id).get(key) == expected_error
+                assert vehicle_info.get(key) == expected_error
 
     # get_vehicle_data generated exceptions
     @mock.patch('cox_auto_app.data_collection.get_json_request')
@@ -216,18 +657,14 @@ class TestGetVehicleData(object):
         expected_error = ('Data returned {} from {} is not of type '
                           'dict.'.format(json_data, url))
         mock_get.return_value = json_data
-        data_return = {vehicle_id: {}}
-        get_vehicle_data(url=url,
-                         data_return=data_return,
-                         vehicle_id=vehicle_id)
-        assert vehicle_id in data_return
+        vehicle_info = get_vehicle_data(url=url, vehicle_id=vehicle_id)
         expected_keys = ['vehicleId', 'error_message']
         for key in expected_keys:
-            assert key in data_return.get(vehicle_id)
+            assert key in vehicle_info
             if key == 'vehicleId':
-                assert data_return.get(vehicle_id).get(key) == vehicle_id
+                assert vehicle_info.get(key) == vehicle_id
             if key == 'error_message':
-                assert data_return.get(vehicle_id).get(key) == expected_error
+                assert vehicle_info.get(key) == expected_error
 
     @mock.patch('cox_auto_app.data_collection.get_json_request')
     def test_key_not_in_return(self, mock_get):
@@ -245,18 +682,14 @@ class TestGetVehicleData(object):
                           .format(json_data,
                                   url))
         mock_get.return_value = json_data
-        data_return = {vehicle_id: {}}
-        get_vehicle_data(url=url,
-                         data_return=data_return,
-                         vehicle_id=vehicle_id)
-        assert vehicle_id in data_return
+        vehicle_info = get_vehicle_data(url=url, vehicle_id=vehicle_id)
         expected_keys = ['vehicleId', 'error_message']
         for key in expected_keys:
-            assert key in data_return.get(vehicle_id)
+            assert key in vehicle_info
             if key == 'vehicleId':
-                assert data_return.get(vehicle_id).get(key) == vehicle_id
+                assert vehicle_info.get(key) == vehicle_id
             if key == 'error_message':
-                assert data_return.get(vehicle_id).get(key) == expected_error
+                assert vehicle_info.get(key) == expected_error
 
     @mock.patch('cox_auto_app.data_collection.get_json_request')
     def test_return_value_for_key_not_correct(self, mock_get):
@@ -275,18 +708,14 @@ class TestGetVehicleData(object):
                           .format(json_data,
                                   url))
         mock_get.return_value = json_data
-        data_return = {vehicle_id: {}}
-        get_vehicle_data(url=url,
-                         data_return=data_return,
-                         vehicle_id=vehicle_id)
-        assert vehicle_id in data_return
+        vehicle_info = get_vehicle_data(url=url, vehicle_id=vehicle_id)
         expected_keys = ['vehicleId', 'error_message']
         for key in expected_keys:
-            assert key in data_return.get(vehicle_id)
+            assert key in vehicle_info
             if key == 'vehicleId':
-                assert data_return.get(vehicle_id).get(key) == vehicle_id
+                assert vehicle_info.get(key) == vehicle_id
             if key == 'error_message':
-                assert data_return.get(vehicle_id).get(key) == expected_error
+                assert vehicle_info.get(key) == expected_error
 
     # good test
     @mock.patch('cox_auto_app.data_collection.get_json_request')
@@ -301,12 +730,86 @@ class TestGetVehicleData(object):
                      'model': 'test',
                      'dealerId': 1}
         mock_get.return_value = json_data
-        data_return = {vehicle_id: {}}
-        get_vehicle_data(url=url,
-                         data_return=data_return,
-                         vehicle_id=vehicle_id)
-        assert vehicle_id in data_return
-        assert data_return.get(vehicle_id) == json_data
+        vehicle_info = get_vehicle_data(url=url, vehicle_id=vehicle_id)
+        assert vehicle_info == json_data
+
+
+class TestGetVehicleDataCache(object):
+    """
+    Tests for get_vehicle_data function with a response cache.
+    """
+    @mock.patch('cox_auto_app.data_collection.get_json_request')
+    def test_cache_hit(self, mock_get):
+        url = 'https://vautointerview.azurewebsites.net/api/7/vehicles/8'
+        json_data = {'vehicleId': 8,
+                     'year': 1,
+                     'make': 'test',
+                     'model': 'test',
+                     'dealerId': 1}
+        cache = mock.MagicMock()
+        cache.get.return_value = json_data
+        assert get_vehicle_data(url=url, vehicle_id=8,
+                                cache=cache) == json_data
+        mock_get.assert_not_called()
+
+    @mock.patch('cox_auto_app.data_collection.get_json_request')
+    def test_cache_miss(self, mock_get):
+        url = 'https://vautointerview.azurewebsites.net/api/7/vehicles/8'
+        json_data = {'vehicleId': 8,
+                     'year': 1,
+                     'make': 'test',
+                     'model': 'test',
+                     'dealerId': 1}
+        cache = mock.MagicMock()
+        cache.get.return_value = None
+        mock_get.return_value = json_data
+        assert get_vehicle_data(url=url, vehicle_id=8,
+                                cache=cache) == json_data
+        cache.set.assert_called_once_with(url, json_data)
+
+    @mock.patch('cox_auto_app.data_collection.get_json_request')
+    def test_invalid_not_cached(self, mock_get):
+        url = 'https://vautointerview.azurewebsites.net/api/7/vehicles/8'
+        cache = mock.MagicMock()
+        cache.get.return_value = None
+        mock_get.return_value = 1
+        vehicle_info = get_vehicle_data(url=url, vehicle_id=8, cache=cache)
+        assert 'error_message' in vehicle_info
+        cache.set.assert_not_called()
+
+
+class TestGetDealerNames(object):
+    """
+    Tests for get_dealer_names function.
+    """
+    @mock.patch('cox_auto_app.data_collection.get_dealer_info')
+    def test_error_return(self, mock_dealer):
+        dealer_info = {'dealerId': 1,
+                       'error_message': 'test'}
+        mock_dealer.return_value = dealer_info
+        dealer_list = [Dealer(dealer_id=1)]
+        dealer_list, error_list = get_dealer_names(data_set_id='7',
+                                                   dealer_list=dealer_list,
+                                                   max_workers=2)
+        assert dealer_list[0].name is None
+        assert error_list == [dealer_info]
+
+    @mock.patch('cox_auto_app.data_collection.get_dealer_info')
+    def test_good_return(self, mock_dealer):
+        def dealer_info(url, dealer_id, **kwargs):
+            return {'dealerId': dealer_id,
+                    'name': 'dealer {}'.format(dealer_id)}
+        mock_dealer.side_effect = dealer_info
+        dealer_list = [Dealer(dealer_id=1),
+                       Dealer(dealer_id=2)]
+        executor = create_executor(max_workers=2)
+        dealer_list, error_list = get_dealer_names(data_set_id='7',
+                                                   dealer_list=dealer_list,
+                                                   executor=executor)
+        executor.shutdown()
+        assert error_list is None
+        assert ([dealer.name for dealer in dealer_list] ==
+                ['dealer 1', 'dealer 2'])
 
 
 class TestGetDealerInfo(object):
@@ -324,18 +827,14 @@ class TestGetDealerInfo(object):
         expected_error = ('Got unexpected status code {} from url '
                           '{}'.format(return_status, url))
         mock_get.side_effect = RuntimeError(expected_error)
-        data_return = {dealer_id: {}}
-        get_dealer_info(url=url,
-                        data_return=data_return,
-                        dealer_id=dealer_id)
-        assert dealer_id in data_return
+        dealer_info = get_dealer_info(url=url, dealer_id=dealer_id)
         expected_keys = ['dealerId', 'error_message']
         for key in expected_keys:
-            assert key in data_return.get(dealer_id)
+            assert key in dealer_info
             if key == 'dealerId':
-                assert data_return.get(dealer_id).get(key) == dealer_id
+                assert dealer_info.get(key) == dealer_id
             if key == 'error_message':
-                assert data_return.get(dealer_id).get(key) == expected_error
+                assert dealer_info.get(key) == expected_error
 
     @mock.patch('cox_auto_app.data_collection.get_json_request')
     def test_bad_content(self, mock_get):
@@ -348,18 +847,14 @@ class TestGetDealerInfo(object):
                           'from url {} but got {}'
                           .format(url, return_content))
         mock_get.side_effect = RuntimeError(expected_error)
-        data_return = {dealer_id: {}}
-        get_dealer_info(url=url,
-                        data_return=data_return,
-                        dealer_id=dealer_id)
-        assert dealer_id in data_return
+        dealer_info = get_dealer_info(url=url, dealer_id=dealer_id)
         expected_keys = ['dealerId', 'error_message']
         for key in expected_keys:
-            assert key in data_return.get(dealer_id)
+            assert key in dealer_info
             if key == 'dealerId':
-                assert data_return.get(dealer_id).get(key) == dealer_id
+                assert dealer_info.get(key) == dealer_id
             if key == 'error_message':
-                assert data_return.get(dealer_id).get(key) == expected_error
+                assert dealer_info.get(key) == expected_error
 
     # get_dealer_info generated exceptions
     @mock.patch('cox_auto_app.data_collection.get_json_request')
@@ -372,18 +867,14 @@ class TestGetDealerInfo(object):
         expected_error = ('Data returned {} from {} is not of type '
                           'dict.'.format(json_data, url))
         mock_get.return_value = json_data
-        data_return = {dealer_id: {}}
-        get_dealer_info(url=url,
-                        data_return=data_return,
-                        dealer_id=dealer_id)
-        assert dealer_id in data_return
+        dealer_info = get_dealer_info(url=url, dealer_id=dealer_id)
         expected_keys = ['dealerId', 'error_message']
         for key in expected_keys:
-            assert key in data_return.get(dealer_id)
+            assert key in dealer_info
             if key == 'dealerId':
-                assert data_return.get(dealer_id).get(key) == dealer_id
+                assert dealer_info.get(key) == dealer_id
             if key == 'error_message':
-                assert data_return.get(dealer_id).get(key) == expected_error
+                assert dealer_info.get(key) == expected_error
 
     @mock.patch('cox_auto_app.data_collection.get_json_request')
     def test_key_not_in_return(self, mock_get):
@@ -398,18 +889,14 @@ class TestGetDealerInfo(object):
                           .format(json_data,
                                   url))
         mock_get.return_value = json_data
-        data_return = {dealer_id: {}}
-        get_dealer_info(url=url,
-                        data_return=data_return,
-                        dealer_id=dealer_id)
-        assert dealer_id in data_return
+        dealer_info = get_dealer_info(url=url, dealer_id=dealer_id)
         expected_keys = ['dealerId', 'error_message']
         for key in expected_keys:
-            assert key in data_return.get(dealer_id)
+            assert key in dealer_info
             if key == 'dealerId':
-                assert data_return.get(dealer_id).get(key) == dealer_id
+                assert dealer_info.get(key) == dealer_id
             if key == 'error_message':
-                assert data_return.get(dealer_id).get(key) == expected_error
+                assert dealer_info.get(key) == expected_error
 
     @mock.patch('cox_auto_app.data_collection.get_json_request')
     def test_return_value_for_key_not_correct(self, mock_get):
@@ -425,18 +912,14 @@ class TestGetDealerInfo(object):
                           .format(json_data,
                                   url))
         mock_get.return_value = json_data
-        data_return = {dealer_id: {}}
-        get_dealer_info(url=url,
-                        data_return=data_return,
-                        dealer_id=dealer_id)
-        assert dealer_id in data_return
+        dealer_info = get_dealer_info(url=url, dealer_id=dealer_id)
         expected_keys = ['dealerId', 'error_message']
         for key in expected_keys:
-            assert key in data_return.get(dealer_id)
+            assert key in dealer_info
             if key == 'dealerId':
-                assert data_return.get(dealer_id).get(key) == dealer_id
+                assert dealer_info.get(key) == dealer_id
             if key == 'error_message':
-                assert data_return.get(dealer_id).get(key) == expected_error
+                assert dealer_info.get(key) == expected_error
 
     # good test
     @mock.patch('cox_auto_app.data_collection.get_json_request')
@@ -448,9 +931,143 @@ class TestGetDealerInfo(object):
         json_data = {'name': 'test',
                      'dealerId': 1}
         mock_get.return_value = json_data
-        data_return = {dealer_id: {}}
-        get_dealer_info(url=url,
-                        data_return=data_return,
-                        dealer_id=dealer_id)
-        assert dealer_id in data_return
-        assert data_return.get(dealer_id) == json_data
+        dealer_info = get_dealer_info(url=url, dealer_id=dealer_id)
+        assert dealer_info == json_data
+
+
+class TestGetDealerInfoMemo(object):
+    """
+    Tests for get_dealer_info function with a dealer memo.
+    """
+    @mock.patch('cox_auto_app.data_collection.get_json_request')
+    def test_memo_reused(self, mock_get):
+        json_data = {'name': 'test',
+                     'dealerId': 8}
+        mock_get.return_value = json_data
+        memo = LRUMemo()
+        for data_set_id in ['7', '9']:
+            url = ('https://vautointerview.azurewebsites.net/api/{}/'
+                   'dealers/8'.format(data_set_id))
+            assert get_dealer_info(url=url, dealer_id=8,
+                                   memo=memo) == json_data
+        assert mock_get.call_count == 1
+        assert memo.hits == 1
+        assert memo.misses == 1
+
+    @mock.patch('cox_auto_app.data_collection.get_json_request')
+    def test_error_not_memoized(self, mock_get):
+        url = 'https://vautointerview.azurewebsites.net/api/7/dealers/8'
+        mock_get.side_effect = RuntimeError('test')
+        memo = LRUMemo()
+        dealer_info = get_dealer_info(url=url, dealer_id=8, memo=memo)
+        assert dealer_info == {'dealerId': 8, 'error_message': 'test'}
+        assert len(memo) == 0
+
+
+class TestChunkIds(object):
+    """
+    Tests for chunk_ids function.
+    """
+    def test_chunks(self):
+        assert list(chunk_ids(ids=iter([1, 2, 3, 4, 5]), size=2)) == \
+            [[1, 2], [3, 4], [5]]
+        assert list(chunk_ids(ids=[], size=2)) == []
+
+
+class TestBatchFetchStrategy(object):
+    """
+    Tests for BatchFetchStrategy class.
+    """
+    @staticmethod
+    def vehicle(vehicle_id, dealer_id):
+        return {'vehicleId': vehicle_id,
+                'year': 1,
+                'make': 'test',
+                'model': 'test',
+                'dealerId': dealer_id}
+
+    def test_bad_batch_size(self):
+        with pytest.raises(ValueError):
+            BatchFetchStrategy(batch_size=0)
+
+    def test_records_checked_per_id(self):
+        bulk_fetcher = mock.Mock(return_value=[self.vehicle(1, 5),
+                                               {'vehicleId': 2},
+                                               'not a record'])
+        strategy = BatchFetchStrategy(batch_size=10,
+                                      bulk_fetcher=bulk_fetcher)
+        dealer_list, error_list = get_data_for_vehicles(
+            data_set_id='7', vehicle_ids=[1, 2, 3],
+            fetch_strategy=strategy)
+        assert bulk_fetcher.call_count == 1
+        assert bulk_fetcher.call_args[1]['ids'] == [1, 2, 3]
+        assert dealer_list == [Dealer(dealer_id=5,
+                                      vehicles=[Vehicle(vehicle_id=1,
+                                                        year=1,
+                                                        make='test',
+                                                        model='test')])]
+        assert [error['vehicleId'] for error in error_list] == [2, 3]
+        assert 'Key year not found' in error_list[0]['error_message']
+        assert 'No vehicle info for id 3' in error_list[1]['error_message']
+
+    def test_bulk_failure(self):
+        bulk_fetcher = mock.Mock(side_effect=RuntimeError('test'))
+        strategy = BatchFetchStrategy(batch_size=2,
+                                      bulk_fetcher=bulk_fetcher)
+        dealer_list, error_list = get_data_for_vehicles(
+            data_set_id='7', vehicle_ids=[1, 2, 3],
+            fetch_strategy=strategy)
+        assert bulk_fetcher.call_count == 2
+        assert dealer_list is None
+        assert error_list == [{'vehicleId': vehicle_id,
+                               'error_message': 'test'}
+                              for vehicle_id in [1, 2, 3]]
+
+    @mock.patch('cox_auto_app.data_collection.get_json_request')
+    def test_bulk_not_a_list(self, mock_get):
+        mock_get.return_value = {'records': ['x' * 10000]}
+        with pytest.raises(ValidationError) as excinfo:
+            get_bulk_records(kind='vehicle', data_set_id='7', ids=[1, 2],
+                             endpoints=ApiEndpoints('http://localhost'))
+        assert len(str(excinfo.value)) < MAX_ERROR_DATA_LENGTH + 200
+
+    def test_vehicles_and_dealers(self):
+        def bulk_fetcher(kind, data_set_id, ids, **kwargs):
+            if kind == 'vehicle':
+                return [self.vehicle(vehicle_id, vehicle_id % 2 + 5)
+                        for vehicle_id in ids]
+            return [{'dealerId': dealer_id,
+                     'name': 'dealer {}'.format(dealer_id)}
+                    for dealer_id in ids]
+        strategy = BatchFetchStrategy(batch_size=3,
+                                      bulk_fetcher=mock.Mock(
+                                          side_effect=bulk_fetcher))
+        memo = LRUMemo()
+        memo.put(6, {'dealerId': 6, 'name': 'memo'})
+        dealer_list, vehicle_errors, dealer_errors = \
+            get_data_for_vehicles_and_dealers(data_set_id='7',
+                                              vehicle_ids=range(1, 8),
+                                              max_workers=2,
+                                              dealer_memo=memo,
+                                              fetch_strategy=strategy)
+        assert vehicle_errors is None
+        assert dealer_errors is None
+        assert [(dealer.dealer_id, dealer.name)
+                for dealer in dealer_list] == [(6, 'memo'), (5, 'dealer 5')]
+        assert strategy.bulk_fetcher.call_count == 4
+
+    def test_cache_shared_with_per_id(self):
+        cached = self.vehicle(1, 5)
+        cache = mock.Mock()
+        cache.get.side_effect = lambda url: (cached if url.endswith('/1')
+                                             else None)
+        bulk_fetcher = mock.Mock(return_value=[self.vehicle(2, 5)])
+        strategy = BatchFetchStrategy(bulk_fetcher=bulk_fetcher)
+        dealer_list, error_list = get_data_for_vehicles(
+            data_set_id='7', vehicle_ids=[1, 2], cache=cache,
+            fetch_strategy=strategy)
+        assert bulk_fetcher.call_args[1]['ids'] == [2]
+        assert len(dealer_list[0].vehicles) == 2
+        cache.set.assert_called_once_with(
+            'https://vautointerview.azurewebsites.net/api/7/vehicles/2',
+            self.vehicle(2, 5))
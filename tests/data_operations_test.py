@@ -1,5 +1,24 @@
 import mock
-from cox_auto_app.data_operations import (merge)
+from cox_auto_app.data_operations import (merge,
+                                          merge_many,
+                                          run_async_merge)
+from cox_auto_app.memo import (LRUMemo)
+from cox_auto_app.records import (Dealer,
+                                  Vehicle)
+
+
+def to_records(dealer_dicts):
+    """
+    Returns the Dealer records for dealers in the answer json format.
+    """
+    return [Dealer(dealer_id=dealer['dealerId'],
+                   name=dealer.get('name'),
+                   vehicles=[Vehicle(vehicle_id=vehicle['vehicleId'],
+                                     year=vehicle['year'],
+                                     make=vehicle['make'],
+                                     model=vehicle['model'])
+                             for vehicle in dealer['vehicles']])
+            for dealer in dealer_dicts]
 
 
 class TestMerge(object):
@@ -40,7 +59,8 @@ class TestMerge(object):
                                        'make': 'test',
                                        'model': 'test'}]}]
         error_data = None
-        mock_vehicle_data.return_value = (vehicle_data, error_data)
+        mock_vehicle_data.return_value = (to_records(vehicle_data),
+                                          error_data)
         dealer_data = [{'dealerId': 1,
                         'name': 'test',
                         'vehicles': [{'vehicleId': 1,
@@ -61,7 +81,118 @@ class TestMerge(object):
                                       'year': 1,
                                       'make': 'test',
                                       'model': 'test'}]}]
-        mock_dealer_data.return_value = (dealer_data, error_data)
+        mock_dealer_data.return_value = (to_records(dealer_data), error_data)
         json_data = {'dealers': dealer_data}
         mock_json_post.return_value = json_data
-        merge()
+        merge(stream_dealers=False)
+        assert (mock_json_post.call_args[1]['post_data'] ==
+                {'dealers': dealer_data})
+
+    @mock.patch('cox_auto_app.data_operations.post_json_request')
+    @mock.patch('cox_auto_app.data_operations.'
+                'get_data_for_vehicles_and_dealers')
+    @mock.patch('cox_auto_app.data_operations.get_vehicle_ids')
+    @mock.patch('cox_auto_app.data_operations.get_dataset_id')
+    def test_good_streaming(self,
+                            mock_get_dataset,
+                            mock_get_vehicle_ids,
+                            mock_collect,
+                            mock_json_post):
+        data_set_id = '7'
+        mock_get_dataset.return_value = data_set_id
+        mock_get_vehicle_ids.return_value = [1]
+        dealer_data = [{'dealerId': 1,
+                        'name': 'test',
+                        'vehicles': [{'vehicleId': 1,
+                                      'year': 1,
+                                      'make': 'test',
+                                      'model': 'test'}]}]
+        mock_collect.return_value = (to_records(dealer_data), None, None)
+        json_data = {'success': True}
+        mock_json_post.return_value = json_data
+        assert merge() == json_data
+        mock_json_post.assert_called_once_with(
+            url=('https://vautointerview.azurewebsites.net/api/{}/answer'
+                 .format(data_set_id)),
+            post_data={'dealers': dealer_data})
+
+    @mock.patch('cox_auto_app.data_operations.post_json_request')
+    @mock.patch('cox_auto_app.data_operations.'
+                'get_data_for_vehicles_and_dealers')
+    @mock.patch('cox_auto_app.data_operations.get_vehicle_ids')
+    @mock.patch('cox_auto_app.data_operations.get_dataset_id')
+    def test_given_dataset_and_executor(self,
+                                        mock_get_dataset,
+                                        mock_get_vehicle_ids,
+                                        mock_collect,
+                                        mock_json_post):
+        mock_get_vehicle_ids.return_value = [1]
+        mock_collect.return_value = ([], None, None)
+        executor = mock.Mock()
+        merge(data_set_id='8', executor=executor)
+        mock_get_dataset.assert_not_called()
+        assert mock_get_vehicle_ids.call_args[1]['data_set_id'] == '8'
+        assert mock_collect.call_args[1]['executor'] is executor
+        executor.shutdown.assert_not_called()
+
+
+class TestMergeMany(object):
+    """
+    Tests for merge_many function.
+    """
+    @mock.patch('cox_auto_app.data_operations.merge_summary')
+    def test_shares_dealer_memo(self, mock_summary):
+        merge_many(count=3, max_workers=2)
+        memos = [call[1]['dealer_memo']
+                 for call in mock_summary.call_args_list]
+        assert len(memos) == 3
+        assert isinstance(memos[0], LRUMemo)
+        assert memos[1] is memos[0] and memos[2] is memos[0]
+
+    @mock.patch('cox_auto_app.data_operations.merge_summary')
+    def test_given_dealer_memo(self, mock_summary):
+        memo = LRUMemo()
+        merge_many(count=2, max_workers=2, dealer_memo=memo)
+        assert all(call[1]['dealer_memo'] is memo
+                   for call in mock_summary.call_args_list)
+
+
+class TestAsyncMerge(object):
+    """
+    Test successful execution of async_merge function.
+    """
+    @mock.patch('cox_auto_app.data_operations.create_async_session')
+    @mock.patch('cox_auto_app.data_operations.async_post_json_request')
+    @mock.patch('cox_auto_app.data_operations.async_get_dealer_names')
+    @mock.patch('cox_auto_app.data_operations.async_get_data_for_vehicles')
+    @mock.patch('cox_auto_app.data_operations.async_get_vehicle_ids')
+    @mock.patch('cox_auto_app.data_operations.async_get_dataset_id')
+    def test_good(self,
+                  mock_get_dataset,
+                  mock_get_vehicle_ids,
+                  mock_vehicle_data,
+                  mock_dealer_data,
+                  mock_json_post,
+                  mock_session):
+        data_set_id = '7'
+        mock_session.return_value = None
+        mock_get_dataset.return_value = data_set_id
+        mock_get_vehicle_ids.return_value = [1]
+        vehicle_data = [{'dealerId': 1,
+                         'vehicles': [{'vehicleId': 1,
+                                       'year': 1,
+                                       'make': 'test',
+                                       'model': 'test'}]}]
+        mock_vehicle_data.return_value = (to_records(vehicle_data), None)
+        dealer_data = [{'dealerId': 1,
+                        'name': 'test',
+                        'vehicles': vehicle_data[0]['vehicles']}]
+        mock_dealer_data.return_value = (to_records(dealer_data), None)
+        json_data = {'success': True}
+        mock_json_post.return_value = json_data
+        assert run_async_merge(max_concurrency=2) == json_data
+        mock_json_post.assert_called_once_with(
+            url=('https://vautointerview.azurewebsites.net/api/{}/answer'
+                 .format(data_set_id)),
+            post_data={'dealers': dealer_data},
+            session=None)
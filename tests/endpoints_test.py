@@ -0,0 +1,75 @@
+import mock
+import pytest
+from cox_auto_app.endpoints import (ApiEndpoints,
+                                    DEFAULT_BASE_URL,
+                                    BASE_URL_ENV_VAR,
+                                    endpoint_name,
+                                    get_endpoints,
+                                    set_endpoints)
+
+
+class TestApiEndpoints(object):
+    """
+    Tests for ApiEndpoints class.
+    """
+    def test_default_urls(self):
+        with mock.patch.dict('os.environ', clear=True):
+            endpoints = ApiEndpoints()
+        assert endpoints.base_url == DEFAULT_BASE_URL
+        base = 'https://vautointerview.azurewebsites.net/api'
+        assert endpoints.dataset_id() == base + '/datasetid'
+        assert endpoints.vehicles('7') == base + '/7/vehicles'
+        assert endpoints.vehicle('7', 8) == base + '/7/vehicles/8'
+        assert endpoints.dealer('7', 8) == base + '/7/dealers/8'
+        assert endpoints.answer('7') == base + '/7/answer'
+
+    def test_base_url_argument(self):
+        endpoints = ApiEndpoints(base_url='http://localhost:8080/')
+        assert endpoints.dataset_id() == ('http://localhost:8080/api/'
+                                          'datasetid')
+
+    def test_base_url_env_var(self):
+        with mock.patch.dict('os.environ',
+                             {BASE_URL_ENV_VAR: 'http://mirror'}):
+            endpoints = ApiEndpoints()
+        assert endpoints.vehicles('7') == 'http://mirror/api/7/vehicles'
+
+    def test_bad_base_url(self):
+        with pytest.raises(ValueError):
+            ApiEndpoints(base_url='mirror:8080')
+
+
+class TestEndpointName(object):
+    """
+    Tests for endpoint_name function.
+    """
+    def test_names(self):
+        endpoints = ApiEndpoints(base_url='http://localhost:8080/mirror')
+        assert endpoint_name(endpoints.dataset_id()) == 'dataset_id'
+        assert endpoint_name(endpoints.vehicles('7')) == 'vehicles'
+        assert endpoint_name(endpoints.vehicle('7', 1)) == 'vehicle'
+        assert endpoint_name(endpoints.dealer('7', 1)) == 'dealer'
+        assert (endpoint_name(endpoints.vehicle_batch('7', [1, 2])) ==
+                'vehicle_batch')
+        assert (endpoint_name(endpoints.dealer_batch('7', [1, 2])) ==
+                'dealer_batch')
+        assert endpoint_name(endpoints.answer('7')) == 'answer'
+
+    def test_other(self):
+        assert endpoint_name('http://localhost/health') == 'other'
+
+
+class TestGetEndpoints(object):
+    """
+    Tests for get_endpoints and set_endpoints functions.
+    """
+    def test_set_and_reset(self):
+        endpoints = ApiEndpoints(base_url='http://localhost')
+        set_endpoints(endpoints)
+        try:
+            assert get_endpoints() is endpoints
+        finally:
+            set_endpoints(None)
+        with mock.patch.dict('os.environ', clear=True):
+            assert get_endpoints().base_url == DEFAULT_BASE_URL
+        set_endpoints(None)
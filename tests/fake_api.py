@@ -0,0 +1,360 @@
+"""
+Local stand-in for the vautointerview API used by tests and
+benchmarks.
+
+Serves the datasetid, vehicles, vehicle detail, dealer detail and
+answer endpoints for generated datasets, plus the vehicles?ids= and
+dealers?ids= bulk endpoints used by BatchFetchStrategy, with
+configurable dataset size, injected latency and injected error rate.
+Point the service at it by setting COX_AUTO_API_BASE_URL to the
+server url.
+
+Kept with the tests, outside the cox_auto_app package. Run
+standalone from the repository root with:
+
+    python3 tests/fake_api.py --port 8080 --vehicles 1000
+"""
+import argparse
+import gzip
+import json
+import random
+import re
+import time
+import uuid
+from http.server import (BaseHTTPRequestHandler,
+                         HTTPServer)
+from socketserver import (ThreadingMixIn)
+from urllib.parse import (parse_qs,
+                          urlsplit)
+from threading import (Lock,
+                       Thread)
+
+
+_VEHICLES_PATH = re.compile(r'^/api/([^/]+)/vehicles$')
+_VEHICLE_PATH = re.compile(r'^/api/([^/]+)/vehicles/(-?\d+)$')
+_DEALER_PATH = re.compile(r'^/api/([^/]+)/dealers/(-?\d+)$')
+_DEALERS_PATH = re.compile(r'^/api/([^/]+)/dealers$')
+_ANSWER_PATH = re.compile(r'^/api/([^/]+)/answer$')
+
+_MAKES = ['Ford', 'Honda', 'Toyota', 'Kia', 'Tesla', 'Bentley']
+_MODELS = ['F150', 'Civic', 'Camry', 'Soul', 'Model 3', 'Mulsanne']
+
+
+class FakeDataset(object):
+    """
+    A generated dataset of vehicle_count vehicles spread across
+    dealer_count dealers.
+    """
+    def __init__(self, data_set_id, vehicle_count, dealer_count, seed):
+        rand = random.Random('{}-{}'.format(seed, data_set_id))
+        self.data_set_id = data_set_id
+        self.created = time.monotonic()
+        dealer_ids = rand.sample(range(1, dealer_count * 10 + 1),
+                                 dealer_count)
+        self.dealers = {dealer_id: {'dealerId': dealer_id,
+                                    'name': 'Dealer {}'.format(dealer_id)}
+                        for dealer_id in dealer_ids}
+        vehicle_ids = rand.sample(range(1, vehicle_count * 10 + 1),
+                                  vehicle_count)
+        self.vehicles = {}
+        for i, vehicle_id in enumerate(vehicle_ids):
+            # Every dealer gets at least one vehicle when possible.
+            if i < dealer_count:
+                dealer_id = dealer_ids[i]
+            else:
+                dealer_id = rand.choice(dealer_ids)
+            self.vehicles[vehicle_id] = {'vehicleId': vehicle_id,
+                                         'year': rand.randint(1990, 2020),
+                                         'make': rand.choice(_MAKES),
+                                         'model': rand.choice(_MODELS),
+                                         'dealerId': dealer_id}
+
+    def get_expected_answer(self):
+        """
+        Returns the correct answer as a dict of dealerId to a tuple
+        of the dealer name and the sorted vehicle tuples.
+        """
+        answer = {dealer_id: (dealer['name'], [])
+                  for dealer_id, dealer in self.dealers.items()}
+        for vehicle in self.vehicles.values():
+            answer[vehicle['dealerId']][1].append(
+                (vehicle['vehicleId'], vehicle['year'],
+                 vehicle['make'], vehicle['model']))
+        return {dealer_id: (name, sorted(vehicles))
+                for dealer_id, (name, vehicles) in answer.items()
+                if vehicles}
+
+    def check_answer(self, answer):
+        """
+        Returns True if answer, the posted answer body, has every
+        dealer with the correct name and vehicles.
+        """
+        try:
+            posted = {dealer['dealerId']:
+                      (dealer.get('name'),
+                       sorted((vehicle['vehicleId'], vehicle['year'],
+                               vehicle['make'], vehicle['model'])
+                              for vehicle in dealer['vehicles']))
+                      for dealer in answer['dealers']}
+        except (KeyError, TypeError):
+            return False
+        return posted == self.get_expected_answer()
+
+
+class FakeApiServer(ThreadingMixIn, HTTPServer):
+    """
+    Threaded HTTP server implementing the vautointerview API.
+
+    Each datasetid request creates a new FakeDataset with
+    vehicle_count vehicles and dealer_count dealers. Every request
+    sleeps for latency seconds plus up to latency_jitter more, and
+    fails with HTTP 503 with probability error_rate. Dataset id and
+    answer requests never fail so a run can always start and
+    finish.
+    """
+    daemon_threads = True
+    # Default listen backlog is too small for benchmark fan-outs.
+    request_queue_size = 1024
+
+    def __init__(self, host='127.0.0.1', port=0, vehicle_count=100,
+                 dealer_count=10, latency=0.0, latency_jitter=0.0,
+                 error_rate=0.0, seed=0):
+        if not 1 <= dealer_count <= vehicle_count:
+            raise ValueError('dealer_count {} must be between 1 and '
+                             'vehicle_count {}.'
+                             .format(dealer_count, vehicle_count))
+        HTTPServer.__init__(self, (host, port), FakeApiHandler)
+        self.vehicle_count = vehicle_count
+        self.dealer_count = dealer_count
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.seed = seed
+        self.datasets = {}
+        self.request_count = 0
+        self._lock = Lock()
+        self._random = random.Random(seed)
+
+    @property
+    def base_url(self):
+        """
+        The http url of the server root.
+        """
+        host, port = self.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def create_dataset(self):
+        """
+        Creates, stores and returns a new FakeDataset.
+        """
+        data_set_id = uuid.uuid4().hex[:10]
+        dataset = FakeDataset(data_set_id=data_set_id,
+                              vehicle_count=self.vehicle_count,
+                              dealer_count=self.dealer_count,
+                              seed=self.seed)
+        with self._lock:
+            self.datasets[data_set_id] = dataset
+        return dataset
+
+    def should_fail(self):
+        """
+        Counts a request and returns True if an error should be
+        injected for it.
+        """
+        with self._lock:
+            self.request_count += 1
+            return self._random.random() < self.error_rate
+
+    def get_delay(self):
+        """
+        Returns the seconds to delay a response.
+        """
+        with self._lock:
+            jitter = self._random.random() * self.latency_jitter
+        return self.latency + jitter
+
+    def start(self):
+        """
+        Serves requests on a daemon thread.
+
+        Returns the thread.
+        """
+        thread = Thread(target=self.serve_forever,
+                        kwargs={'poll_interval': 0.05},
+                        daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """
+        Stops serving and closes the socket.
+        """
+        self.shutdown()
+        self.server_close()
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    """
+    Request handler for FakeApiServer.
+    """
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this small
+    # responses stall on delayed acks.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_not_found(self):
+        self.send_json(404, {'message': 'Not found: {}'.format(self.path)})
+
+    def get_dataset(self, data_set_id):
+        return self.server.datasets.get(data_set_id)
+
+    def send_records(self, records, ids):
+        """
+        Sends the records for the comma separated ids, skipping
+        unknown ids.
+        """
+        try:
+            id_list = [int(item_id) for item_id in ids.split(',')]
+        except ValueError:
+            self.send_json(400, {'message': 'Bad ids: {}'.format(ids)})
+            return
+        self.send_json(200, [records[item_id]
+                             for item_id in id_list
+                             if item_id in records])
+
+    def do_GET(self):
+        delay = self.server.get_delay()
+        if delay:
+            time.sleep(delay)
+        if self.path == '/api/datasetid':
+            dataset = self.server.create_dataset()
+            self.send_json(200, {'datasetId': dataset.data_set_id})
+            return
+        if self.server.should_fail():
+            self.send_json(503, {'message': 'Injected error.'})
+            return
+        split = urlsplit(self.path)
+        ids = parse_qs(split.query).get('ids', [None])[0]
+        match = _VEHICLES_PATH.match(split.path)
+        if match:
+            dataset = self.get_dataset(match.group(1))
+            if dataset is None:
+                self.send_not_found()
+            elif ids is not None:
+                self.send_records(dataset.vehicles, ids)
+            else:
+                self.send_json(200, {'vehicleIds': list(dataset.vehicles)})
+            return
+        match = _DEALERS_PATH.match(split.path)
+        if match and ids is not None:
+            dataset = self.get_dataset(match.group(1))
+            if dataset is None:
+                self.send_not_found()
+            else:
+                self.send_records(dataset.dealers, ids)
+            return
+        match = _VEHICLE_PATH.match(self.path)
+        if match:
+            dataset = self.get_dataset(match.group(1))
+            vehicle = (dataset.vehicles.get(int(match.group(2)))
+                       if dataset else None)
+            if vehicle is None:
+                self.send_not_found()
+                return
+            self.send_json(200, vehicle)
+            return
+        match = _DEALER_PATH.match(self.path)
+        if match:
+            dataset = self.get_dataset(match.group(1))
+            dealer = (dataset.dealers.get(int(match.group(2)))
+                      if dataset else None)
+            if dealer is None:
+                self.send_not_found()
+                return
+            self.send_json(200, dealer)
+            return
+        self.send_not_found()
+
+    def read_body(self):
+        """
+        Reads a request body sent with a Content-Length or with
+        chunked transfer encoding.
+        """
+        if self.headers.get('Transfer-Encoding') != 'chunked':
+            length = int(self.headers.get('Content-Length', 0))
+            return self.rfile.read(length)
+        chunks = []
+        while True:
+            size = int(self.rfile.readline().split(b';')[0], 16)
+            if not size:
+                # Skip any trailers up to the blank line ending the body.
+                while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def do_POST(self):
+        match = _ANSWER_PATH.match(self.path)
+        dataset = self.get_dataset(match.group(1)) if match else None
+        body = self.read_body()
+        if dataset is None:
+            self.send_not_found()
+            return
+        try:
+            if self.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            answer = json.loads(body.decode('utf-8'))
+        except (OSError, ValueError):
+            self.send_json(400, {'message': 'Body is not json.'})
+            return
+        success = dataset.check_answer(answer)
+        milliseconds = int((time.monotonic() - dataset.created) * 1000)
+        self.send_json(200, {'success': success,
+                             'message': ('Congratulations.' if success
+                                         else 'Answer is incorrect.'),
+                             'totalMilliseconds': milliseconds})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve a local stand-in for the vautointerview API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--vehicles', type=int, default=100)
+    parser.add_argument('--dealers', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--latency-jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    server = FakeApiServer(host=args.host,
+                           port=args.port,
+                           vehicle_count=args.vehicles,
+                           dealer_count=args.dealers,
+                           latency=args.latency,
+                           latency_jitter=args.latency_jitter,
+                           error_rate=args.error_rate,
+                           seed=args.seed)
+    print('Serving fake API at {}'.format(server.base_url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+import time
+import mock
+import pytest
+import requests
+from cox_auto_app.data_collection import (BatchFetchStrategy,
+                                          DEADLINE_ERROR_MESSAGE)
+from cox_auto_app.data_operations import (log_unfinished,
+                                          merge,
+                                          merge_many)
+from cox_auto_app.metrics import (Metrics,
+                                  set_metrics)
+from cox_auto_app.request_tools import (RetryPolicy)
+
+
+class TestFakeApiServer(object):
+    """
+    Tests for FakeApiServer endpoints.
+    """
+    def test_endpoints(self, fake_api):
+        server = fake_api(vehicle_count=5, dealer_count=2)
+        base = server.base_url + '/api'
+        data_set_id = requests.get(base + '/datasetid').json()['datasetId']
+        vehicle_ids = requests.get(
+            '{}/{}/vehicles'.format(base, data_set_id)).json()['vehicleIds']
+        assert len(vehicle_ids) == 5
+        vehicle = requests.get('{}/{}/vehicles/{}'.format(
+            base, data_set_id, vehicle_ids[0])).json()
+        assert vehicle['vehicleId'] == vehicle_ids[0]
+        dealer = requests.get('{}/{}/dealers/{}'.format(
+            base, data_set_id, vehicle['dealerId'])).json()
+        assert dealer['dealerId'] == vehicle['dealerId']
+        resp = requests.get('{}/{}/dealers/0'.format(base, data_set_id))
+        assert resp.status_code == 404
+
+    def test_wrong_answer(self, fake_api):
+        server = fake_api(vehicle_count=5, dealer_count=2)
+        base = server.base_url + '/api'
+        data_set_id = requests.get(base + '/datasetid').json()['datasetId']
+        result = requests.post('{}/{}/answer'.format(base, data_set_id),
+                               json={'dealers': []}).json()
+        assert result['success'] is False
+
+
+class TestMergeAgainstFakeApi(object):
+    """
+    Tests running merge end to end against FakeApiServer.
+    """
+    @pytest.mark.parametrize('stream_dealers', [True, False])
+    def test_merge(self, fake_api, stream_dealers):
+        fake_api(vehicle_count=50, dealer_count=7)
+        result = merge(max_workers=4, stream_dealers=stream_dealers)
+        assert result['success'] is True
+
+    @pytest.mark.parametrize('stream_dealers', [True, False])
+    def test_merge_streamed_ids(self, fake_api, stream_dealers):
+        fake_api(vehicle_count=50, dealer_count=7)
+        result = merge(max_workers=4, stream_dealers=stream_dealers,
+                       stream_ids=True)
+        assert result['success'] is True
+
+    @pytest.mark.parametrize('stream_dealers', [True, False])
+    def test_merge_no_vehicle_before_deadline(self, fake_api,
+                                              stream_dealers):
+        server = fake_api(vehicle_count=5, dealer_count=2, latency=0.3)
+        data_set_id = server.create_dataset().data_set_id
+        # The vehicle ids arrive after 0.3 seconds and no vehicle
+        # before the deadline, so an empty answer is posted.
+        result = merge(max_workers=4, stream_dealers=stream_dealers,
+                       data_set_id=data_set_id, deadline=0.5)
+        assert result['success'] is False
+
+    @pytest.mark.parametrize('stream_dealers', [True, False])
+    def test_merge_logs_every_unfinished_id(self, fake_api,
+                                            stream_dealers):
+        server = fake_api(vehicle_count=600, dealer_count=20,
+                          latency=0.01)
+        data_set_id = server.create_dataset().data_set_id
+        with mock.patch('cox_auto_app.data_operations.log_unfinished',
+                        wraps=log_unfinished) as mock_log:
+            merge(max_workers=16, stream_dealers=stream_dealers,
+                  data_set_id=data_set_id, deadline=0.2)
+        vehicle_errors = mock_log.call_args[1]['vehicle_error_list']
+        assert vehicle_errors
+        assert all(error['error_message'] == DEADLINE_ERROR_MESSAGE
+                   for error in vehicle_errors)
+
+    @pytest.mark.parametrize('stream_dealers', [True, False])
+    def test_merge_returns_at_deadline(self, fake_api, stream_dealers):
+        server = fake_api(vehicle_count=2000, dealer_count=50,
+                          latency=0.05)
+        data_set_id = server.create_dataset().data_set_id
+        start = time.monotonic()
+        merge(max_workers=4, stream_dealers=stream_dealers,
+              data_set_id=data_set_id, deadline=0.3)
+        # Queued requests are dropped rather than run after the
+        # deadline, which would take about 25 seconds.
+        assert time.monotonic() - start < 1.5
+
+    def test_merge_sharded(self, fake_api):
+        fake_api(vehicle_count=50, dealer_count=7)
+        metrics = Metrics()
+        set_metrics(metrics)
+        try:
+            result = merge(max_workers=4, shards=2)
+        finally:
+            set_metrics(None)
+        assert result['success'] is True
+        vehicle_requests = [metric['value']
+                            for metric in metrics.snapshot()
+                            if metric['name'] == 'http_requests_total' and
+                            metric['labels']['endpoint'] == 'vehicle']
+        assert vehicle_requests == [50]
+
+    @pytest.mark.parametrize('stream_dealers', [True, False])
+    def test_merge_resumes_from_checkpoint(self, fake_api, tmpdir,
+                                           stream_dealers):
+        server = fake_api(vehicle_count=50, dealer_count=7)
+        data_set_id = server.create_dataset().data_set_id
+        checkpoint_dir = str(tmpdir)
+        # A deadline that passes straight away leaves the first run
+        # with only part of the dataset.
+        merge(max_workers=4, stream_dealers=stream_dealers,
+              data_set_id=data_set_id, checkpoint_dir=checkpoint_dir,
+              deadline=0.05)
+        result = merge(max_workers=4, stream_dealers=stream_dealers,
+                       data_set_id=data_set_id,
+                       checkpoint_dir=checkpoint_dir)
+        assert result['success'] is True
+        before = server.request_count
+        result = merge(max_workers=4, stream_dealers=stream_dealers,
+                       data_set_id=data_set_id,
+                       checkpoint_dir=checkpoint_dir)
+        assert result['success'] is True
+        # Only the vehicle ids request is counted; the answer post
+        # is not.
+        assert server.request_count - before == 1
+
+    def test_merge_from_snapshot(self, fake_api, tmpdir):
+        server = fake_api(vehicle_count=50, dealer_count=7)
+        previous = server.create_dataset()
+        checkpoint_dir = str(tmpdir)
+        merge(max_workers=4, data_set_id=previous.data_set_id,
+              checkpoint_dir=checkpoint_dir)
+        # The next version drops one vehicle and adds three, one of
+        # them at a new dealer.
+        dataset = server.create_dataset()
+        dataset.vehicles = dict(previous.vehicles)
+        dataset.dealers = dict(previous.dealers)
+        dropped_id = next(iter(dataset.vehicles))
+        dealer_id = dataset.vehicles.pop(dropped_id)['dealerId']
+        dataset.dealers[1000] = {'dealerId': 1000, 'name': 'Dealer 1000'}
+        for vehicle_id, vehicle_dealer_id in ((1001, dealer_id),
+                                              (1002, dealer_id),
+                                              (1003, 1000)):
+            dataset.vehicles[vehicle_id] = {'vehicleId': vehicle_id,
+                                            'year': 2020, 'make': 'Kia',
+                                            'model': 'Soul',
+                                            'dealerId': vehicle_dealer_id}
+        before = server.request_count
+        result = merge(max_workers=4, data_set_id=dataset.data_set_id,
+                       snapshot_path=str(tmpdir.join(
+                           '{}.jsonl'.format(previous.data_set_id))))
+        assert result['success'] is True
+        # The vehicle ids, three new vehicles and one new dealer.
+        assert server.request_count - before == 5
+
+    def test_merge_many(self, fake_api):
+        server = fake_api(vehicle_count=50, dealer_count=7)
+        summaries = merge_many(count=3, max_workers=4, max_datasets=2)
+        assert [summary['success'] for summary in summaries] == [True] * 3
+        assert (len(set(summary['dataSetId'] for summary in summaries)) ==
+                3)
+        assert len(server.datasets) == 3
+
+    def test_merge_many_error(self, fake_api):
+        fake_api(vehicle_count=50, dealer_count=7)
+        with mock.patch('cox_auto_app.data_operations.merge',
+                        side_effect=[{'success': True,
+                                      'message': 'Congratulations.',
+                                      'totalMilliseconds': 5},
+                                     RuntimeError('Boom')]):
+            summaries = merge_many(count=2, max_datasets=1)
+        assert [summary['success'] for summary in summaries] == [True,
+                                                                 False]
+        assert summaries[1]['message'] == 'Boom'
+        assert 'totalMilliseconds' not in summaries[1]
+
+    def test_merge_metrics(self, fake_api):
+        metrics = Metrics()
+        set_metrics(metrics)
+        try:
+            fake_api(vehicle_count=50, dealer_count=7)
+            result = merge(max_workers=4, stream_dealers=False)
+        finally:
+            set_metrics(None)
+        assert result['success'] is True
+        by_key = {(metric['name'],
+                   tuple(sorted(metric['labels'].items()))): metric
+                  for metric in metrics.snapshot()}
+        phases = [labels[0][1] for name, labels in by_key
+                  if name == 'merge_phase_seconds']
+        assert sorted(phases) == ['dataset_id', 'dealer_detail', 'post',
+                                  'vehicle_detail', 'vehicle_ids']
+        vehicle = (('endpoint', 'vehicle'), ('method', 'GET'),
+                   ('outcome', '200'))
+        assert by_key[('http_requests_total', vehicle)]['value'] == 50
+        assert by_key[('http_requests_in_flight',
+                       (('endpoint', 'vehicle'),))]['value'] == 0
+        assert by_key[('http_response_bytes_total',
+                       (('endpoint', 'vehicle'),))]['value'] > 0
+        assert by_key[('http_request_bytes_total',
+                       (('endpoint', 'answer'),))]['value'] > 0
+
+    @pytest.mark.parametrize('compress_answer', [True, False])
+    def test_merge_streamed_answer(self, fake_api, compress_answer):
+        fake_api(vehicle_count=50, dealer_count=7)
+        result = merge(max_workers=4, stream_answer=True,
+                       compress_answer=compress_answer)
+        assert result['success'] is True
+
+    @pytest.mark.parametrize('stream_dealers', [True, False])
+    def test_merge_batched(self, fake_api, stream_dealers):
+        server = fake_api(vehicle_count=50, dealer_count=7)
+        result = merge(max_workers=4, stream_dealers=stream_dealers,
+                       fetch_strategy=BatchFetchStrategy(batch_size=20))
+        assert result['success'] is True
+        # vehicles, 3 vehicle batches and at most 7 dealer batches.
+        assert server.request_count <= 11
+
+    @mock.patch('cox_auto_app.request_tools.get_retry_policy')
+    def test_merge_with_errors(self, mock_policy, fake_api):
+        mock_policy.return_value = RetryPolicy(attempts=10, backoff=0.001)
+        server = fake_api(vehicle_count=50, dealer_count=7,
+                          error_rate=0.2)
+        result = merge(max_workers=4)
+        assert result['success'] is True
+        assert server.request_count > 57
@@ -0,0 +1,60 @@
+import json
+import mock
+import pytest
+from cox_auto_app import json_codec
+from cox_auto_app.json_codec import (create_codec,
+                                     get_codec,
+                                     set_codec,
+                                     StdlibJsonCodec)
+
+
+CODEC_NAMES = [name for name, module in (('json', json),
+                                         ('orjson', json_codec.orjson),
+                                         ('ujson', json_codec.ujson))
+               if module is not None]
+
+
+class TestCodecs(object):
+    """
+    Tests for the json codec classes.
+    """
+    @pytest.mark.parametrize('name', CODEC_NAMES)
+    def test_round_trip(self, name):
+        codec = create_codec(name)
+        data = {'dealers': [{'dealerId': 1, 'name': 'ü',
+                             'vehicles': [{'vehicleId': 2, 'year': 2000}]}]}
+        body = codec.dumps(data)
+        assert type(body) is bytes
+        assert json.loads(body) == data
+        assert codec.loads(body) == data
+        assert codec.loads(body.decode('utf-8')) == data
+
+    @pytest.mark.parametrize('name', CODEC_NAMES)
+    def test_bad_json(self, name):
+        with pytest.raises(ValueError):
+            create_codec(name).loads(b'{"a": ')
+
+
+class TestCreateCodec(object):
+    """
+    Tests for create_codec function.
+    """
+    def test_unknown_name(self):
+        with pytest.raises(ValueError, match='Unknown json codec simd'):
+            create_codec('simd')
+
+    @mock.patch('cox_auto_app.json_codec.ujson', None)
+    @mock.patch('cox_auto_app.json_codec.orjson', None)
+    def test_falls_back_to_stdlib(self):
+        assert type(create_codec()) is StdlibJsonCodec
+        with pytest.raises(ImportError):
+            create_codec('orjson')
+
+    def test_set_and_get(self):
+        codec = StdlibJsonCodec()
+        set_codec(codec)
+        try:
+            assert get_codec() is codec
+        finally:
+            set_codec(None)
+        assert get_codec() is not codec
@@ -0,0 +1,68 @@
+import json
+import pytest
+from cox_auto_app.json_stream import (iter_json_array,
+                                      NotAnArrayError,
+                                      NotAnObjectError)
+
+
+def split(text, size):
+    data = text.encode('utf-8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestIterJsonArray(object):
+    """
+    Tests for iter_json_array function.
+    """
+    body = json.dumps({'before': {'a': [1, 'é']},
+                       'vehicleIds': [12345, 6, 789012],
+                       'after': 'x'})
+
+    @pytest.mark.parametrize('size', [1, 2, 3, 7, 1000])
+    def test_chunk_boundaries(self, size):
+        assert (list(iter_json_array(chunks=split(self.body, size),
+                                     key='vehicleIds')) ==
+                [12345, 6, 789012])
+
+    numbers_body = json.dumps({'total': 1.5,
+                               'vehicleIds': [1.5, 2, -0.25, 1e+21, 3E-7,
+                                              -12, 0],
+                               'after': 2.5e-3})
+
+    @pytest.mark.parametrize('size', range(1, len(numbers_body) + 1))
+    def test_numbers_at_chunk_boundaries(self, size):
+        assert (list(iter_json_array(chunks=split(self.numbers_body, size),
+                                     key='vehicleIds')) ==
+                [1.5, 2, -0.25, 1e+21, 3E-7, -12, 0])
+
+    def test_lazy(self):
+        items = iter_json_array(chunks=iter(split(self.body, 1)),
+                                key='vehicleIds')
+        assert next(items) == 12345
+
+    def test_empty_array(self):
+        assert list(iter_json_array(chunks=[b'{"ids": [ ]}'],
+                                    key='ids')) == []
+
+    def test_missing_key(self):
+        with pytest.raises(KeyError):
+            list(iter_json_array(chunks=[b'{"other": []}'], key='ids'))
+
+    def test_not_object(self):
+        with pytest.raises(NotAnObjectError):
+            list(iter_json_array(chunks=[b'[1, 2]'], key='ids'))
+
+    def test_not_array(self):
+        with pytest.raises(NotAnArrayError):
+            list(iter_json_array(chunks=[b'{"ids": 1}'], key='ids'))
+
+    def test_truncated(self):
+        items = iter_json_array(chunks=[b'{"ids": [1, 2, 3'], key='ids')
+        assert next(items) == 1
+        assert next(items) == 2
+        with pytest.raises(json.JSONDecodeError):
+            list(items)
+
+    def test_extra_data(self):
+        with pytest.raises(json.JSONDecodeError):
+            list(iter_json_array(chunks=[b'{"ids": []} x'], key='ids'))
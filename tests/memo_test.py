@@ -0,0 +1,39 @@
+import pytest
+from cox_auto_app.memo import (LRUMemo)
+
+
+class TestLRUMemo(object):
+    """
+    Tests for LRUMemo class.
+    """
+    def test_bad_max_size(self):
+        with pytest.raises(ValueError):
+            LRUMemo(max_size=0)
+
+    def test_counters(self):
+        memo = LRUMemo()
+        assert memo.get(1) is None
+        memo.put(1, {'dealerId': 1, 'name': 'test'})
+        assert memo.get(1) == {'dealerId': 1, 'name': 'test'}
+        assert memo.hits == 1
+        assert memo.misses == 1
+
+    def test_evicts_least_recently_used(self):
+        memo = LRUMemo(max_size=2)
+        memo.put(1, 'a')
+        memo.put(2, 'b')
+        assert memo.get(1) == 'a'
+        memo.put(3, 'c')
+        assert len(memo) == 2
+        assert memo.get(2) is None
+        assert memo.get(1) == 'a'
+        assert memo.get(3) == 'c'
+
+    def test_clear(self):
+        memo = LRUMemo()
+        memo.put(1, 'a')
+        memo.get(1)
+        memo.clear()
+        assert len(memo) == 0
+        assert memo.hits == 0
+        assert memo.misses == 0
@@ -0,0 +1,131 @@
+import mock
+import pytest
+from cox_auto_app.metrics import (Histogram,
+                                  Metrics,
+                                  get_metrics,
+                                  set_metrics,
+                                  track_request)
+from cox_auto_app.request_tools import (HTTPStatusError)
+
+
+class TestHistogram(object):
+    """
+    Tests for Histogram class.
+    """
+    def test_cumulative_counts(self):
+        histogram = Histogram(buckets=(1, 5))
+        for value in (0.5, 1, 2, 10):
+            histogram.observe(value)
+        assert histogram.cumulative_counts() == [(1, 2), (5, 3),
+                                                 (float('inf'), 4)]
+        assert histogram.sum == 13.5
+        assert histogram.count == 4
+
+
+class TestMetrics(object):
+    """
+    Tests for Metrics class.
+    """
+    def test_counters_and_gauges(self):
+        metrics = Metrics()
+        metrics.inc('requests_total', endpoint='vehicle')
+        metrics.inc('requests_total', 2, endpoint='vehicle')
+        metrics.add_gauge('in_flight', 1)
+        metrics.add_gauge('in_flight', -1)
+        assert metrics.snapshot() == [
+            {'type': 'gauge', 'name': 'in_flight', 'labels': {},
+             'value': 0},
+            {'type': 'counter', 'name': 'requests_total',
+             'labels': {'endpoint': 'vehicle'}, 'value': 3}]
+
+    def test_prometheus_text(self):
+        metrics = Metrics(latency_buckets=(0.1, 1.0))
+        metrics.inc('http_requests_total', endpoint='vehicle',
+                    outcome='200')
+        metrics.observe('http_request_seconds', 0.5, endpoint='vehicle')
+        assert metrics.to_prometheus() == (
+            '# TYPE http_request_seconds histogram\n'
+            'http_request_seconds_bucket{endpoint="vehicle",le="0.1"} 0\n'
+            'http_request_seconds_bucket{endpoint="vehicle",le="1.0"} 1\n'
+            'http_request_seconds_bucket{endpoint="vehicle",le="+Inf"} 1\n'
+            'http_request_seconds_sum{endpoint="vehicle"} 0.5\n'
+            'http_request_seconds_count{endpoint="vehicle"} 1\n'
+            '# TYPE http_requests_total counter\n'
+            'http_requests_total{endpoint="vehicle",outcome="200"} 1\n')
+
+    @mock.patch('cox_auto_app.metrics.logging')
+    def test_phase(self, mock_logging):
+        metrics = Metrics()
+        with metrics.phase('post'):
+            pass
+        histogram = metrics.snapshot()[0]
+        assert histogram['name'] == 'merge_phase_seconds'
+        assert histogram['labels'] == {'phase': 'post'}
+        assert histogram['count'] == 1
+        assert '"phase": "post"' in mock_logging.info.call_args[0][0]
+
+    @mock.patch('cox_auto_app.metrics.logging')
+    def test_log_summary(self, mock_logging):
+        metrics = Metrics()
+        metrics.observe('http_request_seconds', 0.5)
+        metrics.observe('http_request_seconds', 1.5)
+        metrics.log_summary()
+        mock_logging.info.assert_called_once_with(
+            '{"count": 2, "event": "metric", "labels": {}, "mean": 1.0, '
+            '"name": "http_request_seconds", "sum": 2.0, '
+            '"type": "histogram"}')
+
+
+    def test_add_snapshot(self):
+        worker = Metrics(latency_buckets=(0.1, 1.0))
+        worker.inc('http_requests_total', 2, endpoint='vehicle')
+        worker.observe('http_request_seconds', 0.5)
+        worker.observe('http_request_seconds', 5.0)
+        metrics = Metrics(latency_buckets=(0.1, 1.0))
+        metrics.inc('http_requests_total', endpoint='vehicle')
+        metrics.observe('http_request_seconds', 0.05)
+        metrics.add_snapshot(worker.snapshot())
+        histogram, counter = metrics.snapshot()
+        assert counter['value'] == 3
+        assert histogram['buckets'] == [(0.1, 1), (1.0, 2),
+                                        (float('inf'), 3)]
+        assert histogram['sum'] == 5.55
+        assert histogram['count'] == 3
+
+
+class TestTrackRequest(object):
+    """
+    Tests for track_request function.
+    """
+    url = 'https://vautointerview.azurewebsites.net/api/7/vehicles/1'
+
+    def test_success(self):
+        metrics = Metrics()
+        set_metrics(metrics)
+        try:
+            with track_request('GET', self.url):
+                assert get_metrics().snapshot()[0]['value'] == 1
+        finally:
+            set_metrics(None)
+        metrics = {metric['name']: metric for metric in metrics.snapshot()}
+        assert metrics['http_requests_in_flight']['value'] == 0
+        assert metrics['http_requests_total']['labels'] == {
+            'endpoint': 'vehicle', 'method': 'GET', 'outcome': '200'}
+        assert metrics['http_request_seconds']['count'] == 1
+
+    def test_error_outcome(self):
+        metrics = Metrics()
+        set_metrics(metrics)
+        try:
+            with pytest.raises(ValueError):
+                with track_request('GET', self.url):
+                    raise ValueError()
+            with pytest.raises(HTTPStatusError):
+                with track_request('GET', self.url):
+                    raise HTTPStatusError('Bad status', status_code=503)
+        finally:
+            set_metrics(None)
+        outcomes = sorted(metric['labels']['outcome']
+                          for metric in metrics.snapshot()
+                          if metric['name'] == 'http_requests_total')
+        assert outcomes == ['503', 'ValueError']
@@ -0,0 +1,45 @@
+import os
+import pstats
+from concurrent.futures import (ThreadPoolExecutor)
+from cox_auto_app.profiling import (profile_scope)
+
+
+def worker_hot_path(count):
+    return sum([item * 2 for item in range(count)])
+
+
+def run_workers():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        return list(executor.map(worker_hot_path, [1000, 2000]))
+
+
+class TestProfileScope(object):
+    """
+    Tests for profile_scope function.
+    """
+    def test_reports(self, tmpdir):
+        report_dir = str(tmpdir.join('profiles'))
+        with profile_scope(report_dir=report_dir, top=5):
+            data = [bytearray(1000) for _ in range(100)]
+            run_workers()
+        assert len(data) == 100
+        names = sorted(os.listdir(report_dir))
+        assert [name.split('-')[0] for name in names] == [
+            'allocations', 'profile', 'profile']
+        stats = pstats.Stats(os.path.join(report_dir, names[1]))
+        functions = [function for _, _, function in stats.stats]
+        assert 'worker_hot_path' in functions
+        assert 'run_workers' in functions
+        with open(os.path.join(report_dir, names[2])) as text_file:
+            assert 'cumulative' in text_file.read()
+        with open(os.path.join(report_dir, names[0])) as memory_file:
+            assert 'profiling_test.py' in memory_file.read()
+
+    def test_reports_on_error(self, tmpdir):
+        report_dir = str(tmpdir)
+        try:
+            with profile_scope(report_dir=report_dir):
+                raise ValueError()
+        except ValueError:
+            pass
+        assert len(os.listdir(report_dir)) == 3
@@ -0,0 +1,66 @@
+import json
+from cox_auto_app.records import (Dealer,
+                                  Vehicle,
+                                  iter_answer_json,
+                                  serialize_dealers)
+
+
+class TestVehicle(object):
+    """
+    Tests for Vehicle class.
+    """
+    def test_from_info_drops_dealer_id(self):
+        vehicle = Vehicle.from_info({'vehicleId': 1,
+                                     'year': 2000,
+                                     'make': 'test',
+                                     'model': 'test',
+                                     'dealerId': 5})
+        assert vehicle == Vehicle(vehicle_id=1, year=2000, make='test',
+                                  model='test')
+        assert vehicle.to_dict() == {'vehicleId': 1,
+                                     'year': 2000,
+                                     'make': 'test',
+                                     'model': 'test'}
+
+    def test_no_instance_dict(self):
+        vehicle = Vehicle(vehicle_id=1, year=2000, make='test',
+                          model='test')
+        assert not hasattr(vehicle, '__dict__')
+
+
+class TestSerializeDealers(object):
+    """
+    Tests for serialize_dealers function.
+    """
+    def test_none(self):
+        assert serialize_dealers(None) is None
+
+    def test_dealers(self):
+        vehicle = Vehicle(vehicle_id=1, year=2000, make='test',
+                          model='test')
+        dealer_list = [Dealer(dealer_id=5, name='test', vehicles=[vehicle]),
+                       Dealer(dealer_id=6)]
+        assert serialize_dealers(dealer_list) == [
+            {'dealerId': 5,
+             'name': 'test',
+             'vehicles': [vehicle.to_dict()]},
+            {'dealerId': 6,
+             'vehicles': []}]
+
+
+class TestIterAnswerJson(object):
+    """
+    Tests for iter_answer_json function.
+    """
+    def test_matches_serialize_dealers(self):
+        dealer_list = [Dealer(dealer_id=1, name='test',
+                              vehicles=[Vehicle(vehicle_id=1, year=2000,
+                                                make='test',
+                                                model='test')]),
+                       Dealer(dealer_id=2, name='ü')]
+        body = b''.join(iter_answer_json(dealer_list))
+        assert json.loads(body) == {
+            'dealers': serialize_dealers(dealer_list)}
+
+    def test_empty(self):
+        assert json.loads(b''.join(iter_answer_json([]))) == {'dealers': []}
@@ -1,8 +1,74 @@
+import asyncio
+import gzip
+import json
+import time
 import mock
 import pytest
-from cox_auto_app.request_tools import (get_json_request,
+import requests
+from cox_auto_app import request_tools
+from cox_auto_app.request_tools import (create_session,
+                                        configure_session,
+                                        ensure_pool_size,
+                                        get_session,
+                                        get_json_request,
                                         post_json_request,
-                                        check_response)
+                                        check_response,
+                                        stream_json_request,
+                                        post_json_stream_request,
+                                        encode_chunks,
+                                        gzip_chunks,
+                                        HTTPStatusError,
+                                        RetryPolicy,
+                                        TokenBucket,
+                                        AdaptiveConcurrencyLimiter,
+                                        set_concurrency_limiter,
+                                        get_timeout,
+                                        DeadlineExceeded,
+                                        DEFAULT_TIMEOUT,
+                                        async_get_json_request,
+                                        async_check_response)
+
+
+class TestCreateSession(object):
+    """
+    Tests for create_session function.
+    """
+    def test_pool_settings(self):
+        session = create_session(pool_connections=2,
+                                 pool_maxsize=4)
+        adapter = session.get_adapter('https://example.com')
+        assert adapter._pool_connections == 2
+        assert adapter._pool_maxsize == 4
+        assert adapter._pool_block
+        session.close()
+
+    def test_no_keep_alive(self):
+        session = create_session(keep_alive=False)
+        assert session.headers['Connection'] == 'close'
+        session.close()
+
+
+class TestEnsurePoolSize(object):
+    """
+    Tests for ensure_pool_size function.
+    """
+    def teardown_method(self, method):
+        configure_session()
+
+    def test_grows_pool(self):
+        configure_session(keep_alive=False)
+        ensure_pool_size(100)
+        session = get_session()
+        adapter = session.get_adapter('https://example.com')
+        assert adapter._pool_maxsize == 100
+        assert session.headers['Connection'] == 'close'
+
+    def test_keeps_larger_pool(self):
+        session = configure_session(pool_maxsize=64)
+        ensure_pool_size(10)
+        ensure_pool_size(64)
+        assert get_session() is session
+        assert request_tools._session_kwargs == {'pool_maxsize': 64}
 
 
 class TestGetJson(object):
@@ -13,8 +79,9 @@ class TestGetJson(object):
     merge function.
     """
     @mock.patch('cox_auto_app.request_tools.check_response')
-    @mock.patch('requests.get')
-    def test_bad_status(self, mock_get, mock_check):
+    @mock.patch('cox_auto_app.request_tools.get_session')
+    def test_bad_status(self, mock_session, mock_check):
+        mock_get = mock_session.return_value.get
         url = 'https://vautointerview.azurewebsites.net/api/datasetid'
         return_status = 500
         mock_get.return_value.status_code = return_status
@@ -25,8 +92,9 @@ class TestGetJson(object):
             get_json_request(url=url)
 
     @mock.patch('cox_auto_app.request_tools.check_response')
-    @mock.patch('requests.get')
-    def test_bad_content(self, mock_get, mock_check):
+    @mock.patch('cox_auto_app.request_tools.get_session')
+    def test_bad_content(self, mock_session, mock_check):
+        mock_get = mock_session.return_value.get
         url = 'https://vautointerview.azurewebsites.net/api/datasetid'
         return_content = 'bad'
         mock_get.return_value.status_code = 200
@@ -39,8 +107,9 @@ class TestGetJson(object):
             get_json_request(url=url)
 
     @mock.patch('cox_auto_app.request_tools.check_response')
-    @mock.patch('requests.get')
-    def test_good_return(self, mock_get, mock_check):
+    @mock.patch('cox_auto_app.request_tools.get_session')
+    def test_good_return(self, mock_session, mock_check):
+        mock_get = mock_session.return_value.get
         url = 'https://vautointerview.azurewebsites.net/api/datasetid'
         return_content = 'application/json'
         json_data = {'test': True}
@@ -49,6 +118,16 @@ class TestGetJson(object):
         mock_get.return_value.json.return_value = json_data
         mock_check.return_value = json_data
         assert get_json_request(url=url) == json_data
+        mock_get.assert_called_once_with(url, timeout=DEFAULT_TIMEOUT)
+
+    @mock.patch('cox_auto_app.request_tools.check_response')
+    def test_provided_session(self, mock_check):
+        url = 'https://vautointerview.azurewebsites.net/api/datasetid'
+        json_data = {'test': True}
+        session = mock.MagicMock()
+        mock_check.return_value = json_data
+        assert get_json_request(url=url, session=session) == json_data
+        session.get.assert_called_once_with(url, timeout=DEFAULT_TIMEOUT)
 
 
 class TestPostJson(object):
@@ -59,8 +138,9 @@ class TestPostJson(object):
     merge function.
     """
     @mock.patch('cox_auto_app.request_tools.check_response')
-    @mock.patch('requests.post')
-    def test_bad_status(self, mock_post, mock_check):
+    @mock.patch('cox_auto_app.request_tools.get_session')
+    def test_bad_status(self, mock_session, mock_check):
+        mock_post = mock_session.return_value.post
         url = 'https://vautointerview.azurewebsites.net/api/datasetid'
         return_status = 500
         mock_post.return_value.status_code = return_status
@@ -72,8 +152,9 @@ class TestPostJson(object):
             post_json_request(url=url, post_data=post_data)
 
     @mock.patch('cox_auto_app.request_tools.check_response')
-    @mock.patch('requests.post')
-    def test_bad_content(self, mock_post, mock_check):
+    @mock.patch('cox_auto_app.request_tools.get_session')
+    def test_bad_content(self, mock_session, mock_check):
+        mock_post = mock_session.return_value.post
         url = 'https://vautointerview.azurewebsites.net/api/datasetid'
         return_content = 'bad'
         mock_post.return_value.status_code = 200
@@ -87,8 +168,9 @@ class TestPostJson(object):
             post_json_request(url=url, post_data=post_data)
 
     @mock.patch('cox_auto_app.request_tools.check_response')
-    @mock.patch('requests.post')
-    def test_good_return(self, mock_post, mock_check):
+    @mock.patch('cox_auto_app.request_tools.get_session')
+    def test_good_return(self, mock_session, mock_check):
+        mock_post = mock_session.return_value.post
         url = 'https://vautointerview.azurewebsites.net/api/datasetid'
         return_content = 'application/json'
         json_data = {'test': True}
@@ -110,8 +192,9 @@ class TestCheckResponse(object):
         mock_response.return_value.status_code = return_status
         expected_error = ('Got unexpected status code {} from url '
                           '{}'.format(return_status, url))
-        with pytest.raises(RuntimeError, match=expected_error):
+        with pytest.raises(RuntimeError, match=expected_error) as error:
             check_response(url=url, response=mock_response.return_value)
+        assert error.value.status_code == return_status
 
     def test_bad_content(self):
         url = 'https://vautointerview.azurewebsites.net/api/datasetid'
@@ -132,6 +215,308 @@ class TestCheckResponse(object):
         mock_response = mock.MagicMock()
         mock_response.return_value.status_code = 200
         mock_response.return_value.headers = {'content-type': return_content}
-        mock_response.return_value.json.return_value = json_data
+        mock_response.return_value.content = b'{"test": true}'
         assert check_response(url=url,
                               response=mock_response.return_value) == json_data
+
+
+class TestStreamJson(object):
+    """
+    Tests for stream_json_request function.
+    """
+    @mock.patch('cox_auto_app.request_tools.get_session')
+    def test_chunks_and_close(self, mock_session):
+        resp = mock_session.return_value.get.return_value
+        resp.status_code = 200
+        resp.headers = {'content-type': 'application/json'}
+        resp.iter_content.return_value = [b'{"a"', b': 1}']
+        url = 'https://vautointerview.azurewebsites.net/api/7/vehicles'
+        chunks = stream_json_request(url=url, chunk_size=4)
+        mock_session.return_value.get.assert_called_once_with(
+            url, stream=True, timeout=DEFAULT_TIMEOUT)
+        assert list(chunks) == [b'{"a"', b': 1}']
+        resp.iter_content.assert_called_once_with(chunk_size=4)
+        resp.close.assert_called_once_with()
+
+    @mock.patch('cox_auto_app.request_tools.get_session')
+    def test_retries_bad_status(self, mock_session):
+        bad = mock.Mock(status_code=503)
+        good = mock.Mock(status_code=200,
+                         headers={'content-type': 'application/json'})
+        good.iter_content.return_value = [b'{}']
+        mock_session.return_value.get.side_effect = [bad, good]
+        url = 'https://vautointerview.azurewebsites.net/api/7/vehicles'
+        chunks = stream_json_request(
+            url=url, retry_policy=RetryPolicy(backoff=0, jitter=False))
+        assert list(chunks) == [b'{}']
+        bad.close.assert_called_once_with()
+
+
+class TestPostJsonStream(object):
+    """
+    Tests for post_json_stream_request function.
+    """
+    url = 'https://vautointerview.azurewebsites.net/api/7/answer'
+
+    def mock_post(self, mock_session, bodies):
+        def post(url, data, headers, timeout):
+            bodies.append((b''.join(data), headers))
+            return mock.Mock(status_code=200,
+                             headers={'content-type': 'application/json'},
+                             content=b'{"success": true}')
+        mock_session.return_value.post.side_effect = post
+
+    @mock.patch('cox_auto_app.request_tools.get_session')
+    def test_chunked_body(self, mock_session):
+        bodies = []
+        self.mock_post(mock_session, bodies)
+        result = post_json_stream_request(
+            url=self.url, get_pieces=lambda: iter(['{"a": ', '[1]}']))
+        assert result == {'success': True}
+        assert bodies == [(b'{"a": [1]}',
+                           {'Content-Type': 'application/json'})]
+
+    @mock.patch('cox_auto_app.request_tools.get_session')
+    def test_compressed_body(self, mock_session):
+        bodies = []
+        self.mock_post(mock_session, bodies)
+        post_json_stream_request(url=self.url,
+                                 get_pieces=lambda: iter(['{}']),
+                                 compress=True)
+        body, headers = bodies[0]
+        assert gzip.decompress(body) == b'{}'
+        assert headers['Content-Encoding'] == 'gzip'
+
+    @mock.patch('cox_auto_app.request_tools.get_session')
+    def test_retry_regenerates_body(self, mock_session):
+        bodies = []
+        self.mock_post(mock_session, bodies)
+        post = mock_session.return_value.post.side_effect
+
+        def fail_then_post(url, data, headers, timeout):
+            if not bodies:
+                bodies.append(None)
+                raise requests.ConnectionError()
+            return post(url, data, headers, timeout)
+        mock_session.return_value.post.side_effect = fail_then_post
+        post_json_stream_request(
+            url=self.url, get_pieces=lambda: iter(['{}']),
+            retry_policy=RetryPolicy(backoff=0, jitter=False))
+        assert bodies[1][0] == b'{}'
+
+
+class TestEncodeChunks(object):
+    """
+    Tests for encode_chunks and gzip_chunks functions.
+    """
+    def test_joins_small_pieces(self):
+        pieces = ['ab', 'c', 'ü', 'de']
+        assert (list(encode_chunks(pieces=pieces, chunk_size=3)) ==
+                [b'abc', 'üde'.encode('utf-8')])
+
+    def test_gzip_round_trip(self):
+        data = json.dumps(list(range(10000))).encode('utf-8')
+        chunks = [data[i:i + 100] for i in range(0, len(data), 100)]
+        assert gzip.decompress(b''.join(gzip_chunks(chunks))) == data
+
+
+class TestRetryPolicy(object):
+    """
+    Tests for RetryPolicy class.
+    """
+    def test_bad_attempts(self):
+        with pytest.raises(ValueError):
+            RetryPolicy(attempts=0)
+
+    @mock.patch('cox_auto_app.request_tools.time.sleep')
+    def test_retry_then_success(self, mock_sleep):
+        request = mock.MagicMock()
+        request.side_effect = [HTTPStatusError('test', status_code=503),
+                               {'test': True}]
+        policy = RetryPolicy(attempts=3, backoff=1, jitter=False)
+        assert policy.call(request) == {'test': True}
+        assert request.call_count == 2
+        mock_sleep.assert_called_once_with(1)
+
+    @mock.patch('cox_auto_app.request_tools.time.sleep')
+    def test_attempts_exhausted(self, mock_sleep):
+        request = mock.MagicMock()
+        request.side_effect = requests.ConnectionError('test')
+        policy = RetryPolicy(attempts=3, backoff=1, jitter=False)
+        with pytest.raises(requests.ConnectionError):
+            policy.call(request)
+        assert request.call_count == 3
+        assert ([c[0][0] for c in mock_sleep.call_args_list] == [1, 2])
+
+    @mock.patch('cox_auto_app.request_tools.time.sleep')
+    def test_not_retryable(self, mock_sleep):
+        request = mock.MagicMock()
+        request.side_effect = HTTPStatusError('test', status_code=404)
+        with pytest.raises(HTTPStatusError):
+            RetryPolicy().call(request)
+        assert request.call_count == 1
+        mock_sleep.assert_not_called()
+
+    @mock.patch('cox_auto_app.request_tools.time.sleep')
+    def test_deadline(self, mock_sleep):
+        request = mock.MagicMock()
+        request.side_effect = HTTPStatusError('test', status_code=503)
+        policy = RetryPolicy(attempts=5, backoff=10, jitter=False,
+                             deadline=5)
+        with pytest.raises(HTTPStatusError):
+            policy.call(request)
+        assert request.call_count == 1
+
+    @mock.patch('cox_auto_app.request_tools.time.sleep')
+    def test_call_deadline(self, mock_sleep):
+        request = mock.MagicMock()
+        request.side_effect = HTTPStatusError('test', status_code=503)
+        policy = RetryPolicy(attempts=5, backoff=10, jitter=False)
+        with pytest.raises(HTTPStatusError):
+            policy.call(request, deadline=time.monotonic() + 5)
+        assert request.call_count == 1
+
+    def test_jitter_bounds(self):
+        policy = RetryPolicy(backoff=1, max_backoff=3)
+        for retry in range(5):
+            assert 0 <= policy.get_delay(retry) <= min(3, 2 ** retry)
+
+
+class TestGetTimeout(object):
+    """
+    Tests for get_timeout function.
+    """
+    def test_default(self):
+        assert get_timeout() == DEFAULT_TIMEOUT
+
+    def test_single_value(self):
+        assert get_timeout(timeout=2) == (2, 2)
+
+    @mock.patch('cox_auto_app.request_tools.time.monotonic')
+    def test_capped_by_deadline(self, mock_time):
+        mock_time.return_value = 10
+        assert get_timeout(timeout=(3, 30), deadline=15) == (3, 5)
+
+    @mock.patch('cox_auto_app.request_tools.time.monotonic')
+    def test_deadline_passed(self, mock_time):
+        mock_time.return_value = 10
+        with pytest.raises(DeadlineExceeded):
+            get_timeout(deadline=10)
+
+
+class TestTokenBucket(object):
+    """
+    Tests for TokenBucket class.
+    """
+    def test_bad_rate(self):
+        with pytest.raises(ValueError):
+            TokenBucket(rate=0)
+
+    @mock.patch('cox_auto_app.request_tools.time.monotonic')
+    def test_burst_then_wait(self, mock_time):
+        mock_time.return_value = 0
+        bucket = TokenBucket(rate=2, capacity=2)
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0
+        assert bucket.reserve() == 0.5
+        mock_time.return_value = 1.5
+        assert bucket.reserve() == 0
+
+
+class TestAdaptiveConcurrencyLimiter(object):
+    """
+    Tests for AdaptiveConcurrencyLimiter class.
+    """
+    def test_bad_limits(self):
+        with pytest.raises(ValueError):
+            AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=2)
+
+    def test_additive_increase(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=2,
+                                             latency_target=1)
+        for _ in range(3):
+            limiter.acquire()
+            limiter.release(latency=0.1, overloaded=False)
+        assert limiter.limit == 3
+        assert limiter.in_flight == 0
+
+    def test_multiplicative_decrease(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=8,
+                                             min_limit=2,
+                                             latency_target=60)
+        limiter.acquire()
+        limiter.release(latency=0.1, overloaded=True)
+        assert limiter.limit == 4
+        # A second failure in the same window is not counted again.
+        limiter.acquire()
+        limiter.release(latency=0.1, overloaded=True)
+        assert limiter.limit == 4
+
+    @mock.patch('cox_auto_app.request_tools.check_response')
+    def test_get_json_reports_overload(self, mock_check):
+        url = 'https://vautointerview.azurewebsites.net/api/datasetid'
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=4)
+        mock_check.side_effect = HTTPStatusError('test', status_code=429)
+        set_concurrency_limiter(limiter)
+        try:
+            with pytest.raises(HTTPStatusError):
+                get_json_request(url=url,
+                                 session=mock.MagicMock(),
+                                 retry_policy=RetryPolicy(attempts=1))
+        finally:
+            set_concurrency_limiter(None)
+        assert limiter.limit == 2
+        assert limiter.in_flight == 0
+
+
+class TestAsyncGetJson(object):
+    """
+    Tests for async_get_json_request function.
+    """
+    @mock.patch('cox_auto_app.request_tools.get_json_request')
+    def test_no_session(self, mock_get):
+        url = 'https://vautointerview.azurewebsites.net/api/datasetid'
+        json_data = {'test': True}
+        mock_get.return_value = json_data
+        loop = asyncio.new_event_loop()
+        try:
+            assert loop.run_until_complete(
+                async_get_json_request(url=url)) == json_data
+        finally:
+            loop.close()
+        mock_get.assert_called_once_with(url=url, retry_policy=None)
+
+
+class TestAsyncCheckResponse(object):
+    """
+    Tests for async_check_response function.
+    """
+    def test_bad_status(self):
+        url = 'https://vautointerview.azurewebsites.net/api/datasetid'
+        return_status = 500
+        mock_response = mock.MagicMock()
+        mock_response.status = return_status
+        expected_error = ('Got unexpected status code {} from url '
+                          '{}'.format(return_status, url))
+        loop = asyncio.new_event_loop()
+        try:
+            with pytest.raises(RuntimeError, match=expected_error):
+                loop.run_until_complete(
+                    async_check_response(url=url, response=mock_response))
+        finally:
+            loop.close()
+
+    def test_good_return(self):
+        url = 'https://vautointerview.azurewebsites.net/api/datasetid'
+        json_data = {'test': True}
+        mock_response = mock.MagicMock()
+        mock_response.status = 200
+        mock_response.headers = {'content-type': 'application/json'}
+        mock_response.read = mock.AsyncMock(return_value=b'{"test": true}')
+        loop = asyncio.new_event_loop()
+        try:
+            assert loop.run_until_complete(
+                async_check_response(url=url,
+                                     response=mock_response)) == json_data
+        finally:
+            loop.close()
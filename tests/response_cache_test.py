@@ -0,0 +1,98 @@
+import mock
+import pytest
+from cox_auto_app.response_cache import (ResponseCache)
+
+
+class TestResponseCache(object):
+    """
+    Tests for ResponseCache class.
+    """
+    def test_bad_ttl(self, tmpdir):
+        with pytest.raises(ValueError):
+            ResponseCache(path=str(tmpdir.join('cache.db')), ttl=0)
+
+    def test_bad_max_entries(self, tmpdir):
+        with pytest.raises(ValueError):
+            ResponseCache(path=str(tmpdir.join('cache.db')),
+                          max_entries=0)
+
+    def test_bad_commit_every(self, tmpdir):
+        with pytest.raises(ValueError):
+            ResponseCache(path=str(tmpdir.join('cache.db')),
+                          commit_every=0)
+
+    def test_commits_in_batches(self, tmpdir):
+        path = str(tmpdir.join('cache.db'))
+        cache = ResponseCache(path=path, commit_every=2)
+        reader = ResponseCache(path=path)
+        cache.set('a', 1)
+        assert reader.get('a') is None
+        cache.set('b', 2)
+        assert reader.get('a') == 1
+        cache.set('c', 3)
+        cache.flush()
+        assert reader.get('c') == 3
+        reader.close()
+        cache.close()
+
+    @mock.patch('cox_auto_app.response_cache.time.time')
+    def test_access_times_persist(self, mock_time, tmpdir):
+        path = str(tmpdir.join('cache.db'))
+        cache = ResponseCache(path=path)
+        mock_time.return_value = 1
+        cache.set('a', 1)
+        mock_time.return_value = 2
+        cache.set('b', 2)
+        mock_time.return_value = 3
+        assert cache.get('a') == 1
+        cache.close()
+        cache = ResponseCache(path=path, max_entries=2)
+        mock_time.return_value = 4
+        cache.set('c', 3)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        cache.close()
+
+    def test_miss(self, tmpdir):
+        cache = ResponseCache(path=str(tmpdir.join('cache.db')))
+        assert cache.get('url') is None
+        cache.close()
+
+    def test_persists(self, tmpdir):
+        path = str(tmpdir.join('cache.db'))
+        json_data = {'dealerId': 1, 'name': 'test'}
+        cache = ResponseCache(path=path)
+        cache.set('url', json_data)
+        cache.close()
+        cache = ResponseCache(path=path)
+        assert len(cache) == 1
+        assert cache.get('url') == json_data
+        cache.close()
+
+    @mock.patch('cox_auto_app.response_cache.time.time')
+    def test_expired(self, mock_time, tmpdir):
+        cache = ResponseCache(path=str(tmpdir.join('cache.db')), ttl=10)
+        mock_time.return_value = 100
+        cache.set('url', {'test': True})
+        mock_time.return_value = 111
+        assert cache.get('url') is None
+        assert len(cache) == 0
+        cache.close()
+
+    @mock.patch('cox_auto_app.response_cache.time.time')
+    def test_evicts_least_recently_used(self, mock_time, tmpdir):
+        cache = ResponseCache(path=str(tmpdir.join('cache.db')),
+                              max_entries=2)
+        mock_time.return_value = 1
+        cache.set('a', 1)
+        mock_time.return_value = 2
+        cache.set('b', 2)
+        mock_time.return_value = 3
+        assert cache.get('a') == 1
+        mock_time.return_value = 4
+        cache.set('c', 3)
+        assert len(cache) == 2
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        cache.close()
@@ -0,0 +1,66 @@
+import mock
+import pytest
+from cox_auto_app.data_collection import (group_vehicles_by_dealer)
+from cox_auto_app.records import (Dealer,
+                                  Vehicle)
+from cox_auto_app.sharded_data_collection import (
+    get_data_for_vehicles_sharded,
+    merge_dealer_groupings)
+
+
+def vehicle_info(vehicle_id, dealer_id):
+    return {'vehicleId': vehicle_id, 'year': 2000, 'make': 'test',
+            'model': 'test', 'dealerId': dealer_id}
+
+
+class TestMergeDealerGroupings(object):
+    """
+    Tests for merge_dealer_groupings function.
+    """
+    def test_same_as_one_grouping(self):
+        infos = [vehicle_info(1, 10), vehicle_info(2, 20),
+                 {'vehicleId': 3, 'error_message': 'Boom'},
+                 vehicle_info(4, 20), vehicle_info(5, 30),
+                 vehicle_info(6, 10)]
+        partials = [group_vehicles_by_dealer(infos[:2]),
+                    group_vehicles_by_dealer(infos[2:4]),
+                    group_vehicles_by_dealer(infos[4:])]
+        assert (merge_dealer_groupings(partials) ==
+                group_vehicles_by_dealer(infos))
+
+    def test_empty(self):
+        assert merge_dealer_groupings([(None, None)]) == (None, None)
+
+    def test_errors_only(self):
+        errors = [{'vehicleId': 3, 'error_message': 'Boom'}]
+        dealer = Dealer(dealer_id=1,
+                        vehicles=[Vehicle(vehicle_id=1, year=2000,
+                                          make='test', model='test')])
+        assert (merge_dealer_groupings([(None, errors), ([dealer], None)]) ==
+                ([dealer], errors))
+
+
+class TestGetDataForVehiclesSharded(object):
+    """
+    Tests for get_data_for_vehicles_sharded function.
+    """
+    def test_bad_shards(self):
+        with pytest.raises(ValueError):
+            get_data_for_vehicles_sharded(data_set_id='7',
+                                          vehicle_ids=[1], shards=0)
+
+    @mock.patch('cox_auto_app.sharded_data_collection.multiprocessing')
+    def test_splits_ids_and_budget(self, mock_multiprocessing):
+        mock_context = mock_multiprocessing.get_context.return_value
+        pool = mock_context.Pool.return_value.__enter__.return_value
+        pool.apply_async.return_value.get.return_value = (None, None, [])
+        get_data_for_vehicles_sharded(data_set_id='7',
+                                      vehicle_ids=iter(range(10)),
+                                      shards=3, max_workers=32)
+        mock_multiprocessing.get_context.assert_called_once_with('spawn')
+        assert mock_context.Pool.call_args[1]['processes'] == 3
+        calls = pool.apply_async.call_args_list
+        assert ([call[1]['kwds']['vehicle_ids'] for call in calls] ==
+                [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+        assert ([call[1]['kwds']['max_workers'] for call in calls] ==
+                [10] * 3)
@@ -0,0 +1,87 @@
+import pytest
+from cox_auto_app.validation import (RecordSchema,
+                                     ValidationError,
+                                     MissingKeyError,
+                                     MAX_ERROR_DATA_LENGTH,
+                                     format_data,
+                                     is_list_of)
+
+
+class TestFormatData(object):
+    """
+    Tests for format_data function.
+    """
+    def test_short(self):
+        assert format_data({'a': 1}) == "{'a': 1}"
+
+    def test_capped(self):
+        text = format_data(list(range(100000)))
+        assert len(text) < MAX_ERROR_DATA_LENGTH + 50
+        assert text.endswith('more characters)')
+
+
+class TestErrors(object):
+    """
+    Tests for ValidationError and MissingKeyError classes.
+    """
+    def test_message_is_lazy(self):
+        error = ValidationError('Data {} from {}', {'a': 1}, 'url')
+        assert error._message is None
+        assert str(error) == "Data {'a': 1} from url"
+        assert isinstance(error, RuntimeError)
+
+    def test_missing_key_quoted(self):
+        error = MissingKeyError('Key {} not found', 'name')
+        assert isinstance(error, KeyError)
+        assert str(error) == repr('Key name not found')
+
+
+class TestIsListOf(object):
+    """
+    Tests for is_list_of function.
+    """
+    def test_is_list_of(self):
+        assert is_list_of([], int)
+        assert is_list_of([1, 2], int)
+        assert not is_list_of([1, '2'], int)
+        assert not is_list_of([True], int)
+        assert not is_list_of((1, 2), int)
+
+
+class TestRecordSchema(object):
+    """
+    Tests for RecordSchema class.
+    """
+    schema = RecordSchema(name='dealer info',
+                          fields=[('name', str), ('dealerId', int)])
+
+    def test_no_fields(self):
+        with pytest.raises(ValueError):
+            RecordSchema(name='test', fields=[])
+
+    def test_valid(self):
+        data = {'name': 'test', 'dealerId': 1, 'extra': None}
+        assert self.schema.check('url', data) is data
+
+    def test_single_field(self):
+        schema = RecordSchema(name='test', fields=[('id', int)])
+        assert schema.is_valid({'id': 1})
+        assert not schema.is_valid({'id': '1'})
+
+    def test_not_dict(self):
+        with pytest.raises(ValidationError,
+                           match='Data returned .* is not of type dict'):
+            self.schema.check('url', ['test'])
+
+    def test_first_problem_reported(self):
+        with pytest.raises(MissingKeyError, match='Key name not found'):
+            self.schema.check('url', {'dealerId': 'x'})
+        with pytest.raises(ValidationError,
+                           match='Value x is not type int in dealer info'):
+            self.schema.check('url', {'name': 'test', 'dealerId': 'x'})
+
+    def test_large_payload_message_capped(self):
+        data = {'name': 'x' * 100000, 'dealerId': None}
+        with pytest.raises(ValidationError) as excinfo:
+            self.schema.check('url', data)
+        assert len(str(excinfo.value)) < 3 * MAX_ERROR_DATA_LENGTH